@@ -5,26 +5,30 @@
 import os
 import re
 import sys
-import copy
-import yaml
-import json
 import getpass
 import argparse
 import datetime
+import numpy
 import qdarkstyle
 
-from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QAction, qApp, QTabWidget, QFrame, QGridLayout, QTableWidget, QTableWidgetItem, QPushButton, QLabel, QMessageBox, QLineEdit, QComboBox, QHeaderView, QDateEdit, QFileDialog
+from PyQt5.QtWidgets import QApplication, QWidget, QMainWindow, QAction, qApp, QTabWidget, QFrame, QGridLayout, QTableWidget, QTableWidgetItem, QTableView, QPushButton, QLabel, QMessageBox, QLineEdit, QComboBox, QHeaderView, QDateEdit, QFileDialog, QProgressDialog
 from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtCore import Qt, QDate, QTimer
+from matplotlib.dates import date2num
 
 sys.path.append(os.environ['MONITOR_VIEWER_INSTALL_PATH'])
 from common import common_monitor
+from common import common_db
 from common import common_pyqt5
 from config import config
 
 os.environ['PYTHONUNBUFFERED'] = '1'
 VERSION = 'V1.0'
 VERSION_DATE = '2024.11.01'
+# Interval (milliseconds) to check today's day file for new records in tail mode.
+TAIL_INTERVAL = 1000
+# Seconds of a TREND tab bucket.
+TREND_BUCKET_SECOND_DIC = {'minute': 60, 'hour': 3600, 'day': 86400}
 
 # Solve some unexpected warning message.
 if 'XDG_RUNTIME_DIR' not in os.environ:
@@ -44,7 +48,7 @@ def read_args():
 
     parser.add_argument('-t', '--tab',
                         default='MONITOR',
-                        choices=['MONITOR', 'HEARTBEAT', 'LOG', 'ALARM'],
+                        choices=['MONITOR', 'HEARTBEAT', 'LOG', 'ALARM', 'TREND'],
                         help='Specify current tab, default is "MONITOR" tab.')
 
     args = parser.parse_args()
@@ -65,6 +69,21 @@ class MainWindow(QMainWindow):
         # Get monitorViewer database information.
         self.db_dic = self.get_db_info()
 
+        # {tab: RecordLoader}, the running record loading of every tab.
+        self.record_loader_dic = {}
+        # {tab: record_query}, the query of the last Check on every tab, it is run again to export the full result.
+        self.record_query_dic = {}
+
+        # The running loading of TREND tab, and what it has loaded.
+        self.trend_loader = None
+        self.trend_info_list = []
+
+        # {tab: tail query and position}, for the LOG/ALARM tail mode.
+        self.tail_dic = {}
+        self.tail_timer = QTimer(self)
+        self.tail_timer.setInterval(TAIL_INTERVAL)
+        self.tail_timer.timeout.connect(self.tail_records)
+
         # Generate GUI.
         self.init_ui()
 
@@ -105,31 +124,18 @@ class MainWindow(QMainWindow):
             if hasattr(config, 'valid_direction_dic') and config.valid_direction_dic:
                 valid_direction_dic = config.valid_direction_dic
 
-            # Get direction information from coinfig.db_path.
-            for direction in os.listdir(config.db_path):
+            # Get direction information from the catalog of coinfig.db_path.
+            for (direction, monitor_item_dic) in common_db.get_catalog(config.db_path).items():
                 if direction in valid_direction_dic.keys():
                     db_dic.setdefault(direction, {})
-                    direction_path = str(config.db_path) + '/' + str(direction)
-
-                    for monitor_item in os.listdir(direction_path):
-                        monitor_item_path = str(direction_path) + '/' + str(monitor_item)
-                        dir_name_list = list(os.listdir(monitor_item_path))
-
-                        if 'monitor_item.yaml' in dir_name_list:
-                            db_dic[direction].setdefault(monitor_item, {'info': {}, 'heartbeat_path': '', 'log_path': '', 'alarm_path': ''})
-
-                        for dir_name in dir_name_list:
-                            dir_path = str(monitor_item_path) + '/' + str(dir_name)
 
-                            if (dir_name == 'monitor_item.yaml') and os.path.isfile(dir_path):
-                                with open(dir_path, 'r') as DP:
-                                    db_dic[direction][monitor_item]['info'] = yaml.load(DP, Loader=yaml.FullLoader)
-                            elif (dir_name == 'heartbeat') and os.path.isdir(dir_path):
-                                db_dic[direction][monitor_item]['heartbeat_path'] = dir_path
-                            elif (dir_name == 'log') and os.path.isdir(dir_path):
-                                db_dic[direction][monitor_item]['log_path'] = dir_path
-                            elif (dir_name == 'alarm') and os.path.isdir(dir_path):
-                                db_dic[direction][monitor_item]['alarm_path'] = dir_path
+                    for (monitor_item, monitor_item_info_dic) in monitor_item_dic.items():
+                        if monitor_item_info_dic is not None:
+                            monitor_item_path = str(config.db_path) + '/' + str(direction) + '/' + str(monitor_item)
+                            db_dic[direction][monitor_item] = {'info': monitor_item_info_dic,
+                                                               'heartbeat_path': str(monitor_item_path) + '/heartbeat',
+                                                               'log_path': str(monitor_item_path) + '/log',
+                                                               'alarm_path': str(monitor_item_path) + '/alarm'}
 
         return db_dic
 
@@ -149,18 +155,21 @@ class MainWindow(QMainWindow):
         self.heartbeat_tab = QWidget()
         self.log_tab = QWidget()
         self.alarm_tab = QWidget()
+        self.trend_tab = QWidget()
 
         # Add the sub-tabs into top Tab widget.
         self.main_tab.addTab(self.monitor_tab, 'MONITOR')
         self.main_tab.addTab(self.heartbeat_tab, 'HEARTBEAT')
         self.main_tab.addTab(self.log_tab, 'LOG')
         self.main_tab.addTab(self.alarm_tab, 'ALARM')
+        self.main_tab.addTab(self.trend_tab, 'TREND')
 
         # Generate the sub-tabs
         self.gen_monitor_tab()
         self.gen_heartbeat_tab()
         self.gen_log_tab()
         self.gen_alarm_tab()
+        self.gen_trend_tab()
 
         # Show main windows
         common_pyqt5.auto_resize(self, 1200, 565)
@@ -363,8 +372,11 @@ Please be free to contact liyanqing1987@163.com if any question."""
         self.heartbeat_tab_frame.setFrameShadow(QFrame.Raised)
         self.heartbeat_tab_frame.setFrameShape(QFrame.Box)
 
-        self.heartbeat_tab_table = QTableWidget(self.heartbeat_tab)
+        self.heartbeat_tab_table = QTableView(self.heartbeat_tab)
         self.heartbeat_tab_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.heartbeat_tab_table_title_list = ['Time', 'User', 'Host', 'Script']
+        self.heartbeat_tab_model = common_pyqt5.RecordTableModel(self.heartbeat_tab_table_title_list, ['time', 'user', 'host', 'script'], '', self.heartbeat_tab_table)
+        self.heartbeat_tab_table.setModel(self.heartbeat_tab_model)
 
         # Grid
         heartbeat_tab_grid = QGridLayout()
@@ -429,6 +441,12 @@ Please be free to contact liyanqing1987@163.com if any question."""
         heartbeat_tab_check_button.setStyleSheet('''QPushButton:hover{background:rgb(170, 255, 127);}''')
         heartbeat_tab_check_button.clicked.connect(self.filter_heartbeat_tab)
 
+        # Cancel button
+        self.heartbeat_tab_cancel_button = QPushButton('Cancel', self.heartbeat_tab_frame)
+        self.heartbeat_tab_cancel_button.setStyleSheet('''QPushButton:hover{background:rgb(255, 170, 127);}''')
+        self.heartbeat_tab_cancel_button.setEnabled(False)
+        self.heartbeat_tab_cancel_button.clicked.connect(lambda: self.cancel_loading('heartbeat'))
+
         # self.heartbeat_tab_frame - Grid
         heartbeat_tab_frame_grid = QGridLayout()
 
@@ -441,6 +459,7 @@ Please be free to contact liyanqing1987@163.com if any question."""
         heartbeat_tab_frame_grid.addWidget(heartbeat_tab_monitor_item_label, 0, 6)
         heartbeat_tab_frame_grid.addWidget(self.heartbeat_tab_monitor_item_combo, 0, 7)
         heartbeat_tab_frame_grid.addWidget(heartbeat_tab_check_button, 0, 8)
+        heartbeat_tab_frame_grid.addWidget(self.heartbeat_tab_cancel_button, 0, 9)
 
         heartbeat_tab_frame_grid.setColumnStretch(0, 1)
         heartbeat_tab_frame_grid.setColumnStretch(1, 1)
@@ -451,6 +470,7 @@ Please be free to contact liyanqing1987@163.com if any question."""
         heartbeat_tab_frame_grid.setColumnStretch(6, 1)
         heartbeat_tab_frame_grid.setColumnStretch(7, 1)
         heartbeat_tab_frame_grid.setColumnStretch(8, 1)
+        heartbeat_tab_frame_grid.setColumnStretch(9, 1)
 
         self.heartbeat_tab_frame.setLayout(heartbeat_tab_frame_grid)
 
@@ -484,81 +504,33 @@ Please be free to contact liyanqing1987@163.com if any question."""
         end_date = int(re.sub(r'-', '', end_date))
         current_direction = self.heartbeat_tab_direction_combo.currentText().strip()
         current_monitor_item = self.heartbeat_tab_monitor_item_combo.currentText().strip()
-        heartbeat_info_list = self.get_heartbeat_db_info(begin_date, end_date, current_direction, current_monitor_item)
-
-        self.gen_heartbeat_tab_table(heartbeat_info_list)
+        self.load_records('heartbeat', lambda **kwargs: self.get_heartbeat_db_info(begin_date, end_date, current_direction, current_monitor_item, **kwargs))
 
-    def get_heartbeat_db_info(self, begin_date, end_date, direction, monitor_item):
+    def get_heartbeat_db_info(self, begin_date, end_date, direction, monitor_item, cache=True):
         """
-        Get heartbeat information with specified direction/monitor_item/begin_date/end_date information.
+        Yield heartbeat information with specified direction/monitor_item/begin_date/end_date information.
         """
-        heartbeat_info_list = []
-
-        if begin_date and end_date and direction and monitor_item and self.db_dic[direction][monitor_item]['heartbeat_path'] and os.path.exists(self.db_dic[direction][monitor_item]['heartbeat_path']):
-            for date_file_name in os.listdir(self.db_dic[direction][monitor_item]['heartbeat_path']):
-                if re.match(r'^\d{8}$', date_file_name) and (begin_date <= int(date_file_name) <= end_date):
-                    date_file = str(self.db_dic[direction][monitor_item]['heartbeat_path']) + '/' + str(date_file_name)
-
-                    with open(date_file, 'r') as DF:
-                        for line in DF.readlines():
-                            heartbeat_info_dic = json.loads(line.strip())
-                            heartbeat_info_list.append(heartbeat_info_dic)
+        if begin_date and end_date and direction and monitor_item and self.db_dic[direction][monitor_item]['heartbeat_path']:
+            (begin_datetime, end_datetime) = common_db.get_range_datetime(begin_date, end_date)
 
-        return heartbeat_info_list
+            for (direction, monitor_item, heartbeat_info_dic) in common_db.read_records(config.db_path, [(direction, monitor_item)], 'heartbeat', begin_datetime, end_datetime, cache=cache):
+                yield heartbeat_info_dic
 
     def gen_heartbeat_tab_table(self, heartbeat_info_list=[]):
         """
-        Generate self.heartbeat_tab_table.
+        Generate self.heartbeat_tab_table, the rows are fetched by self.heartbeat_tab_model when they are scrolled to.
         """
         self.heartbeat_tab_table.setShowGrid(True)
+        # Do not sort the new records until a header is clicked.
+        self.heartbeat_tab_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.heartbeat_tab_table.setSortingEnabled(True)
-        self.heartbeat_tab_table.setRowCount(0)
-        self.heartbeat_tab_table.setColumnCount(0)
-        self.heartbeat_tab_table_title_list = ['Time', 'User', 'Host', 'Script']
-        self.heartbeat_tab_table.setColumnCount(len(self.heartbeat_tab_table_title_list))
-        self.heartbeat_tab_table.setHorizontalHeaderLabels(self.heartbeat_tab_table_title_list)
+        self.heartbeat_tab_model.set_records(heartbeat_info_list)
 
         # Set column width
         self.heartbeat_tab_table.setColumnWidth(0, 160)
         self.heartbeat_tab_table.setColumnWidth(1, 120)
         self.heartbeat_tab_table.setColumnWidth(2, 120)
         self.heartbeat_tab_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
-
-        if not heartbeat_info_list:
-            return
-
-        # Set self.heartbeat_tab_table.setRowCount
-        self.heartbeat_tab_table.setRowCount(len(heartbeat_info_list))
-
-        # Set item
-        row = -1
-
-        for heartbeat_dic in heartbeat_info_list:
-            row += 1
-
-            # For Time
-            column = 0
-            item = QTableWidgetItem()
-            item.setText(heartbeat_dic['time'])
-            self.heartbeat_tab_table.setItem(row, column, item)
-
-            # For User
-            column = 1
-            item = QTableWidgetItem()
-            item.setText(heartbeat_dic['user'])
-            self.heartbeat_tab_table.setItem(row, column, item)
-
-            # For Host
-            column = 2
-            item = QTableWidgetItem()
-            item.setText(heartbeat_dic['host'])
-            self.heartbeat_tab_table.setItem(row, column, item)
-
-            # For Script
-            column = 3
-            item = QTableWidgetItem()
-            item.setText(heartbeat_dic['script'])
-            self.heartbeat_tab_table.setItem(row, column, item)
 # For HEARTBEAT TAB (end) #
 
 # For LOG TAB (start) #
@@ -570,8 +542,11 @@ Please be free to contact liyanqing1987@163.com if any question."""
         self.log_tab_frame.setFrameShadow(QFrame.Raised)
         self.log_tab_frame.setFrameShape(QFrame.Box)
 
-        self.log_tab_table = QTableWidget(self.log_tab)
+        self.log_tab_table = QTableView(self.log_tab)
         self.log_tab_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.log_tab_table_title_list = ['Time', 'Message_Level', 'Message']
+        self.log_tab_model = common_pyqt5.RecordTableModel(self.log_tab_table_title_list, ['time', 'message_level', 'message'], 'message', self.log_tab_table)
+        self.log_tab_table.setModel(self.log_tab_model)
 
         # Grid
         log_tab_grid = QGridLayout()
@@ -645,12 +620,30 @@ Please be free to contact liyanqing1987@163.com if any question."""
         log_tab_keyword_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
 
         self.log_tab_keyword_line = QLineEdit()
+        self.log_tab_keyword_line.setToolTip('Whitespace separated terms, "quoted term" keeps whitespace.')
+
+        self.log_tab_keyword_option_combo = common_pyqt5.QComboCheckBox(self.log_tab_frame)
+        self.log_tab_keyword_option_combo.addCheckBoxItems(['Regex', 'Ignore_Case', 'Any_Term'])
+        self.log_tab_keyword_option_combo.setToolTip('Regex: terms are regular expressions.\nIgnore_Case: match case-insensitively.\nAny_Term: match any term instead of all terms.')
 
         # Check button
         log_tab_check_button = QPushButton('Check', self.log_tab_frame)
         log_tab_check_button.setStyleSheet('''QPushButton:hover{background:rgb(170, 255, 127);}''')
         log_tab_check_button.clicked.connect(self.filter_log_tab)
 
+        # Cancel button
+        self.log_tab_cancel_button = QPushButton('Cancel', self.log_tab_frame)
+        self.log_tab_cancel_button.setStyleSheet('''QPushButton:hover{background:rgb(255, 170, 127);}''')
+        self.log_tab_cancel_button.setEnabled(False)
+        self.log_tab_cancel_button.clicked.connect(lambda: self.cancel_loading('log'))
+
+        # Tail button
+        self.log_tab_tail_button = QPushButton('Tail', self.log_tab_frame)
+        self.log_tab_tail_button.setStyleSheet('''QPushButton:hover{background:rgb(170, 255, 127);} QPushButton:checked{background:rgb(170, 255, 127); color:black;}''')
+        self.log_tab_tail_button.setToolTip('Append the new records of today to the table.')
+        self.log_tab_tail_button.setCheckable(True)
+        self.log_tab_tail_button.toggled.connect(lambda checked: self.switch_tail('log', checked))
+
         # self.log_tab_frame - Grid
         log_tab_frame_grid = QGridLayout()
 
@@ -665,8 +658,11 @@ Please be free to contact liyanqing1987@163.com if any question."""
         log_tab_frame_grid.addWidget(log_tab_message_level_label, 1, 0)
         log_tab_frame_grid.addWidget(self.log_tab_message_level_combo, 1, 1)
         log_tab_frame_grid.addWidget(log_tab_keyword_label, 1, 2)
-        log_tab_frame_grid.addWidget(self.log_tab_keyword_line, 1, 3, 1, 5)
+        log_tab_frame_grid.addWidget(self.log_tab_keyword_line, 1, 3, 1, 4)
+        log_tab_frame_grid.addWidget(self.log_tab_keyword_option_combo, 1, 7)
         log_tab_frame_grid.addWidget(log_tab_check_button, 1, 8)
+        log_tab_frame_grid.addWidget(self.log_tab_cancel_button, 0, 8)
+        log_tab_frame_grid.addWidget(self.log_tab_tail_button, 1, 9)
 
         log_tab_frame_grid.setColumnStretch(0, 1)
         log_tab_frame_grid.setColumnStretch(1, 1)
@@ -677,6 +673,7 @@ Please be free to contact liyanqing1987@163.com if any question."""
         log_tab_frame_grid.setColumnStretch(6, 1)
         log_tab_frame_grid.setColumnStretch(7, 1)
         log_tab_frame_grid.setColumnStretch(8, 1)
+        log_tab_frame_grid.setColumnStretch(9, 1)
 
         self.log_tab_frame.setLayout(log_tab_frame_grid)
 
@@ -723,96 +720,45 @@ Please be free to contact liyanqing1987@163.com if any question."""
         current_monitor_item = self.log_tab_monitor_item_combo.currentText().strip()
         current_message_level = self.log_tab_message_level_combo.currentText().strip()
         current_keyword = self.log_tab_keyword_line.text().strip()
-        log_info_list = self.get_log_db_info(begin_date, end_date, current_direction, current_monitor_item, current_message_level, current_keyword)
+        current_keyword_option_list = list(self.log_tab_keyword_option_combo.selectedItems().values())
+
+        try:
+            (line_filter_list, record_filter_list) = common_db.gen_record_filters(message_level=current_message_level,
+                                                                                  keyword=current_keyword,
+                                                                                  any_term=('Any_Term' in current_keyword_option_list),
+                                                                                  regex=('Regex' in current_keyword_option_list),
+                                                                                  ignore_case=('Ignore_Case' in current_keyword_option_list))
+        except re.error as error:
+            QMessageBox.warning(self, 'monitorViewer Warning', 'Invalid regular expression "' + str(current_keyword) + '", ' + str(error))
+            return
 
-        self.gen_log_tab_table(log_info_list)
+        self.set_tail_query('log', current_direction, current_monitor_item, line_filter_list, record_filter_list)
+        self.load_records('log', lambda **kwargs: self.get_log_db_info(begin_date, end_date, current_direction, current_monitor_item, line_filter_list, record_filter_list, **kwargs))
 
-    def get_log_db_info(self, begin_date, end_date, direction, monitor_item, specified_message_level, specified_keyword):
+    def get_log_db_info(self, begin_date, end_date, direction, monitor_item, line_filter_list=(), record_filter_list=(), cache=True, offset_dic=None):
         """
-        Get log information with specified direction/monitor_item/message_level/keyword/begin_date/end_date information.
+        Yield log information with specified direction/monitor_item/begin_date/end_date information, filtered by common_db.gen_record_filters filters.
         """
-        log_info_list = []
-
-        if begin_date and end_date and direction and monitor_item and self.db_dic[direction][monitor_item]['log_path'] and os.path.exists(self.db_dic[direction][monitor_item]['log_path']):
-            for date_file_name in os.listdir(self.db_dic[direction][monitor_item]['log_path']):
-                if re.match(r'^\d{8}$', date_file_name) and (begin_date <= int(date_file_name) <= end_date):
-                    date_file = str(self.db_dic[direction][monitor_item]['log_path']) + '/' + str(date_file_name)
-
-                    with open(date_file, 'r') as DF:
-                        for line in DF.readlines():
-                            log_info_dic = json.loads(line.strip())
-                            log_info_dic['message'] = log_info_dic['message'].strip().split('\n')
-                            log_info_list.append(log_info_dic)
-
-                    # Check specified_keyword.
-                    if specified_keyword and log_info_list:
-                        old_log_info_list = copy.deepcopy(log_info_list)
-                        log_info_list = []
-
-                        for log_info_dic in old_log_info_list:
-                            for message in log_info_dic['message']:
-                                if re.search(re.escape(specified_keyword), message):
-                                    log_info_list.append(log_info_dic)
-                                    break
+        if begin_date and end_date and direction and monitor_item and self.db_dic[direction][monitor_item]['log_path']:
+            (begin_datetime, end_datetime) = common_db.get_range_datetime(begin_date, end_date)
 
-        return log_info_list
+            for (direction, monitor_item, log_info_dic) in common_db.read_records(config.db_path, [(direction, monitor_item)], 'log', begin_datetime, end_datetime, line_filter_list, record_filter_list, cache=cache, offset_dic=offset_dic):
+                yield log_info_dic
 
     def gen_log_tab_table(self, log_info_list=[]):
         """
-        Generate self.log_tab_table.
+        Generate self.log_tab_table, the rows are fetched by self.log_tab_model when they are scrolled to.
         """
         self.log_tab_table.setShowGrid(True)
+        # Do not sort the new records until a header is clicked.
+        self.log_tab_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.log_tab_table.setSortingEnabled(True)
-        self.log_tab_table.setRowCount(0)
-        self.log_tab_table.setColumnCount(0)
-        self.log_tab_table_title_list = ['Time', 'Message_Level', 'Message']
-        self.log_tab_table.setColumnCount(len(self.log_tab_table_title_list))
-        self.log_tab_table.setHorizontalHeaderLabels(self.log_tab_table_title_list)
+        self.log_tab_model.set_records(log_info_list)
 
         # Set column width
         self.log_tab_table.setColumnWidth(0, 160)
         self.log_tab_table.setColumnWidth(1, 120)
         self.log_tab_table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
-
-        if not log_info_list:
-            return
-
-        # Set self.log_tab_table.setRowCount
-        row = 0
-
-        for log_dic in log_info_list:
-            row += len(log_dic['message'])
-
-        self.log_tab_table.setRowCount(row)
-
-        # Set item
-        row = -1
-
-        for log_dic in log_info_list:
-            row += 1
-
-            # For Time
-            column = 0
-            item = QTableWidgetItem()
-            item.setText(log_dic['time'])
-            self.log_tab_table.setItem(row, column, item)
-
-            # For Message_Level
-            column = 1
-            item = QTableWidgetItem()
-            item.setText(log_dic['message_level'])
-            self.log_tab_table.setItem(row, column, item)
-
-            # For Message
-            column = 2
-
-            for (i, message) in enumerate(log_dic['message']):
-                if i >= 1:
-                    row += 1
-
-                item = QTableWidgetItem()
-                item.setText(message)
-                self.log_tab_table.setItem(row, column, item)
 # For LOG TAB (end) #
 
 # For ALARM TAB (start) #
@@ -824,8 +770,11 @@ Please be free to contact liyanqing1987@163.com if any question."""
         self.alarm_tab_frame.setFrameShadow(QFrame.Raised)
         self.alarm_tab_frame.setFrameShape(QFrame.Box)
 
-        self.alarm_tab_table = QTableWidget(self.alarm_tab)
+        self.alarm_tab_table = QTableView(self.alarm_tab)
         self.alarm_tab_table.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.alarm_tab_table_title_list = ['Time', 'Receivers', 'Alarm_Result', 'Message']
+        self.alarm_tab_model = common_pyqt5.RecordTableModel(self.alarm_tab_table_title_list, ['time', 'receivers', 'send_alarm_result', 'message'], 'message', self.alarm_tab_table)
+        self.alarm_tab_table.setModel(self.alarm_tab_model)
 
         # Grid
         alarm_tab_grid = QGridLayout()
@@ -898,12 +847,30 @@ Please be free to contact liyanqing1987@163.com if any question."""
         alarm_tab_keyword_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
 
         self.alarm_tab_keyword_line = QLineEdit()
+        self.alarm_tab_keyword_line.setToolTip('Whitespace separated terms, "quoted term" keeps whitespace.')
+
+        self.alarm_tab_keyword_option_combo = common_pyqt5.QComboCheckBox(self.alarm_tab_frame)
+        self.alarm_tab_keyword_option_combo.addCheckBoxItems(['Regex', 'Ignore_Case', 'Any_Term'])
+        self.alarm_tab_keyword_option_combo.setToolTip('Regex: terms are regular expressions.\nIgnore_Case: match case-insensitively.\nAny_Term: match any term instead of all terms.')
 
         # Check button
         alarm_tab_check_button = QPushButton('Check', self.alarm_tab_frame)
         alarm_tab_check_button.setStyleSheet('''QPushButton:hover{background:rgb(170, 255, 127);}''')
         alarm_tab_check_button.clicked.connect(self.filter_alarm_tab)
 
+        # Cancel button
+        self.alarm_tab_cancel_button = QPushButton('Cancel', self.alarm_tab_frame)
+        self.alarm_tab_cancel_button.setStyleSheet('''QPushButton:hover{background:rgb(255, 170, 127);}''')
+        self.alarm_tab_cancel_button.setEnabled(False)
+        self.alarm_tab_cancel_button.clicked.connect(lambda: self.cancel_loading('alarm'))
+
+        # Tail button
+        self.alarm_tab_tail_button = QPushButton('Tail', self.alarm_tab_frame)
+        self.alarm_tab_tail_button.setStyleSheet('''QPushButton:hover{background:rgb(170, 255, 127);} QPushButton:checked{background:rgb(170, 255, 127); color:black;}''')
+        self.alarm_tab_tail_button.setToolTip('Append the new records of today to the table.')
+        self.alarm_tab_tail_button.setCheckable(True)
+        self.alarm_tab_tail_button.toggled.connect(lambda checked: self.switch_tail('alarm', checked))
+
         # self.alarm_tab_frame - Grid
         alarm_tab_frame_grid = QGridLayout()
 
@@ -918,8 +885,11 @@ Please be free to contact liyanqing1987@163.com if any question."""
         alarm_tab_frame_grid.addWidget(alarm_tab_receivers_label, 1, 0)
         alarm_tab_frame_grid.addWidget(self.alarm_tab_receivers_line, 1, 1, 1, 3)
         alarm_tab_frame_grid.addWidget(alarm_tab_keyword_label, 1, 4)
-        alarm_tab_frame_grid.addWidget(self.alarm_tab_keyword_line, 1, 5, 1, 3)
+        alarm_tab_frame_grid.addWidget(self.alarm_tab_keyword_line, 1, 5, 1, 2)
+        alarm_tab_frame_grid.addWidget(self.alarm_tab_keyword_option_combo, 1, 7)
         alarm_tab_frame_grid.addWidget(alarm_tab_check_button, 1, 8)
+        alarm_tab_frame_grid.addWidget(self.alarm_tab_cancel_button, 0, 8)
+        alarm_tab_frame_grid.addWidget(self.alarm_tab_tail_button, 1, 9)
 
         alarm_tab_frame_grid.setColumnStretch(0, 1)
         alarm_tab_frame_grid.setColumnStretch(1, 1)
@@ -930,6 +900,7 @@ Please be free to contact liyanqing1987@163.com if any question."""
         alarm_tab_frame_grid.setColumnStretch(6, 1)
         alarm_tab_frame_grid.setColumnStretch(7, 1)
         alarm_tab_frame_grid.setColumnStretch(8, 1)
+        alarm_tab_frame_grid.setColumnStretch(9, 1)
 
         self.alarm_tab_frame.setLayout(alarm_tab_frame_grid)
 
@@ -965,104 +936,470 @@ Please be free to contact liyanqing1987@163.com if any question."""
         current_monitor_item = self.alarm_tab_monitor_item_combo.currentText().strip()
         current_receiver_list = self.alarm_tab_receivers_line.text().strip().split()
         current_keyword = self.alarm_tab_keyword_line.text().strip()
-        alarm_info_list = self.get_alarm_db_info(begin_date, end_date, current_direction, current_monitor_item, current_receiver_list, current_keyword)
+        current_keyword_option_list = list(self.alarm_tab_keyword_option_combo.selectedItems().values())
+
+        try:
+            (line_filter_list, record_filter_list) = common_db.gen_record_filters(receiver_list=current_receiver_list,
+                                                                                  keyword=current_keyword,
+                                                                                  any_term=('Any_Term' in current_keyword_option_list),
+                                                                                  regex=('Regex' in current_keyword_option_list),
+                                                                                  ignore_case=('Ignore_Case' in current_keyword_option_list))
+        except re.error as error:
+            QMessageBox.warning(self, 'monitorViewer Warning', 'Invalid regular expression "' + str(current_keyword) + '", ' + str(error))
+            return
 
-        self.gen_alarm_tab_table(alarm_info_list)
+        self.set_tail_query('alarm', current_direction, current_monitor_item, line_filter_list, record_filter_list)
+        self.load_records('alarm', lambda **kwargs: self.get_alarm_db_info(begin_date, end_date, current_direction, current_monitor_item, line_filter_list, record_filter_list, **kwargs))
 
-    def get_alarm_db_info(self, begin_date, end_date, direction, monitor_item, specified_receiver_list, specified_keyword):
+    def get_alarm_db_info(self, begin_date, end_date, direction, monitor_item, line_filter_list=(), record_filter_list=(), cache=True, offset_dic=None):
         """
-        Get alarm information with specified direction/monitor_item/receivers/keyword/begin_date/end_date information.
+        Yield alarm information with specified direction/monitor_item/begin_date/end_date information, filtered by common_db.gen_record_filters filters.
         """
-        alarm_info_list = []
-
-        if begin_date and end_date and direction and monitor_item and self.db_dic[direction][monitor_item]['alarm_path'] and os.path.exists(self.db_dic[direction][monitor_item]['alarm_path']):
-            for date_file_name in os.listdir(self.db_dic[direction][monitor_item]['alarm_path']):
-                if re.match(r'^\d{8}$', date_file_name) and (begin_date <= int(date_file_name) <= end_date):
-                    date_file = str(self.db_dic[direction][monitor_item]['alarm_path']) + '/' + str(date_file_name)
-
-                    with open(date_file, 'r') as DF:
-                        for line in DF.readlines():
-                            alarm_info_dic = json.loads(line.strip())
-                            alarm_info_dic['message'] = alarm_info_dic['message'].strip().split('\n')
-                            alarm_info_list.append(alarm_info_dic)
-
-                    # Check specified_keyword.
-                    if specified_keyword and alarm_info_list:
-                        old_alarm_info_list = copy.deepcopy(alarm_info_list)
-                        alarm_info_list = []
-
-                        for alarm_info_dic in old_alarm_info_list:
-                            for message in alarm_info_dic['message']:
-                                if re.search(re.escape(specified_keyword), message):
-                                    alarm_info_list.append(alarm_info_dic)
-                                    break
+        if begin_date and end_date and direction and monitor_item and self.db_dic[direction][monitor_item]['alarm_path']:
+            (begin_datetime, end_datetime) = common_db.get_range_datetime(begin_date, end_date)
 
-        return alarm_info_list
+            for (direction, monitor_item, alarm_info_dic) in common_db.read_records(config.db_path, [(direction, monitor_item)], 'alarm', begin_datetime, end_datetime, line_filter_list, record_filter_list, cache=cache, offset_dic=offset_dic):
+                yield alarm_info_dic
 
     def gen_alarm_tab_table(self, alarm_info_list=[]):
         """
-        Generate self.alarm_tab_table.
+        Generate self.alarm_tab_table, the rows are fetched by self.alarm_tab_model when they are scrolled to.
         """
         self.alarm_tab_table.setShowGrid(True)
+        # Do not sort the new records until a header is clicked.
+        self.alarm_tab_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.alarm_tab_table.setSortingEnabled(True)
-        self.alarm_tab_table.setRowCount(0)
-        self.alarm_tab_table.setColumnCount(0)
-        self.alarm_tab_table_title_list = ['Time', 'Receivers', 'Alarm_Result', 'Message']
-        self.alarm_tab_table.setColumnCount(len(self.alarm_tab_table_title_list))
-        self.alarm_tab_table.setHorizontalHeaderLabels(self.alarm_tab_table_title_list)
+        self.alarm_tab_model.set_records(alarm_info_list)
 
         # Set column width
         self.alarm_tab_table.setColumnWidth(0, 160)
         self.alarm_tab_table.setColumnWidth(1, 120)
         self.alarm_tab_table.setColumnWidth(2, 120)
         self.alarm_tab_table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+# For ALARM TAB (end) #
+
+# For TREND TAB (start) #
+    def gen_trend_tab(self):
+        """
+        Generate TREND tab, plot log/alarm/heartbeat counts of a monitor item over time.
+        """
+        self.trend_tab_frame = QFrame(self.trend_tab)
+        self.trend_tab_frame.setFrameShadow(QFrame.Raised)
+        self.trend_tab_frame.setFrameShape(QFrame.Box)
+
+        self.trend_tab_canvas = common_pyqt5.FigureCanvasQTAgg()
+        self.trend_tab_toolbar = common_pyqt5.NavigationToolbar2QT(self.trend_tab_canvas, self.trend_tab, x_is_date=True)
+        self.trend_tab_cursor = common_pyqt5.BlitCursor(self.trend_tab_canvas)
+        # DecimatedPlot of every axes, they re-downsample the lines after zooming.
+        self.trend_tab_plot_list = []
+
+        # Grid
+        trend_tab_grid = QGridLayout()
+
+        trend_tab_grid.addWidget(self.trend_tab_frame, 0, 0)
+        trend_tab_grid.addWidget(self.trend_tab_toolbar, 1, 0)
+        trend_tab_grid.addWidget(self.trend_tab_canvas, 2, 0)
+
+        trend_tab_grid.setRowStretch(0, 1)
+        trend_tab_grid.setRowStretch(1, 1)
+        trend_tab_grid.setRowStretch(2, 10)
+
+        self.trend_tab.setLayout(trend_tab_grid)
+
+        # Generate self.trend_tab_frame
+        self.gen_trend_tab_frame()
+
+    def gen_trend_tab_frame(self):
+        """
+        Generate (initialize) self.trend_tab_frame.
+        """
+        # Begin_Date
+        trend_tab_begin_date_label = QLabel('Begin_Date', self.trend_tab_frame)
+        trend_tab_begin_date_label.setStyleSheet("font-weight: bold;")
+        trend_tab_begin_date_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+
+        self.trend_tab_begin_date_edit = QDateEdit(self.trend_tab_frame)
+        self.trend_tab_begin_date_edit.setDisplayFormat('yyyy-MM-dd')
+        self.trend_tab_begin_date_edit.setMinimumDate(QDate.currentDate().addDays(-3652))
+        self.trend_tab_begin_date_edit.setCalendarPopup(True)
+        self.trend_tab_begin_date_edit.setDate(QDate.currentDate().addDays(-7))
+
+        # End_Date
+        trend_tab_end_date_label = QLabel('End_Date', self.trend_tab_frame)
+        trend_tab_end_date_label.setStyleSheet("font-weight: bold;")
+        trend_tab_end_date_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+
+        self.trend_tab_end_date_edit = QDateEdit(self.trend_tab_frame)
+        self.trend_tab_end_date_edit.setDisplayFormat('yyyy-MM-dd')
+        self.trend_tab_end_date_edit.setMinimumDate(QDate.currentDate().addDays(-3652))
+        self.trend_tab_end_date_edit.setCalendarPopup(True)
+        self.trend_tab_end_date_edit.setDate(QDate.currentDate())
+
+        # Direction
+        trend_tab_direction_label = QLabel('Direction', self.trend_tab_frame)
+        trend_tab_direction_label.setStyleSheet('font-weight: bold;')
+        trend_tab_direction_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+
+        self.trend_tab_direction_combo = QComboBox(self.trend_tab_frame)
+        self.set_trend_tab_direction_combo()
+        self.trend_tab_direction_combo.activated.connect(self.set_trend_tab_monitor_item_combo)
+
+        # Monitor_Item
+        trend_tab_monitor_item_label = QLabel('Monitor_Item', self.trend_tab_frame)
+        trend_tab_monitor_item_label.setStyleSheet('font-weight: bold;')
+        trend_tab_monitor_item_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+
+        self.trend_tab_monitor_item_combo = QComboBox(self.trend_tab_frame)
+        self.set_trend_tab_monitor_item_combo()
+
+        # Bucket
+        trend_tab_bucket_label = QLabel('Bucket', self.trend_tab_frame)
+        trend_tab_bucket_label.setStyleSheet('font-weight: bold;')
+        trend_tab_bucket_label.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+
+        self.trend_tab_bucket_combo = QComboBox(self.trend_tab_frame)
+
+        for bucket in TREND_BUCKET_SECOND_DIC.keys():
+            self.trend_tab_bucket_combo.addItem(bucket)
+
+        self.trend_tab_bucket_combo.setCurrentText('hour')
+
+        # Check button
+        trend_tab_check_button = QPushButton('Check', self.trend_tab_frame)
+        trend_tab_check_button.setStyleSheet('''QPushButton:hover{background:rgb(170, 255, 127);}''')
+        trend_tab_check_button.clicked.connect(self.filter_trend_tab)
+
+        # self.trend_tab_frame - Grid
+        trend_tab_frame_grid = QGridLayout()
+
+        trend_tab_frame_grid.addWidget(trend_tab_begin_date_label, 0, 0)
+        trend_tab_frame_grid.addWidget(self.trend_tab_begin_date_edit, 0, 1)
+        trend_tab_frame_grid.addWidget(trend_tab_end_date_label, 0, 2)
+        trend_tab_frame_grid.addWidget(self.trend_tab_end_date_edit, 0, 3)
+        trend_tab_frame_grid.addWidget(trend_tab_direction_label, 0, 4)
+        trend_tab_frame_grid.addWidget(self.trend_tab_direction_combo, 0, 5)
+        trend_tab_frame_grid.addWidget(trend_tab_monitor_item_label, 0, 6)
+        trend_tab_frame_grid.addWidget(self.trend_tab_monitor_item_combo, 0, 7)
+        trend_tab_frame_grid.addWidget(trend_tab_bucket_label, 0, 8)
+        trend_tab_frame_grid.addWidget(self.trend_tab_bucket_combo, 0, 9)
+        trend_tab_frame_grid.addWidget(trend_tab_check_button, 0, 10)
+
+        trend_tab_frame_grid.setColumnStretch(0, 1)
+        trend_tab_frame_grid.setColumnStretch(1, 1)
+        trend_tab_frame_grid.setColumnStretch(2, 1)
+        trend_tab_frame_grid.setColumnStretch(3, 1)
+        trend_tab_frame_grid.setColumnStretch(4, 1)
+        trend_tab_frame_grid.setColumnStretch(5, 1)
+        trend_tab_frame_grid.setColumnStretch(6, 1)
+        trend_tab_frame_grid.setColumnStretch(7, 1)
+        trend_tab_frame_grid.setColumnStretch(8, 1)
+        trend_tab_frame_grid.setColumnStretch(9, 1)
+        trend_tab_frame_grid.setColumnStretch(10, 1)
+
+        self.trend_tab_frame.setLayout(trend_tab_frame_grid)
+
+    def set_trend_tab_direction_combo(self):
+        """
+        Set (initialize) self.trend_tab_direction_combo.
+        """
+        self.trend_tab_direction_combo.clear()
 
-        if not alarm_info_list:
+        for direction in self.db_dic.keys():
+            self.trend_tab_direction_combo.addItem(direction)
+
+    def set_trend_tab_monitor_item_combo(self):
+        """
+        Set (initialize) self.trend_tab_monitor_item_combo.
+        """
+        self.trend_tab_monitor_item_combo.clear()
+        current_direction = self.trend_tab_direction_combo.currentText().strip()
+
+        if current_direction:
+            for monitor_item in self.db_dic[current_direction].keys():
+                self.trend_tab_monitor_item_combo.addItem(monitor_item)
+
+    def filter_trend_tab(self):
+        """
+        Count the records with self.trend_tab_frame settings in a worker thread, then draw self.trend_tab_canvas.
+        """
+        begin_date = self.trend_tab_begin_date_edit.text()
+        begin_date = int(re.sub(r'-', '', begin_date))
+        end_date = self.trend_tab_end_date_edit.text()
+        end_date = int(re.sub(r'-', '', end_date))
+        current_direction = self.trend_tab_direction_combo.currentText().strip()
+        current_monitor_item = self.trend_tab_monitor_item_combo.currentText().strip()
+        current_bucket = self.trend_tab_bucket_combo.currentText().strip()
+
+        if self.trend_loader:
+            self.trend_loader.requestInterruption()
+
+        trend_loader = common_pyqt5.RecordLoader(self.get_trend_db_info(begin_date, end_date, current_direction, current_monitor_item, current_bucket), parent=self)
+        trend_loader.records_loaded.connect(lambda trend_info_list: self.trend_info_list.extend(trend_info_list) if self.trend_loader is trend_loader else None)
+        trend_loader.finished.connect(lambda: self.draw_trend_tab_canvas(trend_loader, begin_date, end_date, current_bucket))
+        trend_loader.finished.connect(trend_loader.deleteLater)
+        self.trend_loader = trend_loader
+        self.trend_info_list = []
+
+        self.statusBar().showMessage('Counting records for TREND tab ...')
+        trend_loader.start()
+
+    def get_trend_db_info(self, begin_date, end_date, direction, monitor_item, bucket):
+        """
+        Yield (kind, {series: {bucket_time: count}}) of log/alarm/heartbeat with specified direction/monitor_item/begin_date/end_date/bucket information.
+        """
+        if begin_date and end_date and direction and monitor_item:
+            (begin_datetime, end_datetime) = common_db.get_range_datetime(begin_date, end_date)
+
+            for kind in common_db.KIND_LIST:
+                if self.db_dic[direction][monitor_item][str(kind) + '_path']:
+                    yield kind, common_db.get_trend(config.db_path, [(direction, monitor_item)], kind, begin_datetime, end_datetime, bucket)
+
+    def gen_trend_series(self, begin_date, end_date, bucket, count_dic):
+        """
+        Convert {bucket_time: count} into (x_array, y_array) with every bucket between begin_date and end_date, x is in matplotlib date numbers.
+        """
+        bucket_second = TREND_BUCKET_SECOND_DIC[bucket]
+        begin_time = numpy.datetime64(datetime.datetime.strptime(str(begin_date), '%Y%m%d'), 's')
+        end_time = numpy.datetime64(datetime.datetime.strptime(str(end_date), '%Y%m%d') + datetime.timedelta(days=1), 's')
+        time_array = numpy.arange(begin_time, end_time, numpy.timedelta64(bucket_second, 's'))
+        y_array = numpy.zeros(len(time_array), dtype=numpy.int64)
+
+        if count_dic:
+            # "2024-11-01 13" => "2024-11-01 13:00:00"
+            bucket_time_array = numpy.array([bucket_time + '0000-01-01 00:00:00'[len(bucket_time):] for bucket_time in count_dic.keys()], dtype='datetime64[s]')
+            index_array = (bucket_time_array - begin_time).astype(numpy.int64) // bucket_second
+            valid_array = (index_array >= 0) & (index_array < len(time_array))
+            numpy.add.at(y_array, index_array[valid_array], numpy.fromiter(count_dic.values(), dtype=numpy.int64, count=len(count_dic))[valid_array])
+
+        return date2num(time_array), y_array
+
+    def draw_trend_tab_canvas(self, trend_loader, begin_date, end_date, bucket):
+        """
+        Draw the counts of self.trend_info_list on self.trend_tab_canvas, one axes per kind, one line per series.
+        """
+        if trend_loader is not self.trend_loader:
             return
 
-        # Set self.alarm_tab_table.setRowCount
-        row = 0
+        self.trend_loader = None
 
-        for alarm_dic in alarm_info_list:
-            row += len(alarm_dic['message'])
+        if trend_loader.error:
+            common_monitor.bprint('Failed on counting records for TREND tab, ' + str(trend_loader.error), level='Warning')
+            self.statusBar().showMessage('Failed on counting records for TREND tab, ' + str(trend_loader.error))
+            return
 
-        self.alarm_tab_table.setRowCount(row)
+        trend_dic = dict(self.trend_info_list)
+        figure = self.trend_tab_canvas.figure
+        figure.clear()
+        axes_list = figure.subplots(len(common_db.KIND_LIST), 1, sharex=True)
+        self.trend_tab_plot_list = []
+        point_num = 0
 
-        # Set item
-        row = -1
+        for (axes, kind) in zip(axes_list, common_db.KIND_LIST):
+            decimated_plot = common_pyqt5.DecimatedPlot(axes)
+            self.trend_tab_plot_list.append(decimated_plot)
 
-        for alarm_dic in alarm_info_list:
-            row += 1
+            for (series, count_dic) in sorted(trend_dic.get(kind, {}).items()):
+                (x_array, y_array) = self.gen_trend_series(begin_date, end_date, bucket, count_dic)
+                decimated_plot.plot(x_array, y_array, label=(series or 'N/A'), linewidth=1)
+                point_num += len(x_array)
 
-            # For Time
-            column = 0
-            item = QTableWidgetItem()
-            item.setText(alarm_dic['time'])
-            self.alarm_tab_table.setItem(row, column, item)
+            axes.set_ylabel(kind.capitalize() + ' / ' + str(bucket))
+            axes.grid(True, linestyle=':')
+            axes.xaxis_date()
 
-            # For Receivers
-            column = 1
-            item = QTableWidgetItem()
-            item.setText(alarm_dic['receivers'])
-            self.alarm_tab_table.setItem(row, column, item)
+            if axes.get_lines():
+                axes.legend(loc='upper left', fontsize='small')
 
-            # For Alarm_Result
-            column = 2
-            item = QTableWidgetItem()
-            item.setText(alarm_dic['send_alarm_result'])
-            self.alarm_tab_table.setItem(row, column, item)
+        figure.autofmt_xdate()
+        self.trend_tab_cursor.reset()
+        self.trend_tab_canvas.draw_idle()
+        self.statusBar().showMessage('TREND tab is drawn with ' + str(point_num) + ' points.')
+# For TREND TAB (end) #
 
-            # For Message
-            column = 3
+# Load records (start) #
+    def load_records(self, tab, record_query):
+        """
+        Load the records of record_query (a function returns a record generator) into the table of tab (heartbeat/log/alarm) in a worker thread, the records are shown as they are read.
+        The former loading of the tab is cancelled.
+        """
+        self.cancel_loading(tab, show_message=False)
+        self.record_query_dic[tab] = record_query
 
-            for (i, message) in enumerate(alarm_dic['message']):
-                if i >= 1:
-                    row += 1
+        table = getattr(self, str(tab) + '_tab_table')
+        # Records are added in reading order, they can be sorted after loading.
+        table.setSortingEnabled(False)
+        table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        model = getattr(self, str(tab) + '_tab_model')
+        model.set_records([])
+        getattr(self, str(tab) + '_tab_cancel_button').setEnabled(True)
 
-                item = QTableWidgetItem()
-                item.setText(message)
-                self.alarm_tab_table.setItem(row, column, item)
-# For ALARM TAB (end) #
+        if tab in self.tail_dic:
+            # Filled with the offsets the day files are read to, tail mode goes on from there.
+            self.tail_dic[tab]['offset_dic'] = {}
+            record_iter = record_query(offset_dic=self.tail_dic[tab]['offset_dic'])
+        else:
+            record_iter = record_query()
+
+        record_loader = common_pyqt5.RecordLoader(record_iter, model.gen_record_chunk, self)
+        record_loader.records_loaded.connect(lambda record_chunk: self.add_loaded_records(tab, record_loader, record_chunk))
+        record_loader.finished.connect(lambda: self.finish_loading(tab, record_loader))
+        record_loader.finished.connect(record_loader.deleteLater)
+        self.record_loader_dic[tab] = record_loader
+
+        self.statusBar().showMessage('Loading ' + str(tab) + ' records ...')
+        record_loader.start()
+
+    def add_loaded_records(self, tab, record_loader, record_chunk):
+        """
+        Show a chunk of records, the chunks from a cancelled loading are ignored.
+        """
+        if self.record_loader_dic.get(tab) is record_loader:
+            model = getattr(self, str(tab) + '_tab_model')
+            model.append_record_chunk(record_chunk)
+            self.statusBar().showMessage('Loading ' + str(tab) + ' records ... ' + str(model.get_record_num()))
+
+    def finish_loading(self, tab, record_loader):
+        if self.record_loader_dic.get(tab) is record_loader:
+            self.record_loader_dic.pop(tab)
+            self.stop_loading(tab)
+
+            if record_loader.error:
+                common_monitor.bprint('Failed on loading ' + str(tab) + ' records, ' + str(record_loader.error), level='Warning')
+                self.statusBar().showMessage('Failed on loading ' + str(tab) + ' records, ' + str(record_loader.error))
+            else:
+                self.statusBar().showMessage(str(getattr(self, str(tab) + '_tab_model').get_record_num()) + ' ' + str(tab) + ' records are loaded.')
+
+    def cancel_loading(self, tab, show_message=True):
+        """
+        Stop the running loading of tab, the records loaded are kept.
+        """
+        record_loader = self.record_loader_dic.pop(tab, None)
+
+        if record_loader:
+            record_loader.requestInterruption()
+            self.stop_loading(tab)
+
+            if show_message:
+                self.statusBar().showMessage('Loading ' + str(tab) + ' records is cancelled, ' + str(getattr(self, str(tab) + '_tab_model').get_record_num()) + ' records are loaded.')
+
+    def stop_loading(self, tab):
+        getattr(self, str(tab) + '_tab_table').setSortingEnabled(True)
+        getattr(self, str(tab) + '_tab_cancel_button').setEnabled(False)
+
+        # Tail from the end of the loaded records.
+        if tab in self.tail_dic:
+            self.reset_tail_position(tab)
+
+    def closeEvent(self, event):
+        """
+        Stop the loading/exporting threads before they are destroyed with the window, the unfinished export files are removed.
+        """
+        for worker in self.findChildren(common_pyqt5.RecordLoader) + self.findChildren(common_pyqt5.RecordExporter):
+            worker.requestInterruption()
+            worker.wait()
+
+        super().closeEvent(event)
+# Load records (end) #
+
+# Tail records (start) #
+    def set_tail_query(self, tab, direction, monitor_item, line_filter_list, record_filter_list):
+        """
+        Save the query of the last Check on tab (log/alarm), tail mode appends the new records matching it.
+        """
+        self.tail_dic[tab] = {'direction': direction,
+                              'monitor_item': monitor_item,
+                              'line_filter_list': line_filter_list,
+                              'record_filter_list': record_filter_list,
+                              'day_file': '',
+                              'offset': 0}
+
+    def get_tail_day_file(self, tab):
+        """
+        Get today's day file of the tail query on tab, '' if the monitor item is unknown.
+        """
+        tail_dic = self.tail_dic[tab]
+
+        if (tail_dic['direction'] in self.db_dic) and (tail_dic['monitor_item'] in self.db_dic[tail_dic['direction']]):
+            return str(self.db_dic[tail_dic['direction']][tail_dic['monitor_item']][str(tab) + '_path']) + '/' + datetime.datetime.now().strftime('%Y%m%d')
+
+        return ''
+
+    def reset_tail_position(self, tab):
+        """
+        Tail from where the last loading read today's day file to, or the current end of it.
+        """
+        tail_dic = self.tail_dic[tab]
+        tail_dic['day_file'] = self.get_tail_day_file(tab)
+        # Only once, the records after it may have been tailed since.
+        offset_dic = tail_dic.pop('offset_dic', {})
+
+        if tail_dic['day_file'] in offset_dic:
+            tail_dic['offset'] = offset_dic[tail_dic['day_file']]
+        else:
+            tail_dic['offset'] = os.path.getsize(tail_dic['day_file']) if tail_dic['day_file'] and os.path.exists(tail_dic['day_file']) else 0
+
+    def switch_tail(self, tab, checked):
+        """
+        Start/Stop tail mode on tab, the tail query is from the last Check, do a Check first if there is none.
+        """
+        if checked:
+            if tab not in self.tail_dic:
+                getattr(self, 'filter_' + str(tab) + '_tab')()
+            elif tab not in self.record_loader_dic:
+                self.reset_tail_position(tab)
+
+            self.tail_timer.start()
+        elif not (self.log_tab_tail_button.isChecked() or self.alarm_tab_tail_button.isChecked()):
+            self.tail_timer.stop()
+
+    def tail_records(self):
+        """
+        Append the records written to today's day file since last time, only a stat() if there is nothing new.
+        """
+        for tab in ['log', 'alarm']:
+            if (not getattr(self, str(tab) + '_tab_tail_button').isChecked()) or (tab not in self.tail_dic) or (tab in self.record_loader_dic):
+                continue
+
+            tail_dic = self.tail_dic[tab]
+            day_file = self.get_tail_day_file(tab)
+            record_list = []
+
+            if day_file != tail_dic['day_file']:
+                # A new day, read the rest of the former day file first.
+                if tail_dic['day_file']:
+                    (record_list, tail_dic['offset']) = common_db.tail_day_file(tail_dic['day_file'], tail_dic['offset'], tail_dic['line_filter_list'], tail_dic['record_filter_list'])
+
+                tail_dic['day_file'] = day_file
+                tail_dic['offset'] = 0
+
+            if day_file:
+                (new_record_list, tail_dic['offset']) = common_db.tail_day_file(day_file, tail_dic['offset'], tail_dic['line_filter_list'], tail_dic['record_filter_list'])
+                record_list.extend(new_record_list)
+
+            if record_list:
+                self.append_tail_records(tab, record_list)
+
+    def append_tail_records(self, tab, record_list):
+        """
+        Append record_list to the table of tab, follow the new rows if the table is scrolled to the bottom.
+        """
+        table = getattr(self, str(tab) + '_tab_table')
+        model = getattr(self, str(tab) + '_tab_model')
+        scroll_bar = table.verticalScrollBar()
+        at_bottom = (scroll_bar.value() == scroll_bar.maximum())
+        all_fetched = (not model.canFetchMore())
+
+        model.append_record_chunk(model.gen_record_chunk(record_list))
+
+        if all_fetched:
+            while model.canFetchMore():
+                model.fetchMore()
+
+        if at_bottom:
+            table.scrollToBottom()
+
+        self.statusBar().showMessage(str(len(record_list)) + ' new ' + str(tab) + ' records at ' + datetime.datetime.now().strftime('%H:%M:%S') + '.')
+# Tail records (end) #
 
 # Export table (start) #
     def export_monitor_table(self):
@@ -1079,36 +1416,67 @@ Please be free to contact liyanqing1987@163.com if any question."""
 
     def export_table(self, table_type, table_item, title_list):
         """
-        Export specified table info into an Excel.
+        Export specified table info into a csv/csv.gz/parquet file in a worker thread.
+        For heartbeat/log/alarm tables, the full result of the last Check is read again and streamed into the file, not only the rows loaded in the table.
         """
         current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         current_time_string = re.sub('-', '', current_time)
         current_time_string = re.sub(':', '', current_time_string)
         current_time_string = re.sub(' ', '_', current_time_string)
         default_output_file = './monitor_' + str(table_type) + '_' + str(current_time_string) + '.csv'
-        (output_file, output_file_type) = QFileDialog.getSaveFileName(self, 'Export ' + str(table_type) + ' table', default_output_file, 'CSV Files (*.csv)')
+        file_filter_dic = {'CSV Files (*.csv)': '.csv', 'Gzip CSV Files (*.csv.gz)': '.csv.gz', 'Parquet Files (*.parquet)': '.parquet'}
+        (output_file, output_file_type) = QFileDialog.getSaveFileName(self, 'Export ' + str(table_type) + ' table', default_output_file, ';;'.join(file_filter_dic.keys()))
 
         if output_file:
-            # Get table content.
-            content_dic = {}
-            row_num = table_item.rowCount()
-            column_num = table_item.columnCount()
+            if not common_db.get_export_format(output_file):
+                output_file = re.sub(r'\.csv$', '', output_file) + file_filter_dic.get(output_file_type, '.csv')
+
+            model = table_item.model()
+
+            if isinstance(model, common_pyqt5.RecordTableModel):
+                field_list = model.field_list
+                record_iter = self.record_query_dic.get(table_type, lambda **kwargs: iter([]))(cache=False)
+            else:
+                # The monitor table is small, read it in GUI thread, the widget is not thread-safe.
+                field_list = title_list
+                record_iter = []
 
-            for column in range(column_num):
-                column_list = []
+                for row in range(table_item.rowCount()):
+                    record_dic = {}
 
-                for row in range(row_num):
-                    if table_item.item(row, column):
-                        column_list.append(table_item.item(row, column).text())
-                    else:
-                        column_list.append('')
+                    for column in range(table_item.columnCount()):
+                        record_dic[title_list[column]] = table_item.item(row, column).text() if table_item.item(row, column) else ''
 
-                content_dic.setdefault(title_list[column], column_list)
+                    record_iter.append(record_dic)
 
-            # Write csv
             common_monitor.bprint('Writing ' + str(table_type) + ' table into "' + str(output_file) + '" ...', date_format='%Y-%m-%d %H:%M:%S')
 
-            common_monitor.write_csv(csv_file=output_file, content_dic=content_dic)
+            export_progress_dialog = QProgressDialog('Exporting ' + str(table_type) + ' table into "' + str(output_file) + '" ...', 'Cancel', 0, 0, self)
+            export_progress_dialog.setWindowTitle('monitorViewer Export')
+            export_progress_dialog.setMinimumDuration(0)
+            export_progress_dialog.setAutoClose(False)
+            export_progress_dialog.setAutoReset(False)
+
+            record_exporter = common_pyqt5.RecordExporter(record_iter, lambda record_iter: common_db.export_records(output_file, title_list, field_list, record_iter), self)
+            record_exporter.progress.connect(lambda record_num: export_progress_dialog.setLabelText('Exporting ' + str(table_type) + ' table into "' + str(output_file) + '" ... ' + str(record_num) + ' records'))
+            record_exporter.finished.connect(lambda: self.finish_exporting(table_type, output_file, record_exporter, export_progress_dialog))
+            record_exporter.finished.connect(record_exporter.deleteLater)
+            export_progress_dialog.canceled.connect(record_exporter.requestInterruption)
+
+            export_progress_dialog.show()
+            record_exporter.start()
+
+    def finish_exporting(self, table_type, output_file, record_exporter, export_progress_dialog):
+        export_progress_dialog.close()
+        export_progress_dialog.deleteLater()
+
+        if record_exporter.error:
+            common_monitor.bprint('Failed on exporting ' + str(table_type) + ' table, ' + str(record_exporter.error), level='Warning')
+            QMessageBox.warning(self, 'monitorViewer Warning', 'Failed on exporting ' + str(table_type) + ' table into "' + str(output_file) + '", ' + str(record_exporter.error))
+        elif record_exporter.cancelled:
+            self.statusBar().showMessage('Exporting ' + str(table_type) + ' table is cancelled.')
+        else:
+            self.statusBar().showMessage(str(record_exporter.record_num) + ' ' + str(table_type) + ' records are exported into "' + str(output_file) + '".')
 # Export table (end) #
 
     def switch_tab(self, specified_tab):
@@ -1120,6 +1488,7 @@ Please be free to contact liyanqing1987@163.com if any question."""
                    'HEARTBEAT': self.heartbeat_tab,
                    'LOG': self.log_tab,
                    'ALARM': self.alarm_tab,
+                   'TREND': self.trend_tab,
                   }
 
         self.main_tab.setCurrentWidget(tab_dic[specified_tab])
@@ -0,0 +1,1331 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+import os
+import re
+import csv
+import gzip
+import json
+import time
+import yaml
+import fcntl
+import bisect
+import threading
+import collections
+import datetime
+
+# Use the C YAML loader if PyYAML is built with libyaml.
+YAML_LOADER = getattr(yaml, 'CFullLoader', yaml.FullLoader)
+
+# Every record is written by json.dumps with "time" as the first key, so the time can be sliced out of a raw line without decoding it.
+LINE_TIME_PREFIX = b'{"time": "'
+LINE_TIME_SLICE = slice(len(LINE_TIME_PREFIX), len(LINE_TIME_PREFIX) + 19)
+KIND_LIST = ['log', 'alarm', 'heartbeat']
+
+# Day file index <YYYYMMDD>.idx, every line is "<HH:MM> <byte offset>", the offset of the first line written in that minute.
+INDEX_SUFFIX = '.idx'
+# Records of a day file are appended in time order, but writers on different hosts may lag a bit, stop reading this long after end time.
+INDEX_END_SLACK = datetime.timedelta(minutes=5)
+
+# Trend bucket: length of the time prefix ("%Y-%m-%d %H:%M:%S") shared by the records in a bucket.
+TREND_BUCKET_SIZE_DIC = {'minute': 16, 'hour': 13, 'day': 10}
+
+# Receivers of an alarm record are separated by "," or whitespace.
+RECEIVER_SEPARATOR = re.compile(r'[,\s]+')
+# A keyword is split into terms on whitespace, a "quoted term" keeps its whitespace.
+KEYWORD_TERM = re.compile(r'"([^"]+)"|(\S+)')
+
+# Export file formats, by file suffix.
+EXPORT_FORMAT_DIC = {'.csv': 'csv', '.csv.gz': 'csv.gz', '.parquet': 'parquet'}
+# Records of a parquet row group, the only records held in memory on exporting.
+EXPORT_BATCH_SIZE = 10000
+
+# Compacted day file <YYYYMMDD>.npz of a closed day, "time" is a datetime64 column, every other field is dictionary encoded into int32 codes.
+COMPACT_SUFFIX = '.npz'
+
+# Catalog change journal <db_path>/.catalog_journal, SaveLog appends "<direction> <monitor_item>" after it (re)writes monitor_item.yaml.
+CATALOG_JOURNAL = '.catalog_journal'
+# Stat every monitor_item.yaml at least this often (seconds), for the changes out of the journal, like editing by hand.
+CATALOG_FULL_CHECK_INTERVAL = 300
+# {db_path: catalog_dic}, shared by all callers of the process.
+CATALOG_CACHE_DIC = {}
+CATALOG_LOCK = threading.Lock()
+
+# Default max total size (bytes) of the day files kept decoded in memory by DAY_FILE_CACHE.
+DAY_FILE_CACHE_DEFAULT_MAX_SIZE = 128 * 1024 * 1024
+
+# Day file rollup <YYYYMMDD>.rollup, the counts of the whole day file up to "source_size", records appended after it are rolled up on the next read.
+ROLLUP_SUFFIX = '.rollup'
+
+# Alarm counter store <db_path>/<direction>/<monitor_item>/.alarm_counter, {md5: {"date", "day_count", "hour", "hour_count", "last_time"}}, for the alarm_frequency checks.
+ALARM_COUNTER_FILE = '.alarm_counter'
+# Counters of the alarms which are not sent for this long (seconds) are dropped.
+ALARM_COUNTER_KEEP_TIME = 31 * 86400
+
+
+def get_date_list(begin_datetime, end_datetime):
+    """
+    Get all "%Y%m%d" day file names between begin_datetime and end_datetime.
+    begin_datetime/end_datetime can be "%Y-%m-%d %H:%M:%S", "%Y-%m-%d" or "%Y%m%d".
+    """
+    begin_date = datetime.datetime.strptime(re.sub(r'-', '', str(begin_datetime).strip())[:8], '%Y%m%d').date()
+    end_date = datetime.datetime.strptime(re.sub(r'-', '', str(end_datetime).strip())[:8], '%Y%m%d').date()
+    date_list = []
+
+    while begin_date <= end_date:
+        date_list.append(begin_date.strftime('%Y%m%d'))
+        begin_date += datetime.timedelta(days=1)
+
+    return date_list
+
+
+def get_range_datetime(begin_date, end_date):
+    """
+    Switch "%Y%m%d" begin_date/end_date into the "%Y-%m-%d %H:%M:%S" range which covers the whole days.
+    """
+    begin_date = str(begin_date)
+    end_date = str(end_date)
+    begin_datetime = str(begin_date[:4]) + '-' + str(begin_date[4:6]) + '-' + str(begin_date[6:8]) + ' 00:00:00'
+    end_datetime = str(end_date[:4]) + '-' + str(end_date[4:6]) + '-' + str(end_date[6:8]) + ' 23:59:59'
+
+    return begin_datetime, end_datetime
+
+
+def get_day_file(db_path, direction, monitor_item, kind, date):
+    """
+    Get day file path <db_path>/<direction>/<monitor_item>/<kind>/<YYYYMMDD>.
+    """
+    return str(db_path) + '/' + str(direction) + '/' + str(monitor_item) + '/' + str(kind) + '/' + str(date)
+
+
+def get_day_file_list(db_path, monitor_item_list, kind, begin_datetime, end_datetime):
+    """
+    Get existing day files of monitor_item_list [(direction, monitor_item), ...] in range, ordered by date.
+    The day file names are computed from the range, so the kind directories are never listed.
+    Return [(direction, monitor_item, date, day_file), ...].
+    """
+    day_file_list = []
+
+    for date in get_date_list(begin_datetime, end_datetime):
+        for (direction, monitor_item) in monitor_item_list:
+            day_file = get_day_file(db_path, direction, monitor_item, kind, date)
+
+            if os.path.isfile(day_file) or os.path.isfile(get_compact_file(day_file)):
+                day_file_list.append((direction, monitor_item, date, day_file))
+
+    return day_file_list
+
+
+def append_catalog_journal(db_path, direction, monitor_item):
+    """
+    Tell the catalog readers that <db_path>/<direction>/<monitor_item>/monitor_item.yaml is changed.
+    """
+    journal_file = str(db_path) + '/' + str(CATALOG_JOURNAL)
+    journal_exists = os.path.exists(journal_file)
+
+    with open(journal_file, 'a') as JF:
+        JF.write(str(direction) + ' ' + str(monitor_item) + '\n')
+
+    if not journal_exists:
+        os.chmod(journal_file, 0o666)
+
+
+def get_mtime(path):
+    """
+    Get mtime (ns) of path, None if path is missing.
+    """
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def load_monitor_item_yaml(monitor_item_yaml):
+    """
+    Load monitor_item.yaml into dict, return None if it is missing or broken.
+    """
+    try:
+        with open(monitor_item_yaml, 'r') as MIF:
+            return yaml.load(MIF, Loader=YAML_LOADER) or {}
+    except (OSError, yaml.YAMLError):
+        return None
+
+
+def refresh_catalog_item(catalog_dic, direction, monitor_item, force=False):
+    """
+    Reload monitor_item.yaml of direction/monitor_item if it is changed (or force).
+    """
+    monitor_item_yaml = str(catalog_dic['db_path']) + '/' + str(direction) + '/' + str(monitor_item) + '/monitor_item.yaml'
+    yaml_mtime = get_mtime(monitor_item_yaml)
+    item_dic = catalog_dic['item_dic'][direction].setdefault(monitor_item, {'info': None, 'yaml_mtime': None})
+
+    if force or (yaml_mtime != item_dic['yaml_mtime']):
+        item_dic['info'] = None if (yaml_mtime is None) else load_monitor_item_yaml(monitor_item_yaml)
+        item_dic['yaml_mtime'] = yaml_mtime
+
+
+def refresh_catalog_direction(catalog_dic, direction, full_check=False):
+    """
+    Relist the monitor items of direction if the direction directory is changed (or full_check).
+    """
+    direction_path = str(catalog_dic['db_path']) + '/' + str(direction)
+    direction_mtime = get_mtime(direction_path)
+
+    if (not full_check) and (direction_mtime == catalog_dic['direction_mtime_dic'].get(direction)):
+        return
+
+    catalog_dic['direction_mtime_dic'][direction] = direction_mtime
+    item_dic = catalog_dic['item_dic'].setdefault(direction, {})
+    monitor_item_list = []
+
+    try:
+        with os.scandir(direction_path) as DS:
+            monitor_item_list = [entry.name for entry in DS if entry.is_dir()]
+    except OSError:
+        pass
+
+    for monitor_item in list(item_dic.keys()):
+        if monitor_item not in monitor_item_list:
+            del item_dic[monitor_item]
+
+    for monitor_item in monitor_item_list:
+        if full_check or (monitor_item not in item_dic):
+            refresh_catalog_item(catalog_dic, direction, monitor_item)
+
+
+def refresh_catalog(catalog_dic):
+    """
+    Bring catalog_dic up to date with a few stat calls.
+    New/removed directions and monitor items are found by directory mtime, changed monitor_item.yaml files by the change journal.
+    """
+    db_path = catalog_dic['db_path']
+    current_time = time.time()
+    full_check = (current_time - catalog_dic['check_time'] > CATALOG_FULL_CHECK_INTERVAL)
+    db_path_mtime = get_mtime(db_path)
+
+    if full_check or (db_path_mtime != catalog_dic['db_path_mtime']):
+        catalog_dic['db_path_mtime'] = db_path_mtime
+        direction_list = []
+
+        try:
+            with os.scandir(db_path) as DS:
+                # Hidden directories, like the alarm spool, are not directions.
+                direction_list = [entry.name for entry in DS if entry.is_dir() and (not entry.name.startswith('.'))]
+        except OSError:
+            pass
+
+        for direction in list(catalog_dic['item_dic'].keys()):
+            if direction not in direction_list:
+                del catalog_dic['item_dic'][direction]
+                catalog_dic['direction_mtime_dic'].pop(direction, None)
+
+        for direction in direction_list:
+            catalog_dic['item_dic'].setdefault(direction, {})
+
+    for direction in catalog_dic['item_dic'].keys():
+        refresh_catalog_direction(catalog_dic, direction, full_check)
+
+    journal_file = str(db_path) + '/' + str(CATALOG_JOURNAL)
+
+    try:
+        journal_size = os.path.getsize(journal_file)
+    except OSError:
+        journal_size = 0
+
+    if journal_size < catalog_dic['journal_offset']:
+        # The journal is truncated, recheck everything next time.
+        catalog_dic['journal_offset'] = 0
+        catalog_dic['check_time'] = 0
+    elif journal_size > catalog_dic['journal_offset']:
+        with open(journal_file, 'rb') as JF:
+            JF.seek(catalog_dic['journal_offset'])
+
+            for line in JF:
+                if not line.endswith(b'\n'):
+                    break
+
+                catalog_dic['journal_offset'] += len(line)
+                fields = line.decode(errors='replace').split()
+
+                if (len(fields) == 2) and (fields[1] in catalog_dic['item_dic'].get(fields[0], {})):
+                    refresh_catalog_item(catalog_dic, fields[0], fields[1], force=True)
+
+    if full_check:
+        catalog_dic['check_time'] = current_time
+
+
+def get_catalog(db_path):
+    """
+    Get the catalog of db_path {direction: {monitor_item: info_dic}}, info_dic is the content of monitor_item.yaml, None if monitor_item.yaml is missing.
+    The catalog is loaded once per process then refreshed incrementally, the info_dic must not be changed by callers.
+    """
+    db_path = str(db_path)
+
+    with CATALOG_LOCK:
+        if db_path not in CATALOG_CACHE_DIC:
+            journal_file = str(db_path) + '/' + str(CATALOG_JOURNAL)
+            # The journal before loading is covered by the first full check.
+            journal_offset = os.path.getsize(journal_file) if os.path.isfile(journal_file) else 0
+            CATALOG_CACHE_DIC[db_path] = {'db_path': db_path, 'db_path_mtime': None, 'direction_mtime_dic': {}, 'journal_offset': journal_offset, 'check_time': 0, 'item_dic': {}}
+
+        catalog_dic = CATALOG_CACHE_DIC[db_path]
+        refresh_catalog(catalog_dic)
+
+        return {direction: {monitor_item: item_dic['info'] for (monitor_item, item_dic) in item_dic_dic.items()} for (direction, item_dic_dic) in catalog_dic['item_dic'].items()}
+
+
+def get_line_time(line):
+    """
+    Get "%Y-%m-%d %H:%M:%S" time string from a raw (bytes) record line.
+    """
+    if line.startswith(LINE_TIME_PREFIX):
+        return line[LINE_TIME_SLICE].decode()
+
+    return json.loads(line)['time']
+
+
+def get_time_bucket(time):
+    """
+    Get the "%H:%M" index bucket of a "%Y-%m-%d %H:%M:%S" time string.
+    """
+    return time[11:16]
+
+
+def get_index_file(day_file):
+    return str(day_file) + INDEX_SUFFIX
+
+
+def append_day_file_index(day_file, bucket, offset):
+    """
+    Record the byte offset of the first line of bucket into the day file index.
+    A bucket may be recorded more than once by different writers, the smallest offset wins.
+    """
+    with open(get_index_file(day_file), 'a') as IF:
+        IF.write(str(bucket) + ' ' + str(offset) + '\n')
+
+
+def read_day_file_index(day_file):
+    """
+    Read the day file index into {bucket: offset}, return {} if day_file is not indexed.
+    """
+    index_dic = {}
+    index_file = get_index_file(day_file)
+
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as IF:
+            for line in IF:
+                fields = line.split()
+
+                if (len(fields) == 2) and fields[1].isdigit():
+                    (bucket, offset) = (fields[0], int(fields[1]))
+
+                    if (bucket not in index_dic) or (offset < index_dic[bucket]):
+                        index_dic[bucket] = offset
+
+    return index_dic
+
+
+def build_day_file_index(day_file):
+    """
+    (Re)build the day file index by scanning day_file, only for closed day files which are not written any more.
+    """
+    index_dic = {}
+    offset = 0
+
+    with open(day_file, 'rb') as DF:
+        for line in DF:
+            if line.strip():
+                bucket = get_time_bucket(get_line_time(line))
+
+                if bucket not in index_dic:
+                    index_dic[bucket] = offset
+
+            offset += len(line)
+
+    index_file = get_index_file(day_file)
+    tmp_index_file = str(index_file) + '.' + str(os.getpid())
+
+    with open(tmp_index_file, 'w') as IF:
+        for (bucket, bucket_offset) in index_dic.items():
+            IF.write(str(bucket) + ' ' + str(bucket_offset) + '\n')
+
+    os.replace(tmp_index_file, index_file)
+
+    return index_dic
+
+
+def get_index_range(day_file, begin_datetime='', end_datetime=''):
+    """
+    Get (begin_offset, end_offset) of day_file covering begin_datetime - end_datetime with the day file index.
+    Any line of a bucket after begin bucket is behind the smallest offset recorded since begin bucket, because every writer records its first line of each bucket.
+    end_offset is None means reading to the end of day_file.
+    """
+    date = os.path.basename(day_file)
+    date = str(date[:4]) + '-' + str(date[4:6]) + '-' + str(date[6:8])
+    begin_in_day = bool(begin_datetime) and (begin_datetime[:10] == date)
+    end_in_day = bool(end_datetime) and (end_datetime[:10] == date)
+    (begin_offset, end_offset) = (0, None)
+
+    if not (begin_in_day or end_in_day):
+        return begin_offset, end_offset
+
+    index_dic = read_day_file_index(day_file)
+
+    if not index_dic:
+        return begin_offset, end_offset
+
+    if begin_in_day:
+        begin_bucket = get_time_bucket(begin_datetime)
+        offset_list = [offset for (bucket, offset) in index_dic.items() if bucket >= begin_bucket]
+        begin_offset = min(offset_list) if offset_list else os.path.getsize(day_file)
+
+    if end_in_day:
+        slack_end_time = datetime.datetime.strptime(end_datetime, '%Y-%m-%d %H:%M:%S') + INDEX_END_SLACK
+
+        if slack_end_time.strftime('%Y-%m-%d') == date:
+            slack_end_bucket = slack_end_time.strftime('%H:%M')
+            offset_list = [offset for (bucket, offset) in index_dic.items() if bucket > slack_end_bucket]
+
+            if offset_list:
+                end_offset = min(offset_list)
+
+    return begin_offset, end_offset
+
+
+def gen_keyword_line_filter(keyword):
+    """
+    Generate a raw line filter for keyword, so lines without keyword are dropped before json decoding.
+    Return None if keyword may be escaped by json.dumps, it must be checked on decoded records then.
+    """
+    if (not keyword) or re.search(r'["\\\x00-\x1f]', keyword):
+        return None
+
+    keyword_bytes = keyword.encode()
+
+    return lambda line: keyword_bytes in line
+
+
+def get_keyword_term_list(keyword):
+    """
+    Split keyword into terms on whitespace, 'disk "no space" host1' => ['disk', 'no space', 'host1'].
+    """
+    return [quoted_term or term for (quoted_term, term) in KEYWORD_TERM.findall(str(keyword))]
+
+
+def gen_record_filters(message_level='', receiver_list=(), keyword='', any_term=False, regex=False, ignore_case=False):
+    """
+    Generate (line_filter_list, record_filter_list) for read_records, so every record is checked once while reading.
+      message_level: keep the records of message_level.
+      receiver_list: keep the alarm records sent to any of receiver_list.
+      keyword:       keep the records whose message contains all terms of keyword (any of them with any_term=True),
+                     terms are regular expressions with regex=True, and are matched case-insensitively with ignore_case=True.
+    The keyword patterns are compiled here once, re.error is raised for an invalid regular expression.
+    Raw line filters are added for the plain values, they are necessary (not sufficient) conditions checked before json decoding.
+    """
+    line_filter_list = []
+    record_filter_list = []
+
+    # Check message_level.
+    if message_level:
+        level_line_filter = gen_keyword_line_filter(str(message_level))
+
+        if level_line_filter:
+            line_filter_list.append(level_line_filter)
+
+        record_filter_list.append(lambda record_dic: record_dic.get('message_level') == message_level)
+
+    # Check receiver_list.
+    receiver_set = set(receiver for receiver in receiver_list if receiver)
+
+    if receiver_set:
+        receiver_line_filter_list = [gen_keyword_line_filter(receiver) for receiver in receiver_set]
+
+        if all(receiver_line_filter_list):
+            line_filter_list.append(lambda line: any(receiver_line_filter(line) for receiver_line_filter in receiver_line_filter_list))
+
+        record_filter_list.append(lambda record_dic: not receiver_set.isdisjoint(RECEIVER_SEPARATOR.split(str(record_dic.get('receivers', '')))))
+
+    # Check keyword.
+    term_list = get_keyword_term_list(keyword)
+
+    if term_list:
+        flags = re.IGNORECASE if ignore_case else 0
+        pattern_list = [re.compile(term if regex else re.escape(term), flags) for term in term_list]
+        term_line_filter_list = []
+
+        if (not regex) and (not ignore_case):
+            term_line_filter_list = [gen_keyword_line_filter(term) for term in term_list]
+
+        if any_term:
+            if term_line_filter_list and all(term_line_filter_list):
+                line_filter_list.append(lambda line: any(term_line_filter(line) for term_line_filter in term_line_filter_list))
+
+            record_filter_list.append(lambda record_dic: any(pattern.search(str(record_dic.get('message', ''))) for pattern in pattern_list))
+        else:
+            line_filter_list.extend(term_line_filter for term_line_filter in term_line_filter_list if term_line_filter)
+            record_filter_list.append(lambda record_dic: all(pattern.search(str(record_dic.get('message', ''))) for pattern in pattern_list))
+
+    return line_filter_list, record_filter_list
+
+
+def iter_day_file_lines(day_file, begin_datetime='', end_datetime='', line_filter_list=(), offset_dic=None):
+    """
+    Yield (time, line) for raw record lines of day_file between begin_datetime and end_datetime.
+    Time is compared as string, "%Y-%m-%d %H:%M:%S" sorts the same as datetime.
+    The day file index (if any) is used to seek to begin_datetime and stop soon after end_datetime.
+    offset_dic[day_file] is set to the byte offset read to, if day_file is read to the end.
+    """
+    (begin_offset, end_offset) = get_index_range(day_file, begin_datetime, end_datetime)
+
+    with open(day_file, 'rb') as DF:
+        position = begin_offset
+
+        if begin_offset:
+            # Make sure to start on a line boundary.
+            DF.seek(begin_offset - 1)
+
+            if DF.read(1) != b'\n':
+                position += len(DF.readline())
+
+        for line in DF:
+            if (end_offset is not None) and (position >= end_offset):
+                return
+
+            # The last line may be still being written.
+            if not line.endswith(b'\n'):
+                break
+
+            position += len(line)
+
+            if not line.strip():
+                continue
+
+            time = get_line_time(line)
+
+            if (begin_datetime and (time < begin_datetime)) or (end_datetime and (time > end_datetime)):
+                continue
+
+            if line_filter_list and (not all(line_filter(line) for line_filter in line_filter_list)):
+                continue
+
+            yield time, line
+
+    if offset_dic is not None:
+        offset_dic[day_file] = position
+
+
+def get_compact_file(day_file):
+    return str(day_file) + COMPACT_SUFFIX
+
+
+def compact_day_file(day_file):
+    """
+    Compact closed day_file into <YYYYMMDD>.npz.
+    Field values are stored as json text, so every value type is kept as it is.
+    Nothing is pickled, the db_path is shared by all users.
+    """
+    import numpy
+    import pandas
+
+    source_size = os.path.getsize(day_file)
+    record_list = []
+    field_list = []
+
+    with open(day_file, 'rb') as DF:
+        for line in DF:
+            if line.strip():
+                record_dic = json.loads(line)
+                record_list.append(record_dic)
+
+                for field in record_dic:
+                    if (field != 'time') and (field not in field_list):
+                        field_list.append(field)
+
+    array_dic = {'time': pandas.to_datetime([record_dic['time'] for record_dic in record_list], format='%Y-%m-%d %H:%M:%S').values.astype('datetime64[s]')}
+
+    for (i, field) in enumerate(field_list):
+        value_list = [json.dumps(record_dic[field], ensure_ascii=False) if field in record_dic else None for record_dic in record_list]
+        (code_array, unique_array) = pandas.factorize(pandas.Series(value_list, dtype=object))
+        # json text never contains a raw newline, so the unique values can be joined with it.
+        array_dic['codes_' + str(i)] = code_array.astype(numpy.int32)
+        array_dic['values_' + str(i)] = numpy.frombuffer('\n'.join(unique_array).encode(), dtype=numpy.uint8)
+
+    array_dic['meta'] = numpy.frombuffer(json.dumps({'field_list': field_list, 'source_size': source_size}).encode(), dtype=numpy.uint8)
+
+    compact_file = get_compact_file(day_file)
+    tmp_compact_file = str(compact_file) + '.' + str(os.getpid())
+
+    with open(tmp_compact_file, 'wb') as CF:
+        numpy.savez_compressed(CF, **array_dic)
+
+    os.replace(tmp_compact_file, compact_file)
+
+    return len(record_list)
+
+
+def load_compact_day_file(day_file):
+    """
+    Load the compacted day_file into {'source_size': ..., 'time_array': ..., 'time_list': [...], 'field_list': [...], 'code_dic': {...}, 'value_dic': {...}}.
+    Return None if day_file is not compacted, or day_file is appended after compaction.
+    """
+    compact_file = get_compact_file(day_file)
+
+    if not os.path.isfile(compact_file):
+        return None
+
+    import numpy
+
+    with numpy.load(compact_file, allow_pickle=False) as CF:
+        meta_dic = json.loads(CF['meta'].tobytes().decode())
+
+        if os.path.isfile(day_file) and (os.path.getsize(day_file) != meta_dic['source_size']):
+            return None
+
+        time_array = CF['time']
+        compact_dic = {'source_size': meta_dic['source_size'],
+                       'time_array': time_array,
+                       'time_list': numpy.char.replace(numpy.datetime_as_string(time_array, unit='s'), 'T', ' ').tolist(),
+                       'field_list': meta_dic['field_list'],
+                       'code_dic': {},
+                       'value_dic': {}}
+
+        for (i, field) in enumerate(meta_dic['field_list']):
+            values = CF['values_' + str(i)].tobytes().decode()
+            compact_dic['code_dic'][field] = CF['codes_' + str(i)]
+            compact_dic['value_dic'][field] = [json.loads(value) for value in values.split('\n')] if values else []
+
+    return compact_dic
+
+
+def get_compact_index_array(compact_dic, begin_datetime='', end_datetime=''):
+    """
+    Get row indexes of compact_dic between begin_datetime and end_datetime, compared on the time column.
+    """
+    import numpy
+
+    time_array = compact_dic['time_array']
+    mask = numpy.ones(len(time_array), dtype=bool)
+
+    if begin_datetime:
+        mask &= (time_array >= numpy.datetime64(begin_datetime.replace(' ', 'T'), 's'))
+
+    if end_datetime:
+        mask &= (time_array <= numpy.datetime64(end_datetime.replace(' ', 'T'), 's'))
+
+    return numpy.flatnonzero(mask)
+
+
+def iter_day_file_rows(day_file, begin_datetime='', end_datetime='', line_filter_list=(), cache=False, offset_dic=None):
+    """
+    Yield (time, row) of day_file between begin_datetime and end_datetime, decode row with decode_row.
+    row is a decoded record from DAY_FILE_CACHE, a raw record line, or (compact_dic, index) if day_file is compacted.
+    cache=True decodes and caches the whole day_file, otherwise DAY_FILE_CACHE is only used if day_file is cached already.
+    line_filter_list only applies to raw record lines, recheck with the decoded records.
+    offset_dic[day_file] is set to the byte offset of the json day file the rows are read to, for tailing it after, see iter_day_file_lines.
+    """
+    day_file_block = DAY_FILE_CACHE.get(day_file, load=cache)
+
+    if day_file_block is not None:
+        (time_list, record_list) = (day_file_block['time_list'], day_file_block['record_list'])
+
+        if day_file_block['sorted']:
+            begin_index = bisect.bisect_left(time_list, begin_datetime) if begin_datetime else 0
+            end_index = bisect.bisect_right(time_list, end_datetime) if end_datetime else len(time_list)
+
+            for index in range(begin_index, end_index):
+                yield time_list[index], record_list[index]
+        else:
+            for (time, record_dic) in zip(time_list, record_list):
+                if (not begin_datetime or (time >= begin_datetime)) and (not end_datetime or (time <= end_datetime)):
+                    yield time, record_dic
+
+        if (offset_dic is not None) and (day_file_block['source_file'] == day_file):
+            offset_dic[day_file] = day_file_block['source_size']
+
+        return
+
+    compact_dic = load_compact_day_file(day_file)
+
+    if compact_dic is None:
+        yield from iter_day_file_lines(day_file, begin_datetime, end_datetime, line_filter_list, offset_dic)
+        return
+
+    time_list = compact_dic['time_list']
+
+    for index in get_compact_index_array(compact_dic, begin_datetime, end_datetime).tolist():
+        yield time_list[index], (compact_dic, index)
+
+
+def decode_row(row):
+    """
+    Decode a row from iter_day_file_rows into record dict, the record dict can be changed by the caller.
+    """
+    if isinstance(row, dict):
+        return dict(row)
+
+    if isinstance(row, bytes):
+        return json.loads(row)
+
+    (compact_dic, index) = row
+    record_dic = {'time': compact_dic['time_list'][index]}
+
+    for field in compact_dic['field_list']:
+        code = compact_dic['code_dic'][field][index]
+
+        if code >= 0:
+            record_dic[field] = compact_dic['value_dic'][field][code]
+
+    return record_dic
+
+
+class DayFileCache():
+    """
+    Process-wide LRU cache of decoded day files, bounded by the total size of the cached day files.
+    A cached day file is keyed by its path, and validated with (mtime, size) on every access:
+    * Closed day files never change, they are kept until evicted.
+    * Today's day file only grows, just the appended records are decoded.
+    """
+    def __init__(self, max_size=DAY_FILE_CACHE_DEFAULT_MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.block_dic = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.stats_dic = {'hit': 0, 'miss': 0, 'extend': 0, 'eviction': 0}
+
+    def set_max_size(self, max_size):
+        """
+        Set max total size (bytes) of the cached day files, 0 disables the cache.
+        """
+        with self.lock:
+            self.max_size = max_size
+            self.evict()
+
+    def get_source(self, day_file):
+        """
+        Get (source_file, mtime, size) which day_file is decoded from, source_file is '' if day_file is missing.
+        """
+        for source_file in [day_file, get_compact_file(day_file)]:
+            try:
+                stat = os.stat(source_file)
+                return source_file, stat.st_mtime_ns, stat.st_size
+            except OSError:
+                pass
+
+        return '', None, 0
+
+    def get(self, day_file, load=True):
+        """
+        Get the decoded day file block {'time_list': [...], 'record_list': [...], 'sorted': bool}.
+        Return None if day_file is not cached and load is False, or the cache is disabled.
+        """
+        if self.max_size <= 0:
+            return None
+
+        (source_file, mtime, size) = self.get_source(day_file)
+
+        with self.lock:
+            day_file_block = self.block_dic.get(day_file)
+
+            if day_file_block and (day_file_block['source_file'] == source_file) and (day_file_block['mtime'] == mtime) and (day_file_block['size'] == size):
+                self.block_dic.move_to_end(day_file)
+                self.stats_dic['hit'] += 1
+                return day_file_block
+
+        if not source_file:
+            return None
+
+        if day_file_block and (source_file == day_file) and (day_file_block['source_file'] == day_file) and (day_file_block['source_size'] <= size):
+            # Today's day file is appended, decode the new records only.
+            if not load:
+                return None
+
+            day_file_block = self.extend(day_file_block, mtime, size)
+            stats_key = 'extend'
+        elif load:
+            day_file_block = self.load(day_file, source_file, mtime, size)
+            stats_key = 'miss'
+        else:
+            return None
+
+        with self.lock:
+            self.stats_dic[stats_key] += 1
+
+            if day_file in self.block_dic:
+                self.size -= self.block_dic.pop(day_file)['source_size']
+
+            if day_file_block['source_size'] <= self.max_size:
+                self.block_dic[day_file] = day_file_block
+                self.size += day_file_block['source_size']
+                self.evict()
+
+        return day_file_block
+
+    def load(self, day_file, source_file, mtime, size):
+        """
+        Decode the whole day_file into a new day file block.
+        """
+        day_file_block = {'source_file': source_file, 'mtime': mtime, 'size': size, 'source_size': size, 'time_list': [], 'record_list': [], 'sorted': True}
+
+        if source_file == day_file:
+            return self.extend(day_file_block, mtime, size, 0)
+
+        # Only the compacted day file is left, count it by the json day file size for the cache size.
+        compact_dic = load_compact_day_file(day_file)
+
+        if compact_dic is not None:
+            day_file_block['source_size'] = compact_dic['source_size']
+
+            for (index, time) in enumerate(compact_dic['time_list']):
+                self.append(day_file_block, time, decode_row((compact_dic, index)))
+
+        return day_file_block
+
+    def extend(self, day_file_block, mtime, size, source_size=None):
+        """
+        Decode the records appended to the raw day file since day_file_block['source_size'] into a new day file block.
+        """
+        if source_size is None:
+            source_size = day_file_block['source_size']
+
+        day_file = day_file_block['source_file']
+        day_file_block = {'source_file': day_file, 'mtime': mtime, 'size': size, 'source_size': source_size, 'time_list': list(day_file_block['time_list']), 'record_list': list(day_file_block['record_list']), 'sorted': day_file_block['sorted']}
+
+        if source_size == 0:
+            (day_file_block['time_list'], day_file_block['record_list']) = ([], [])
+
+        with open(day_file, 'rb') as DF:
+            DF.seek(source_size)
+
+            for line in DF:
+                # The last line may be still being written.
+                if not line.endswith(b'\n'):
+                    break
+
+                day_file_block['source_size'] += len(line)
+
+                if line.strip():
+                    record_dic = json.loads(line)
+                    self.append(day_file_block, record_dic['time'], record_dic)
+
+        return day_file_block
+
+    def append(self, day_file_block, time, record_dic):
+        if day_file_block['time_list'] and (time < day_file_block['time_list'][-1]):
+            day_file_block['sorted'] = False
+
+        day_file_block['time_list'].append(time)
+        day_file_block['record_list'].append(record_dic)
+
+    def evict(self):
+        """
+        Evict the least recently used day files until the cache fits max_size, must be called with self.lock.
+        """
+        while self.block_dic and (self.size > self.max_size):
+            (day_file, day_file_block) = self.block_dic.popitem(last=False)
+            self.size -= day_file_block['source_size']
+            self.stats_dic['eviction'] += 1
+
+    def get_stats(self):
+        """
+        Get cache statistics.
+        """
+        with self.lock:
+            stats_dic = dict(self.stats_dic)
+            stats_dic.update({'day_file_num': len(self.block_dic), 'size': self.size, 'max_size': self.max_size})
+
+        lookup_num = stats_dic['hit'] + stats_dic['miss'] + stats_dic['extend']
+        stats_dic['hit_rate'] = round(float(stats_dic['hit']) / lookup_num, 4) if lookup_num else 0.0
+
+        return stats_dic
+
+
+DAY_FILE_CACHE = DayFileCache()
+
+
+def is_whole_day(day_file, begin_datetime='', end_datetime=''):
+    """
+    Check whether begin_datetime - end_datetime covers the whole day of day_file.
+    """
+    date = os.path.basename(day_file)
+    date = str(date[:4]) + '-' + str(date[4:6]) + '-' + str(date[6:8])
+
+    return ((not begin_datetime) or (begin_datetime <= str(date) + ' 00:00:00')) and ((not end_datetime) or (end_datetime >= str(date) + ' 23:59:59'))
+
+
+def count_day_file_records(day_file, begin_datetime='', end_datetime=''):
+    """
+    Count records of day_file between begin_datetime and end_datetime, without decoding them.
+    """
+    compact_dic = load_compact_day_file(day_file)
+
+    if compact_dic is not None:
+        return len(get_compact_index_array(compact_dic, begin_datetime, end_datetime))
+
+    date = os.path.basename(day_file)
+    date = str(date[:4]) + '-' + str(date[4:6]) + '-' + str(date[6:8])
+
+    if ((not begin_datetime) or (begin_datetime[:10] < date)) and ((not end_datetime) or (date < end_datetime[:10])):
+        # Count the lines iter_day_file_lines yields, blank lines and the line being written are skipped.
+        with open(day_file, 'rb') as DF:
+            return sum(1 for line in DF if line.endswith(b'\n') and line.strip())
+
+    return sum(1 for _ in iter_day_file_lines(day_file, begin_datetime, end_datetime))
+
+
+def read_records(db_path, monitor_item_list, kind, begin_datetime, end_datetime, line_filter_list=(), record_filter_list=(), cache=True, offset_dic=None):
+    """
+    Lazily yield (direction, monitor_item, record_dic) from the day files of monitor_item_list in range.
+    line_filter_list:   callables on the raw line (bytes), applied before json decoding, skipped on compacted day files.
+    record_filter_list: callables on the decoded record dict, they must not change it.
+    cache=False does not load the day files into DAY_FILE_CACHE, for one-off full reads like exporting.
+    offset_dic gets {day_file: byte offset} of the json day files read to the end, tail_day_file from there misses nothing.
+    """
+    begin_datetime = str(begin_datetime).strip()
+    end_datetime = str(end_datetime).strip()
+
+    for (direction, monitor_item, date, day_file) in get_day_file_list(db_path, monitor_item_list, kind, begin_datetime, end_datetime):
+        for (time, row) in iter_day_file_rows(day_file, begin_datetime, end_datetime, line_filter_list, cache=cache, offset_dic=offset_dic):
+            # Check a cached record before copying it, record filters do not change the record.
+            record_dic = row if isinstance(row, dict) else decode_row(row)
+
+            if record_filter_list and (not all(record_filter(record_dic) for record_filter in record_filter_list)):
+                continue
+
+            if record_dic is row:
+                record_dic = decode_row(row)
+
+            yield direction, monitor_item, record_dic
+
+
+def tail_day_file(day_file, offset, line_filter_list=(), record_filter_list=()):
+    """
+    Read the records appended to day_file after byte offset, return (record_list, new_offset).
+    Only complete lines are read, the line being written is read next time. Nothing is read if day_file has not grown.
+    """
+    record_list = []
+
+    try:
+        size = os.path.getsize(day_file)
+    except OSError:
+        # Not created yet.
+        return record_list, offset
+
+    if size < offset:
+        # Replaced by a smaller file, read it again.
+        offset = 0
+
+    if size == offset:
+        return record_list, offset
+
+    with open(day_file, 'rb') as DF:
+        DF.seek(offset)
+        data = DF.read(size - offset)
+
+    data_size = data.rfind(b'\n') + 1
+
+    for line in data[:data_size].splitlines():
+        if (not line.strip()) or (line_filter_list and (not all(line_filter(line) for line_filter in line_filter_list))):
+            continue
+
+        record_dic = json.loads(line)
+
+        if record_filter_list and (not all(record_filter(record_dic) for record_filter in record_filter_list)):
+            continue
+
+        record_list.append(record_dic)
+
+    return record_list, offset + data_size
+
+
+def get_export_format(export_file):
+    """
+    Get the export format (csv/csv.gz/parquet) by the suffix of export_file, '' if it is not supported.
+    """
+    for (suffix, export_format) in EXPORT_FORMAT_DIC.items():
+        if str(export_file).endswith(suffix):
+            return export_format
+
+    return ''
+
+
+def iter_record_batches(record_iter, batch_size=EXPORT_BATCH_SIZE):
+    record_list = []
+
+    for record_dic in record_iter:
+        record_list.append(record_dic)
+
+        if len(record_list) >= batch_size:
+            yield record_list
+            record_list = []
+
+    if record_list:
+        yield record_list
+
+
+def export_records(export_file, title_list, field_list, record_iter):
+    """
+    Stream records (an iterable of record dicts) into export_file with title_list as header, field_list are the record keys of the columns.
+    The format is by the suffix of export_file (csv/csv.gz/parquet), parquet needs pyarrow.
+    It is written to "<export_file>.tmp" first, export_file is only replaced after all records are written. Return the record number.
+    """
+    export_format = get_export_format(export_file)
+
+    if not export_format:
+        raise ValueError('"' + str(export_file) + '": Unsupported export format, the suffix should be ' + str('/'.join(EXPORT_FORMAT_DIC.keys())) + '.')
+
+    tmp_file = str(export_file) + '.tmp'
+    record_num = 0
+
+    try:
+        if export_format == 'parquet':
+            # pyarrow is only needed by parquet export, import it here.
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError('pyarrow is required for parquet export, install it with "pip install pyarrow".')
+
+            schema = pyarrow.schema([(title, pyarrow.string()) for title in title_list])
+            PW = pyarrow.parquet.ParquetWriter(tmp_file, schema)
+
+            try:
+                for record_list in iter_record_batches(record_iter):
+                    column_list_list = [[str(record_dic.get(field, '')) for record_dic in record_list] for field in field_list]
+                    PW.write_table(pyarrow.Table.from_arrays(column_list_list, schema=schema))
+                    record_num += len(record_list)
+            finally:
+                PW.close()
+        else:
+            if export_format == 'csv.gz':
+                EF = gzip.open(tmp_file, 'wt', encoding='utf-8', newline='')
+            else:
+                EF = open(tmp_file, 'w', encoding='utf-8', newline='')
+
+            with EF:
+                CW = csv.writer(EF)
+                CW.writerow(title_list)
+
+                for record_dic in record_iter:
+                    CW.writerow([record_dic.get(field, '') for field in field_list])
+                    record_num += 1
+
+        os.replace(tmp_file, export_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+        raise
+
+    return record_num
+
+
+def get_rollup_file(day_file):
+    return str(day_file) + ROLLUP_SUFFIX
+
+
+def gen_rollup(kind):
+    """
+    Generate an empty rollup of kind.
+      log:       {'count': n, 'message_level': {message_level: n}}
+      alarm:     {'count': n, 'md5': {md5: n}, 'receiver': {receiver: n}}
+      heartbeat: {'count': n, 'first_time': time, 'last_time': time}
+    """
+    rollup_dic = {'kind': kind, 'source_size': 0, 'count': 0}
+
+    if kind == 'log':
+        rollup_dic['message_level'] = {}
+    elif kind == 'alarm':
+        rollup_dic['md5'] = {}
+        rollup_dic['receiver'] = {}
+    elif kind == 'heartbeat':
+        rollup_dic['first_time'] = ''
+        rollup_dic['last_time'] = ''
+
+    return rollup_dic
+
+
+def update_rollup(rollup_dic, record_dic):
+    """
+    Roll up one decoded record into rollup_dic.
+    """
+    kind = rollup_dic['kind']
+    rollup_dic['count'] += 1
+
+    if kind == 'log':
+        message_level = str(record_dic.get('message_level', ''))
+        rollup_dic['message_level'][message_level] = rollup_dic['message_level'].get(message_level, 0) + 1
+    elif kind == 'alarm':
+        md5 = str(record_dic.get('md5', ''))
+        rollup_dic['md5'][md5] = rollup_dic['md5'].get(md5, 0) + 1
+
+        for receiver in RECEIVER_SEPARATOR.split(str(record_dic.get('receivers', ''))):
+            if receiver:
+                rollup_dic['receiver'][receiver] = rollup_dic['receiver'].get(receiver, 0) + 1
+    elif kind == 'heartbeat':
+        time = record_dic['time']
+
+        if (not rollup_dic['first_time']) or (time < rollup_dic['first_time']):
+            rollup_dic['first_time'] = time
+
+        if time > rollup_dic['last_time']:
+            rollup_dic['last_time'] = time
+
+
+def read_day_file_rollup(day_file, kind):
+    """
+    Get the rollup of the whole day_file.
+    It is read from <YYYYMMDD>.rollup, only the records appended since last time are decoded, then the rollup file is refreshed.
+    """
+    rollup_file = get_rollup_file(day_file)
+    rollup_dic = None
+
+    if os.path.isfile(rollup_file):
+        try:
+            with open(rollup_file, 'r') as RF:
+                rollup_dic = json.load(RF)
+        except (OSError, ValueError):
+            rollup_dic = None
+
+        if rollup_dic and (rollup_dic.get('kind') != kind):
+            rollup_dic = None
+
+    if os.path.isfile(day_file):
+        day_file_size = os.path.getsize(day_file)
+
+        if (rollup_dic is None) or (rollup_dic['source_size'] > day_file_size):
+            rollup_dic = gen_rollup(kind)
+
+        if rollup_dic['source_size'] == day_file_size:
+            return rollup_dic
+
+        with open(day_file, 'rb') as DF:
+            DF.seek(rollup_dic['source_size'])
+            position = rollup_dic['source_size']
+
+            for line in DF:
+                # The last line may be still being written.
+                if not line.endswith(b'\n'):
+                    break
+
+                position += len(line)
+
+                if line.strip():
+                    update_rollup(rollup_dic, json.loads(line))
+
+        rollup_dic['source_size'] = position
+    elif rollup_dic is None:
+        # Only the compacted day file is left, it is not appended any more.
+        compact_dic = load_compact_day_file(day_file)
+        rollup_dic = gen_rollup(kind)
+
+        if compact_dic is None:
+            return rollup_dic
+
+        for index in range(len(compact_dic['time_list'])):
+            update_rollup(rollup_dic, decode_row((compact_dic, index)))
+
+        rollup_dic['source_size'] = compact_dic['source_size']
+    else:
+        return rollup_dic
+
+    # The rollup is only a cache, ignore it if db_path is not writable.
+    tmp_rollup_file = str(rollup_file) + '.' + str(os.getpid())
+
+    try:
+        with open(tmp_rollup_file, 'w') as RF:
+            json.dump(rollup_dic, RF, ensure_ascii=False)
+
+        os.replace(tmp_rollup_file, rollup_file)
+    except OSError:
+        pass
+
+    return rollup_dic
+
+
+def get_day_file_rollup(day_file, kind, begin_datetime='', end_datetime=''):
+    """
+    Get the rollup of day_file records between begin_datetime and end_datetime.
+    A whole day comes from the day file rollup, a day which is partly in range is rolled up from its records in range.
+    """
+    if is_whole_day(day_file, begin_datetime, end_datetime):
+        return read_day_file_rollup(day_file, kind)
+
+    rollup_dic = gen_rollup(kind)
+
+    for (time, row) in iter_day_file_rows(day_file, begin_datetime, end_datetime):
+        update_rollup(rollup_dic, decode_row(row))
+
+    return rollup_dic
+
+
+def read_rollups(db_path, monitor_item_list, kind, begin_datetime, end_datetime):
+    """
+    Lazily yield (direction, monitor_item, date, rollup_dic) for the day files of monitor_item_list in range.
+    """
+    begin_datetime = str(begin_datetime).strip()
+    end_datetime = str(end_datetime).strip()
+
+    for (direction, monitor_item, date, day_file) in get_day_file_list(db_path, monitor_item_list, kind, begin_datetime, end_datetime):
+        yield direction, monitor_item, date, get_day_file_rollup(day_file, kind, begin_datetime, end_datetime)
+
+
+def get_trend(db_path, monitor_item_list, kind, begin_datetime, end_datetime, bucket='hour'):
+    """
+    Count the records of kind in time buckets, return {series: {bucket_time: count}}.
+      bucket:      "minute"/"hour"/"day", bucket_time is the time prefix, like "2024-11-01 13" for an hour.
+      series:      message_level for log, kind for alarm and heartbeat.
+    Day buckets come from the day file rollups, minute/hour buckets are counted from the record times, only log records are decoded.
+    """
+    begin_datetime = str(begin_datetime).strip()
+    end_datetime = str(end_datetime).strip()
+    trend_dic = {}
+
+    if bucket == 'day':
+        for (direction, monitor_item, date, rollup_dic) in read_rollups(db_path, monitor_item_list, kind, begin_datetime, end_datetime):
+            bucket_time = datetime.datetime.strptime(str(date), '%Y%m%d').strftime('%Y-%m-%d')
+
+            if kind == 'log':
+                for (message_level, count) in rollup_dic['message_level'].items():
+                    trend_dic.setdefault(message_level, collections.Counter())[bucket_time] += count
+            elif rollup_dic['count']:
+                trend_dic.setdefault(kind, collections.Counter())[bucket_time] += rollup_dic['count']
+    else:
+        bucket_size = TREND_BUCKET_SIZE_DIC[bucket]
+
+        for (direction, monitor_item, date, day_file) in get_day_file_list(db_path, monitor_item_list, kind, begin_datetime, end_datetime):
+            row_iter = iter_day_file_rows(day_file, begin_datetime, end_datetime, cache=(kind == 'log'))
+
+            if kind == 'log':
+                counter = collections.Counter((str((row if isinstance(row, dict) else decode_row(row)).get('message_level', '')), time[:bucket_size]) for (time, row) in row_iter)
+
+                for ((message_level, bucket_time), count) in counter.items():
+                    trend_dic.setdefault(message_level, collections.Counter())[bucket_time] += count
+            else:
+                trend_dic.setdefault(kind, collections.Counter()).update(time[:bucket_size] for (time, row) in row_iter)
+
+    return {series: dict(counter) for (series, counter) in trend_dic.items()}
+
+
+def get_alarm_counter_file(monitor_item_dir):
+    return str(monitor_item_dir) + '/' + str(ALARM_COUNTER_FILE)
+
+
+def gen_alarm_counter(monitor_item_dir):
+    """
+    Count the alarms of today's alarm day file, for the monitor items which alarmed before the counter store.
+    """
+    counter_dic = {}
+    current_datetime = datetime.datetime.now()
+    alarm_day_file = str(monitor_item_dir) + '/alarm/' + current_datetime.strftime('%Y%m%d')
+
+    if not os.path.exists(alarm_day_file):
+        return counter_dic
+
+    for (time_string, row) in iter_day_file_rows(alarm_day_file):
+        md5 = decode_row(row).get('md5')
+
+        # Legacy or hand-written alarm lines may have no md5.
+        if not md5:
+            continue
+
+        alarm_datetime = datetime.datetime.strptime(time_string, '%Y-%m-%d %H:%M:%S')
+        update_alarm_counter_dic(counter_dic, md5, alarm_datetime.timestamp())
+
+    return counter_dic
+
+
+def update_alarm_counter_dic(counter_dic, md5, timestamp):
+    """
+    Count one alarm of md5 sent at timestamp.
+    """
+    alarm_datetime = datetime.datetime.fromtimestamp(timestamp)
+    date = alarm_datetime.strftime('%Y%m%d')
+    hour = alarm_datetime.strftime('%Y%m%d%H')
+    md5_counter_dic = counter_dic.setdefault(md5, {'date': date, 'day_count': 0, 'hour': hour, 'hour_count': 0, 'last_time': 0})
+
+    if md5_counter_dic['date'] != date:
+        md5_counter_dic['date'] = date
+        md5_counter_dic['day_count'] = 0
+
+    if md5_counter_dic['hour'] != hour:
+        md5_counter_dic['hour'] = hour
+        md5_counter_dic['hour_count'] = 0
+
+    md5_counter_dic['day_count'] += 1
+    md5_counter_dic['hour_count'] += 1
+    md5_counter_dic['last_time'] = max(md5_counter_dic['last_time'], timestamp)
+
+
+def read_alarm_counter(monitor_item_dir, md5):
+    """
+    Get (day_count, hour_count, last_time) of md5 for the current day and hour, last_time is 0 if md5 never alarmed.
+    """
+    counter_dic = None
+    counter_file = get_alarm_counter_file(monitor_item_dir)
+
+    try:
+        with open(counter_file, 'r') as ACF:
+            fcntl.flock(ACF, fcntl.LOCK_SH)
+            content = ACF.read()
+
+        if content:
+            counter_dic = json.loads(content)
+    except FileNotFoundError:
+        pass
+    except ValueError:
+        # A truncated or corrupt counter store, update_alarm_counter rewrites it.
+        counter_dic = None
+
+    if not isinstance(counter_dic, dict):
+        counter_dic = gen_alarm_counter(monitor_item_dir)
+
+    md5_counter_dic = counter_dic.get(md5)
+
+    if not md5_counter_dic:
+        return 0, 0, 0
+
+    current_datetime = datetime.datetime.now()
+    day_count = md5_counter_dic['day_count'] if md5_counter_dic['date'] == current_datetime.strftime('%Y%m%d') else 0
+    hour_count = md5_counter_dic['hour_count'] if md5_counter_dic['hour'] == current_datetime.strftime('%Y%m%d%H') else 0
+
+    return day_count, hour_count, md5_counter_dic['last_time']
+
+
+def update_alarm_counter(monitor_item_dir, md5, timestamp=None):
+    """
+    Count one alarm of md5 into the alarm counter store, under an exclusive lock so concurrent scripts never lose a count.
+    It must be called before the alarm is written into alarm day file, a new counter store counts today's alarm day file first.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+
+    counter_file = get_alarm_counter_file(monitor_item_dir)
+    counter_file_exists = os.path.exists(counter_file)
+
+    with open(counter_file, 'a+') as ACF:
+        fcntl.flock(ACF, fcntl.LOCK_EX)
+        ACF.seek(0)
+        content = ACF.read()
+
+        try:
+            counter_dic = json.loads(content) if content else gen_alarm_counter(monitor_item_dir)
+        except ValueError:
+            counter_dic = gen_alarm_counter(monitor_item_dir)
+
+        if not isinstance(counter_dic, dict):
+            counter_dic = gen_alarm_counter(monitor_item_dir)
+
+        update_alarm_counter_dic(counter_dic, md5, timestamp)
+
+        for expired_md5 in [counter_md5 for (counter_md5, counter_md5_dic) in counter_dic.items() if timestamp - counter_md5_dic['last_time'] > ALARM_COUNTER_KEEP_TIME]:
+            del counter_dic[expired_md5]
+
+        ACF.seek(0)
+        ACF.truncate()
+        ACF.write(json.dumps(counter_dic))
+        ACF.flush()
+
+    if not counter_file_exists:
+        try:
+            os.chmod(counter_file, 0o666)
+        except OSError:
+            pass
@@ -4,15 +4,65 @@ import os
 import re
 import sys
 import json
+import time
 import yaml
 import copy
-import pandas
+import queue
+import atexit
+import signal
 import socket
 import getpass
 import hashlib
 import datetime
+import threading
 import subprocess
 
+# Web and GUI import "common.common_monitor", the monitor scripts "common_monitor", take common_db the same way, so a process has one day file cache.
+try:
+    from . import common_db
+except ImportError:
+    sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+    import common_db
+
+# Buffered write mode of SaveLog, the buffered lines are flushed once they reach BUFFER_FLUSH_SIZE bytes, or every BUFFER_FLUSH_INTERVAL seconds.
+BUFFER_FLUSH_SIZE = 64 * 1024
+BUFFER_FLUSH_INTERVAL = 1.0
+# DayFileWriter closes the least recently written day files beyond this number.
+DAY_FILE_WRITER_MAX_OPEN_NUM = 256
+# The DayFileWriter shared by all buffered SaveLog instances of the process.
+DAY_FILE_WRITER = None
+
+# Asynchronous alarm mode of SaveLog, pending alarms are spooled under <db_path>/<ALARM_SPOOL_DIR> until they are done.
+ALARM_SPOOL_DIR = '.alarm_spool'
+# Failed alarms are retried after ALARM_RETRY_INTERVAL, 2 * ALARM_RETRY_INTERVAL, 4 * ALARM_RETRY_INTERVAL ... seconds.
+ALARM_RETRY_INTERVAL = 1.0
+# At exit, the pending alarms are waited for at most ALARM_EXIT_WAIT_TIME seconds, the rest are left in spool for the next dispatcher.
+ALARM_EXIT_WAIT_TIME = 3.0
+# The AlarmDispatcher shared by all asynchronous SaveLog instances of the process.
+ALARM_DISPATCHER = None
+ALARM_DISPATCHER_LOCK = threading.Lock()
+
+# Local collector (tools/monitor_collector) client, SaveLog ships events to it if "collector_socket" is set on config.py and the collector is running.
+COLLECTOR_TIMEOUT = 1.0
+# The CollectorClient shared by all SaveLog instances of the process, False means not connected yet.
+COLLECTOR_CLIENT = False
+COLLECTOR_CLIENT_LOCK = threading.Lock()
+
+# HTTP transport of SaveLog (ingest_url), events are posted to web /ingest in batches of INGEST_BATCH_SIZE, or every BUFFER_FLUSH_INTERVAL seconds.
+INGEST_BATCH_SIZE = 1000
+INGEST_TIMEOUT = 10
+# Events kept for retry while web is unavailable, the oldest ones are dropped beyond it.
+INGEST_MAX_BUFFER_NUM = 100000
+# The IngestClient shared by all SaveLog instances of the process.
+INGEST_CLIENT = None
+INGEST_CLIENT_LOCK = threading.Lock()
+# Header of the ingest_token on config.py, web /ingest only takes send_alarm and monitor_item events with it.
+INGEST_TOKEN_HEADER = 'X-Ingest-Token'
+
+# The ip of current host is cached in HOST_CACHE_FILE for HOST_CACHE_TIME seconds, socket.gethostbyname may cost a DNS lookup on every script startup.
+HOST_CACHE_FILE = str(os.environ.get('TMPDIR', '/tmp')) + '/.monitorViewer_host.' + str(os.getuid())
+HOST_CACHE_TIME = 3600
+
 
 class SaveLog():
     """
@@ -20,7 +70,7 @@ class SaveLog():
     * Save specified message into database.
     * Send alarm.
     """
-    def __init__(self, direction='', monitor_item='', script_path='', script_auther='', script_startup_method='', script_startup_host='', script_execute_frequency='', alarm_receivers='', alarm_frequency='everytime'):
+    def __init__(self, direction='', monitor_item='', script_path='', script_auther='', script_startup_method='', script_startup_host='', script_execute_frequency='', alarm_receivers='', alarm_frequency='everytime', buffered_write=False, async_alarm=False, ingest_url='', flush_on_signal=False):
         """
         Below are initialization arguments:
         [direction]:                Specify businees direction, default is "default", must have been defined on variable "valid_direction_dic" on config.py.
@@ -30,12 +80,41 @@ class SaveLog():
         [script_auther]:            Specify script auther, default is current user.
         [script_startup_method]:    Specify script startup method, usually be "crontab" or "jenkins".
         [script_startup_host]:      Hidden argument, specify where the script is executed on, default is current host.
-        [script_execute_frequency]: Description of execute frequency, for example, "every 5 minutes".
+        [script_execute_frequency]: Description of execute frequency, for example, "every 5 minutes", "once a day" or a crontab expression "*/5 * * * *", check_script_heartbeat expects a heartbeat in every such interval.
         [alarm_receivers]:          Specify alarm receivers, default is direction_admin.
-        [alarm_frequency]:          Specify alarm frequency, support "everytime" and "max <n> times", default is "everytime".
+        [alarm_frequency]:          Specify alarm frequency, support "everytime", "max <n> times" (per day), "max <n> per hour" and "at most once per <duration>", default is "everytime".
+        [buffered_write]:           Buffer the save_log messages and write them in batches, for the scripts saving lots of logs, default is False.
+                                    The buffered messages are flushed within BUFFER_FLUSH_INTERVAL seconds, at exit, or by SaveLog.flush().
+        [flush_on_signal]:          With buffered_write, exit normally on SIGTERM/SIGHUP (if the script has no handlers for them), so the buffered messages are flushed, default is False.
+        [async_alarm]:              Send alarms in background worker threads with timeout and retries, send_alarm returns at once, default is False.
+                                    Alarms still pending at exit are kept in <db_path>/.alarm_spool, and sent by the next asynchronous SaveLog.
+        [ingest_url]:               Post everything to web /ingest (like "http://<web_host>:<port>/ingest") in batches, for the hosts which can not mount db_path,
+                                    default is "ingest_url" on config.py, empty means writing db_path.
         """
         # Get variable settings from config file
         self.config_dic = self.get_config_setting()
+        self.ingest_url = ingest_url or self.config_dic.get('ingest_url', '')
+
+        if (not self.ingest_url) and (not os.path.exists(self.config_dic['db_path'])):
+            self.print_error('"' + str(self.config_dic['db_path']) + '": No such database path.')
+
+        # Last indexed bucket of written day files, None means the day file is not indexed.
+        self.day_file_index_dic = {}
+
+        # Shared buffered day file writer, None means writing every line directly.
+        self.day_file_writer = get_day_file_writer() if buffered_write else None
+
+        if self.day_file_writer and flush_on_signal:
+            self.day_file_writer.register_signals()
+
+        # Shared asynchronous alarm dispatcher, None means sending alarms synchronously.
+        self.alarm_dispatcher = get_alarm_dispatcher(self.config_dic) if async_alarm else None
+
+        # Events go to web /ingest (HTTP transport) or the local collector if any, None means writing db_path by this process.
+        if self.ingest_url:
+            self.event_client = get_ingest_client(self.ingest_url, self.config_dic.get('ingest_token', ''))
+        else:
+            self.event_client = get_collector_client(self.config_dic)
 
         # Check direction
         if not direction:
@@ -54,7 +133,7 @@ class SaveLog():
 
         # Get monitor_item informaiton from monitor_item yaml file
         old_monitor_item_dic = self.read_monitor_item_yaml(direction, monitor_item)
-        self.monitor_item_dic = copy.deepcopy(old_monitor_item_dic)
+        self.monitor_item_dic = copy.copy(old_monitor_item_dic)
 
         # Check script_path
         if script_path:
@@ -86,7 +165,7 @@ class SaveLog():
                 self.print_warning('No script_startup_method is specified.')
 
         # Set script_startup_host
-        script_startup_host = socket.gethostbyname(socket.gethostname())
+        script_startup_host = get_host_ip()
 
         if ('script_startup_host' not in self.monitor_item_dic) or (self.monitor_item_dic['script_startup_host'] != script_startup_host):
             self.monitor_item_dic['script_startup_host'] = script_startup_host
@@ -117,7 +196,8 @@ class SaveLog():
                 self.print_warning('No alarm_frequency is specified.')
 
         # Create direction directory.
-        self.create_direction_dir(direction)
+        if not self.ingest_url:
+            self.create_direction_dir(direction)
 
         # Update monitor_item yaml file
         if self.monitor_item_dic != old_monitor_item_dic:
@@ -167,8 +247,6 @@ class SaveLog():
             self.print_error('Required configuration variable "db_path" is missing.')
         elif not config_dic['db_path']:
             self.print_error('Required configuration variable "db_path" is empty.')
-        elif not os.path.exists(config_dic['db_path']):
-            self.print_error('"' + str(config_dic['db_path']) + '": No such database path.')
 
         if 'valid_message_level_list' not in config_dic:
             self.print_error('Required configuration variable "valid_message_level_list" is missing.')
@@ -191,7 +269,7 @@ class SaveLog():
 
         if os.path.exists(monitor_item_file):
             with open(monitor_item_file, 'r') as MIF:
-                monitor_item_dic = yaml.load(MIF, Loader=yaml.FullLoader)
+                monitor_item_dic = yaml.load(MIF, Loader=common_db.YAML_LOADER)
 
         # Set default value
         monitor_item_dic['direction'] = direction
@@ -217,39 +295,23 @@ class SaveLog():
         """
         Write monitor item information into <db_path>/<direction>/<monitor_item>/monitor_item.yaml
         """
-        # Create monitor_item directory.
-        monitor_item_dir = str(self.config_dic['db_path']) + '/' + str(direction) + '/' + str(monitor_item)
-
-        if not os.path.exists(monitor_item_dir):
-            os.makedirs(monitor_item_dir)
-            os.chmod(monitor_item_dir, 0o755)
-
-        # Save self.monitor_item_dic into monitor_item_file.
-        monitor_item_file = str(monitor_item_dir) + '/monitor_item.yaml'
+        # The monitor_item.yaml on web is unknown, web /ingest writes it if anything is changed.
+        if self.ingest_url:
+            self.event_client.send({'kind': 'monitor_item', 'direction': direction, 'monitor_item': monitor_item, 'info': self.monitor_item_dic})
+            return
 
-        with open(monitor_item_file, 'w') as MIF:
-            MIF.write(yaml.dump(self.monitor_item_dic, allow_unicode=True))
+        save_monitor_item_yaml(self.config_dic['db_path'], direction, monitor_item, self.monitor_item_dic)
 
     def heartbeat_registration(self, direction, monitor_item):
         """
         Register in the registration file when class "SaveLog" is initialized.
         """
-        # Create heartbeat log directory.
         heartbeat_log_dir = str(self.config_dic['db_path']) + '/' + str(direction) + '/' + str(monitor_item) + '/heartbeat'
-
-        if not os.path.exists(heartbeat_log_dir):
-            os.makedirs(heartbeat_log_dir)
-            os.chmod(heartbeat_log_dir, 0o755)
-
-        # Save specified message into log file.
-        current_date = datetime.datetime.now().strftime('%Y%m%d')
-        current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        heartbeat_log_file = str(heartbeat_log_dir) + '/' + str(current_date)
         current_user = getpass.getuser()
+        (current_date, current_time) = get_current_date_time()
 
-        with open(heartbeat_log_file, 'a') as HLF:
-            heartbeat_info_dic = {"time": current_time, "user": current_user, "host": self.monitor_item_dic['script_startup_host'], "script": self.monitor_item_dic['script_path']}
-            HLF.write(str(json.dumps(heartbeat_info_dic, ensure_ascii=False)) + '\n')
+        heartbeat_info_dic = {"time": current_time, "user": current_user, "host": self.monitor_item_dic['script_startup_host'], "script": self.monitor_item_dic['script_path']}
+        self.save_line(heartbeat_log_dir, current_date, current_time, heartbeat_info_dic, flush=True)
 
     def save_log(self, message, message_level='Warning', print_mode=True):
         """
@@ -259,21 +321,12 @@ class SaveLog():
         if message_level not in self.config_dic['valid_message_level_list']:
             self.print_error('"' + str(message_level) + '": Invalid message_level, it must be in "' + str('/'.join(self.config_dic['valid_message_level_list'])) + '".')
 
-        # Create log directory.
-        log_dir = str(self.config_dic['db_path']) + '/' + str(self.monitor_item_dic['direction']) + '/' + str(self.monitor_item_dic['monitor_item']) + '/log'
-
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-            os.chmod(log_dir, 0o755)
-
         # Save specified message into log file.
-        current_date = datetime.datetime.now().strftime('%Y%m%d')
-        current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_file = str(log_dir) + '/' + str(current_date)
+        log_dir = str(self.config_dic['db_path']) + '/' + str(self.monitor_item_dic['direction']) + '/' + str(self.monitor_item_dic['monitor_item']) + '/log'
+        (current_date, current_time) = get_current_date_time()
 
-        with open(log_file, 'a') as LF:
-            log_info_dic = {"time": current_time, "message_level": message_level, "message": message}
-            LF.write(str(json.dumps(log_info_dic, ensure_ascii=False)) + '\n')
+        log_info_dic = {"time": current_time, "message_level": message_level, "message": message}
+        self.save_line(log_dir, current_date, current_time, log_info_dic)
 
         if print_mode:
             if message_level in ['Debug', 'Info', 'Warning', 'Error', 'Fatal']:
@@ -294,73 +347,1103 @@ class SaveLog():
         if not alarm_frequency:
             alarm_frequency = self.monitor_item_dic['alarm_frequency']
 
+        # The collector (or web /ingest) checks alarm_frequency and sends the alarm with its own alarm dispatcher.
+        if self.event_client:
+            event_dic = {'kind': 'send_alarm', 'direction': self.monitor_item_dic['direction'], 'monitor_item': self.monitor_item_dic['monitor_item'], 'title': alarm_title, 'message': message, 'receivers': alarm_receivers, 'frequency': alarm_frequency}
+
+            if self.event_client.send(event_dic):
+                return
+
         if self.check_alarm_frequency(message, alarm_receivers, alarm_frequency):
-            send_alarm_command = self.config_dic['send_alarm_command']
-            send_alarm_command = re.sub(r'<TITLE>', alarm_title, send_alarm_command)
-            send_alarm_command = re.sub(r'<MESSAGE>', message, send_alarm_command)
-            send_alarm_command = re.sub(r'<RECEIVERS>', alarm_receivers, send_alarm_command)
-            (return_code, stdout, stderr) = run_command(send_alarm_command)
-
-            if return_code == 0:
-                self.save_alarm_log(message, alarm_receivers, result='PASSED')
+            (send_alarm_command, env_dic) = gen_send_alarm_command(self.config_dic['send_alarm_command'], alarm_title, message, alarm_receivers)
+
+            if self.alarm_dispatcher:
+                alarm_log_dir = str(self.config_dic['db_path']) + '/' + str(self.monitor_item_dic['direction']) + '/' + str(self.monitor_item_dic['monitor_item']) + '/alarm'
+                self.alarm_dispatcher.submit(alarm_log_dir, message, alarm_receivers, send_alarm_command, env_dic)
             else:
-                self.save_alarm_log(message, alarm_receivers, result='FAILED')
+                start_time = time.time()
+                result = execute_alarm_command(send_alarm_command, self.config_dic.get('alarm_timeout', 0), env_dic)
+                self.save_alarm_log(message, alarm_receivers, result=result, latency=time.time() - start_time)
+
+    def wait_alarms(self, timeout=None):
+        """
+        Wait for the asynchronous alarms to be done (async_alarm mode), return False if timeout.
+        """
+        if self.alarm_dispatcher:
+            return self.alarm_dispatcher.wait(timeout)
+
+        return True
 
     def check_alarm_frequency(self, message, alarm_receivers, alarm_frequency):
         """
-        Make sure alarm or not.
+        Make sure alarm or not, with the alarm counter store of the monitor item.
         """
-        if re.search(r'everytime', alarm_frequency):
-            pass
-        elif re.match(r'^\s*max\s+(\d+)\s+times\s*$', alarm_frequency):
-            my_match = re.match(r'^\s*max\s+(\d+)\s+times\s*$', alarm_frequency)
-            max_alarm_num = int(my_match.group(1))
+        monitor_item_dir = str(self.config_dic['db_path']) + '/' + str(self.monitor_item_dic['direction']) + '/' + str(self.monitor_item_dic['monitor_item'])
 
-            # Get today alarm num
-            alarm_num = 0
-            current_date = datetime.datetime.now().strftime('%Y%m%d')
-            alarm_log_file = str(self.config_dic['db_path']) + '/' + str(self.monitor_item_dic['direction']) + '/' + str(self.monitor_item_dic['monitor_item']) + '/alarm/' + str(current_date)
-            receivers_message = str(alarm_receivers) + ' ' + str(message)
-            md5 = hashlib.md5(receivers_message.encode()).hexdigest()
+        return check_alarm_frequency(monitor_item_dir, message, alarm_receivers, alarm_frequency, self.alarm_dispatcher)
+
+    def save_alarm_log(self, message, alarm_receivers, result='PASSED', latency=None, attempt_num=1):
+        """
+        Save script alarm message into alarm log file under <db_path>/<direction>/<monitor_item>/alarm.
+        """
+        # Save specified message into alarm log file.
+        alarm_log_dir = str(self.config_dic['db_path']) + '/' + str(self.monitor_item_dic['direction']) + '/' + str(self.monitor_item_dic['monitor_item']) + '/alarm'
+        (current_date, current_time) = get_current_date_time()
 
-            if os.path.exists(alarm_log_file):
-                with open(alarm_log_file, 'r') as ALF:
-                    for line in ALF.readlines():
-                        alarm_info_dic = json.loads(line.strip())
+        alarm_info_dic = gen_alarm_info_dic(current_time, message, alarm_receivers, result, latency, attempt_num)
+        # Alarms are rare, and check_alarm_frequency reads them back, so they are never left in the buffer.
+        self.save_line(alarm_log_dir, current_date, current_time, alarm_info_dic, flush=True)
 
-                        if alarm_info_dic['md5'] == md5:
-                            alarm_num += 1
+    def save_line(self, kind_dir, current_date, current_time, info_dic, flush=False):
+        """
+        Save info_dic as a line into day file <kind_dir>/<current_date>, by the local collector if it is available, or with the buffered writer if buffered_write is enabled.
+        """
+        if self.event_client:
+            event_dic = {'kind': os.path.basename(kind_dir), 'direction': self.monitor_item_dic['direction'], 'monitor_item': self.monitor_item_dic['monitor_item'], 'record': info_dic}
 
-            if alarm_num >= max_alarm_num:
-                self.print_warning('It have reached the max alarm limitation, will not send alarm any more today.')
-                return False
+            if self.event_client.send(event_dic):
+                return
+
+        # Alarms written by this process are counted here, the collector and web /ingest count the shipped ones.
+        if os.path.basename(kind_dir) == 'alarm':
+            count_alarm(kind_dir, info_dic['md5'])
+
+        line = str(json.dumps(info_dic, ensure_ascii=False)) + '\n'
+
+        if self.day_file_writer:
+            self.day_file_writer.write(kind_dir, current_date, current_time, line, flush=flush)
         else:
-            self.print_warning('"' + str(alarm_frequency) + '": Invalid alarm_frequency setting, will not send alarm.')
-            return False
+            if not os.path.exists(kind_dir):
+                os.makedirs(kind_dir)
+                os.chmod(kind_dir, 0o755)
+
+            self.write_day_file(str(kind_dir) + '/' + str(current_date), current_time, line)
+
+    def flush(self):
+        """
+        Write out the buffered messages (buffered_write mode).
+        """
+        if self.day_file_writer:
+            self.day_file_writer.flush()
+
+    def write_day_file(self, day_file, current_time, line):
+        """
+        Append line into day_file, and record the byte offset of the first line of every minute into the day file index.
+        """
+        with open(day_file, 'a') as DF:
+            offset = DF.tell()
+            bucket = common_db.get_time_bucket(current_time)
+
+            # Only index new day files (or already indexed ones), tools/reindex_db indexes the other closed day files.
+            if day_file not in self.day_file_index_dic:
+                if (offset == 0) or os.path.exists(common_db.get_index_file(day_file)):
+                    self.day_file_index_dic[day_file] = ''
+                else:
+                    self.day_file_index_dic[day_file] = None
+
+            # Index before writing the line, so a concurrent writer always finds the index of a non-empty day file.
+            if (self.day_file_index_dic[day_file] is not None) and (self.day_file_index_dic[day_file] != bucket):
+                common_db.append_day_file_index(day_file, bucket, offset)
+                self.day_file_index_dic[day_file] = bucket
+
+            DF.write(line)
+
+
+class DayFileWriter():
+    """
+    Buffered day file writer of SaveLog(buffered_write=True), shared by the whole process.
+    * The day file handles are kept open with O_APPEND, and switched to the new day file at midnight.
+    * The buffered lines of a day file are written with one os.write, a batch only holds complete lines, so concurrent writers never interleave partial lines.
+    * The buffer is flushed when it reaches flush_size bytes, every flush_interval seconds and at exit, register_signals() makes SIGTERM/SIGHUP exit normally to flush too.
+    """
+    def __init__(self, flush_size=BUFFER_FLUSH_SIZE, flush_interval=BUFFER_FLUSH_INTERVAL):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.lock = threading.RLock()
+        # {kind_dir: {'day_file': ..., 'fd': ..., 'indexed': bool, 'bucket': ..., 'line_list': [(bucket, data), ...]}}
+        self.day_file_dic = {}
+        self.buffer_size = 0
+        self.flush_thread = None
+        self.stop_event = threading.Event()
+        # The signals handled by signal_handler, see register_signals.
+        self.signal_list = []
+
+        atexit.register(self.close)
+
+    def register_signals(self):
+        """
+        Exit normally on SIGTERM/SIGHUP so the atexit close() flushes, the signals with custom handlers are left alone.
+        It is only done on request (SaveLog(flush_on_signal=True)), close() sets the default handlers back.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        for signal_num in [signal.SIGTERM, signal.SIGHUP]:
+            if signal.getsignal(signal_num) == signal.SIG_DFL:
+                signal.signal(signal_num, self.signal_handler)
+                self.signal_list.append(signal_num)
+
+    def unregister_signals(self):
+        """
+        Set the default handlers back for the signals of register_signals, unless they are replaced since.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        for signal_num in self.signal_list:
+            if signal.getsignal(signal_num) == self.signal_handler:
+                signal.signal(signal_num, signal.SIG_DFL)
+
+        self.signal_list = []
+
+    def signal_handler(self, signal_num, frame):
+        # The handler may interrupt a write() holding the RLock, so it only unwinds and leaves the flush to close() at exit.
+        raise SystemExit(128 + signal_num)
+
+    def write(self, kind_dir, current_date, current_time, line, flush=False):
+        """
+        Buffer line for day file <kind_dir>/<current_date>.
+        """
+        with self.lock:
+            day_file = str(kind_dir) + '/' + str(current_date)
+            day_file_dic = self.day_file_dic.get(kind_dir)
+
+            # Midnight rollover.
+            if (day_file_dic is None) or (day_file_dic['day_file'] != day_file):
+                if day_file_dic is not None:
+                    self.close_day_file(kind_dir)
+                elif len(self.day_file_dic) >= DAY_FILE_WRITER_MAX_OPEN_NUM:
+                    self.close_day_file(next(iter(self.day_file_dic)))
+
+                day_file_dic = self.open_day_file(kind_dir, day_file)
+
+            # Keep self.day_file_dic in least recently written order.
+            self.day_file_dic.pop(kind_dir, None)
+            self.day_file_dic[kind_dir] = day_file_dic
+
+            data = line.encode()
+            day_file_dic['line_list'].append((common_db.get_time_bucket(current_time), data))
+            self.buffer_size += len(data)
+
+            if flush or (self.buffer_size >= self.flush_size):
+                self.flush()
+            elif self.flush_thread is None:
+                self.stop_event.clear()
+                self.flush_thread = threading.Thread(target=self.flush_loop, name='DayFileWriter', daemon=True)
+                self.flush_thread.start()
+
+    def open_day_file(self, kind_dir, day_file):
+        """
+        Open day_file for appending, the kind directory is created only once.
+        """
+        if not os.path.exists(kind_dir):
+            os.makedirs(kind_dir)
+            os.chmod(kind_dir, 0o755)
+
+        fd = os.open(day_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        index_file = common_db.get_index_file(day_file)
+
+        # Index entries are written after the batch, so a new day file gets its index file before any line, for the other writers to index it too.
+        if os.fstat(fd).st_size == 0:
+            with open(index_file, 'a'):
+                pass
+
+        return {'day_file': day_file, 'fd': fd, 'indexed': os.path.exists(index_file), 'bucket': '', 'line_list': []}
+
+    def close_day_file(self, kind_dir):
+        """
+        Flush and close the day file of kind_dir.
+        """
+        day_file_dic = self.day_file_dic.pop(kind_dir)
+
+        try:
+            self.flush_day_file(day_file_dic)
+        finally:
+            os.close(day_file_dic['fd'])
+
+    def flush_day_file(self, day_file_dic):
+        """
+        Write the buffered lines of a day file with one os.write, then index the first line of every new bucket with its real offset.
+        """
+        if not day_file_dic['line_list']:
+            return
+
+        data = b''.join(line_data for (bucket, line_data) in day_file_dic['line_list'])
+        written_size = 0
+
+        # A regular file takes the whole batch at once, the loop only covers short writes like disk full.
+        while written_size < len(data):
+            written_size += os.write(day_file_dic['fd'], data[written_size:])
+
+        if day_file_dic['indexed']:
+            # With O_APPEND, the file offset is right after this batch even if other writers are appending.
+            offset = os.lseek(day_file_dic['fd'], 0, os.SEEK_CUR) - len(data)
+
+            for (bucket, line_data) in day_file_dic['line_list']:
+                if bucket != day_file_dic['bucket']:
+                    common_db.append_day_file_index(day_file_dic['day_file'], bucket, offset)
+                    day_file_dic['bucket'] = bucket
+
+                offset += len(line_data)
+
+        self.buffer_size -= len(data)
+        day_file_dic['line_list'] = []
+
+    def flush(self):
+        """
+        Write out the buffered lines of all day files.
+        """
+        with self.lock:
+            for day_file_dic in self.day_file_dic.values():
+                try:
+                    self.flush_day_file(day_file_dic)
+                except Exception as error:
+                    bprint('[SaveLog] Failed on writing day file "' + str(day_file_dic['day_file']) + '", ' + str(error), level='Warning')
+                    self.buffer_size -= sum(len(line_data) for (bucket, line_data) in day_file_dic['line_list'])
+                    day_file_dic['line_list'] = []
+
+    def flush_loop(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """
+        Stop the flush thread, flush and close all day files.
+        """
+        # Join out of the lock, the flush thread may be waiting for it.
+        self.stop_event.set()
+        flush_thread = self.flush_thread
+
+        if (flush_thread is not None) and (flush_thread is not threading.current_thread()):
+            flush_thread.join()
+
+        self.unregister_signals()
+
+        with self.lock:
+            self.flush_thread = None
+            self.flush()
+
+            for day_file_dic in self.day_file_dic.values():
+                os.close(day_file_dic['fd'])
+
+            self.day_file_dic = {}
+
+
+def get_day_file_writer(flush_size=BUFFER_FLUSH_SIZE, flush_interval=BUFFER_FLUSH_INTERVAL):
+    """
+    Get the process-wide DayFileWriter, flush_size and flush_interval only apply when it is created.
+    """
+    global DAY_FILE_WRITER
+
+    if DAY_FILE_WRITER is None:
+        DAY_FILE_WRITER = DayFileWriter(flush_size, flush_interval)
+
+    return DAY_FILE_WRITER
+
+
+class AlarmDispatcher():
+    """
+    Asynchronous alarm dispatcher of SaveLog(async_alarm=True), shared by the whole process.
+    * submit() spools the alarm into <db_path>/.alarm_spool and returns at once, worker_num threads execute the alarm commands.
+    * A failed or timed out alarm command is retried retry_num times with backoff, then the final result, latency (from submit) and attempt number are saved into alarm log.
+    * A spool file is claimed by renaming it to "<spool_file>.sending.<host>.<pid>" before sending, so every alarm is sent by one dispatcher.
+    * At exit, pending alarms are waited for at most ALARM_EXIT_WAIT_TIME seconds, so short-lived scripts are not held by slow alarm commands.
+    * Alarms still pending at exit stay in the spool, the next dispatcher on the same db_path sends them, the claims of dead processes on the same host are taken back.
+    """
+    def __init__(self, db_path, worker_num=4, timeout=60, retry_num=2):
+        self.spool_dir = str(db_path) + '/' + str(ALARM_SPOOL_DIR)
+        self.worker_num = max(1, worker_num)
+        self.timeout = timeout
+        self.retry_num = max(0, retry_num)
+        self.host = socket.gethostname()
+        self.queue = queue.Queue()
+        self.condition = threading.Condition()
+        # {md5: alarm_num}, the alarms which are submitted but not saved into alarm log yet.
+        self.pending_md5_dic = {}
+        self.pending_num = 0
+        self.spool_num = 0
+        # Set at exit, the workers leave the queued alarms in spool.
+        self.closed = False
+
+        if not os.path.exists(self.spool_dir):
+            os.makedirs(self.spool_dir, exist_ok=True)
+            os.chmod(self.spool_dir, 0o777)
+
+        # Alarm log lines are written through the shared DayFileWriter, it is created first so it is closed after the atexit wait.
+        self.day_file_writer = get_day_file_writer()
+        atexit.register(self.close)
+
+        for i in range(self.worker_num):
+            threading.Thread(target=self.work, name='AlarmDispatcher-' + str(i), daemon=True).start()
+
+        self.load_spool()
+
+    def load_spool(self):
+        """
+        Queue the alarms left in spool by the former dispatchers.
+        """
+        for spool_file_name in sorted(os.listdir(self.spool_dir)):
+            spool_file = str(self.spool_dir) + '/' + str(spool_file_name)
+
+            if re.match(r'^.+\.json$', spool_file_name):
+                self.queue_spool_file(spool_file)
+            elif re.match(r'^(.+\.json)\.sending\.(.+)\.(\d+)$', spool_file_name):
+                my_match = re.match(r'^(.+\.json)\.sending\.(.+)\.(\d+)$', spool_file_name)
+
+                if (my_match.group(2) == self.host) and (not is_pid_alive(int(my_match.group(3)))):
+                    try:
+                        os.rename(spool_file, str(self.spool_dir) + '/' + str(my_match.group(1)))
+                        self.queue_spool_file(str(self.spool_dir) + '/' + str(my_match.group(1)))
+                    except OSError:
+                        pass
+
+    def queue_spool_file(self, spool_file):
+        """
+        Queue spool_file for the worker threads.
+        """
+        try:
+            with open(spool_file, 'r') as SF:
+                alarm_dic = json.load(SF)
+        except Exception:
+            # Missing (claimed by others) or being written.
+            return
+
+        md5 = get_alarm_md5(alarm_dic['message'], alarm_dic['receivers'])
+
+        with self.condition:
+            self.pending_md5_dic[md5] = self.pending_md5_dic.get(md5, 0) + 1
+            self.pending_num += 1
+
+        self.queue.put((spool_file, md5))
+
+    def submit(self, alarm_log_dir, message, alarm_receivers, send_alarm_command, env_dic=None):
+        """
+        Spool the alarm and queue it, return at once.
+        """
+        with self.condition:
+            self.spool_num += 1
+            spool_file_name = str(time.time_ns()) + '_' + str(self.host) + '_' + str(os.getpid()) + '_' + str(self.spool_num) + '.json'
+
+        spool_file = str(self.spool_dir) + '/' + str(spool_file_name)
+        alarm_dic = {'submit_time': time.time(), 'alarm_log_dir': alarm_log_dir, 'message': message, 'receivers': alarm_receivers, 'command': send_alarm_command, 'env': env_dic or {}}
+
+        # Write into a temporary file first, so the other dispatchers never load a partial spool file.
+        with open(spool_file + '.tmp', 'w') as SF:
+            SF.write(json.dumps(alarm_dic, ensure_ascii=False))
+
+        os.chmod(spool_file + '.tmp', 0o666)
+        os.replace(spool_file + '.tmp', spool_file)
+        self.queue_spool_file(spool_file)
+
+    def work(self):
+        """
+        Worker thread, send the queued alarms one by one.
+        """
+        while True:
+            (spool_file, md5) = self.queue.get()
+
+            try:
+                if not self.closed:
+                    self.send(spool_file)
+            except Exception as error:
+                bprint('[SaveLog] Failed on sending alarm "' + str(spool_file) + '", ' + str(error), level='Warning')
+
+            with self.condition:
+                self.pending_md5_dic[md5] -= 1
+
+                if self.pending_md5_dic[md5] == 0:
+                    del self.pending_md5_dic[md5]
+
+                self.pending_num -= 1
+                self.condition.notify_all()
+
+    def send(self, spool_file):
+        """
+        Claim spool_file, execute the alarm command with retries, then save the result into alarm log.
+        """
+        sending_file = str(spool_file) + '.sending.' + str(self.host) + '.' + str(os.getpid())
+
+        try:
+            os.rename(spool_file, sending_file)
+        except OSError:
+            # Claimed by another dispatcher.
+            return
+
+        with open(sending_file, 'r') as SF:
+            alarm_dic = json.load(SF)
+
+        for attempt_num in range(1, self.retry_num + 2):
+            result = execute_alarm_command(alarm_dic['command'], self.timeout, alarm_dic.get('env'))
+
+            if (result == 'PASSED') or (attempt_num > self.retry_num):
+                break
+
+            time.sleep(ALARM_RETRY_INTERVAL * 2 ** (attempt_num - 1))
+
+        (current_date, current_time) = get_current_date_time()
+        alarm_info_dic = gen_alarm_info_dic(current_time, alarm_dic['message'], alarm_dic['receivers'], result, time.time() - alarm_dic['submit_time'], attempt_num)
+        count_alarm(alarm_dic['alarm_log_dir'], alarm_info_dic['md5'])
+        self.day_file_writer.write(alarm_dic['alarm_log_dir'], current_date, current_time, str(json.dumps(alarm_info_dic, ensure_ascii=False)) + '\n', flush=True)
+        os.remove(sending_file)
+
+    def get_pending_num(self, md5):
+        """
+        Get the number of pending alarms with md5.
+        """
+        with self.condition:
+            return self.pending_md5_dic.get(md5, 0)
+
+    def wait(self, timeout=None):
+        """
+        Wait for all pending alarms to be done, return False if timeout.
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: self.pending_num == 0, timeout)
+
+    def close(self, timeout=ALARM_EXIT_WAIT_TIME):
+        """
+        Wait for the pending alarms up to timeout seconds at exit, then stop taking the queued alarms, they stay in spool.
+        An alarm command still running is claimed by this dead process, the next dispatcher on the same host sends it again.
+        """
+        self.wait(timeout)
+        self.closed = True
+
+
+def get_alarm_dispatcher(config_dic):
+    """
+    Get the process-wide AlarmDispatcher.
+    """
+    global ALARM_DISPATCHER
+
+    with ALARM_DISPATCHER_LOCK:
+        if ALARM_DISPATCHER is None:
+            ALARM_DISPATCHER = AlarmDispatcher(config_dic['db_path'], config_dic.get('alarm_worker_num', 4), config_dic.get('alarm_timeout', 60), config_dic.get('alarm_retry_num', 2))
+
+    return ALARM_DISPATCHER
+
+
+class CollectorClient():
+    """
+    Client of the local collector (tools/monitor_collector), events are shipped as json lines over a unix stream socket.
+    Once the collector is unavailable, send() returns False for ever, and SaveLog writes db_path directly.
+    """
+    def __init__(self, socket_path, timeout=COLLECTOR_TIMEOUT):
+        self.lock = threading.Lock()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(timeout)
+
+        try:
+            self.socket.connect(socket_path)
+        except OSError:
+            self.socket.close()
+            raise
+
+    def send(self, event_dic):
+        """
+        Ship event_dic to the collector, return False if it is not shipped.
+        """
+        with self.lock:
+            if self.socket is None:
+                return False
+
+            try:
+                self.socket.sendall((json.dumps(event_dic, ensure_ascii=False) + '\n').encode())
+                return True
+            except OSError as error:
+                # A partially sent line has no newline, the collector drops it.
+                bprint('[SaveLog] Local collector is unavailable, will write database directly, ' + str(error), level='Warning')
+                self.socket.close()
+                self.socket = None
+                return False
+
+
+def get_collector_client(config_dic):
+    """
+    Get the process-wide CollectorClient, None if "collector_socket" is not set or the collector is not running.
+    """
+    global COLLECTOR_CLIENT
+
+    with COLLECTOR_CLIENT_LOCK:
+        if COLLECTOR_CLIENT is False:
+            COLLECTOR_CLIENT = None
+            socket_path = config_dic.get('collector_socket', '')
+
+            if socket_path and os.path.exists(socket_path):
+                try:
+                    COLLECTOR_CLIENT = CollectorClient(socket_path)
+                except OSError:
+                    pass
+
+    return COLLECTOR_CLIENT
+
+
+class IngestClient():
+    """
+    HTTP transport of SaveLog, events are posted to ingest_url (web /ingest) as ndjson in batches.
+    * A batch is posted once it has INGEST_BATCH_SIZE events, every BUFFER_FLUSH_INTERVAL seconds and at exit.
+    * Events are kept for the next post if web is unavailable, up to INGEST_MAX_BUFFER_NUM events.
+    """
+    def __init__(self, ingest_url, ingest_token='', batch_size=INGEST_BATCH_SIZE, flush_interval=BUFFER_FLUSH_INTERVAL, timeout=INGEST_TIMEOUT):
+        self.ingest_url = ingest_url
+        self.ingest_token = ingest_token
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.post_lock = threading.Lock()
+        self.event_list = []
+        self.flush_thread = None
+
+        atexit.register(self.close)
+
+    def send(self, event_dic):
+        """
+        Queue event_dic, it is always taken, there is no database to fall back to.
+        """
+        with self.lock:
+            self.event_list.append(event_dic)
+            full = (len(self.event_list) >= self.batch_size)
+
+            if self.flush_thread is None:
+                self.flush_thread = threading.Thread(target=self.flush_loop, name='IngestClient', daemon=True)
+                self.flush_thread.start()
+
+        if full:
+            self.flush()
 
         return True
 
-    def save_alarm_log(self, message, alarm_receivers, result='PASSED'):
+    def flush(self):
         """
-        Save script alarm message into alarm log file under <db_path>/<direction>/<monitor_item>/alarm.
+        Post the queued events, return False if web is unavailable.
         """
-        # Create alarm log directory.
-        alarm_log_dir = str(self.config_dic['db_path']) + '/' + str(self.monitor_item_dic['direction']) + '/' + str(self.monitor_item_dic['monitor_item']) + '/alarm'
+        # urllib costs tens of milliseconds to import, most scripts only post at exit.
+        import urllib.request
 
-        if not os.path.exists(alarm_log_dir):
-            os.makedirs(alarm_log_dir)
-            os.chmod(alarm_log_dir, 0o755)
+        # Posts are serialized to keep the event order, but send() is not blocked by a slow post.
+        with self.post_lock:
+            with self.lock:
+                (event_list, self.event_list) = (self.event_list, [])
 
-        # Save specified message into alarm log file.
-        current_date = datetime.datetime.now().strftime('%Y%m%d')
-        current_time = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        alarm_log_file = str(alarm_log_dir) + '/' + str(current_date)
-        receivers_message = str(alarm_receivers) + ' ' + str(message)
-        md5 = hashlib.md5(receivers_message.encode()).hexdigest()
+            if not event_list:
+                return True
+
+            data = ''.join(str(json.dumps(event_dic, ensure_ascii=False)) + '\n' for event_dic in event_list).encode()
+            header_dic = {'Content-Type': 'application/x-ndjson'}
+
+            if self.ingest_token:
+                header_dic[INGEST_TOKEN_HEADER] = self.ingest_token
+
+            request = urllib.request.Request(self.ingest_url, data=data, headers=header_dic, method='POST')
+
+            try:
+                with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                    result_dic = json.loads(response.read())
+            except Exception as error:
+                bprint('[SaveLog] Failed on posting ' + str(len(event_list)) + ' events to "' + str(self.ingest_url) + '", ' + str(error), level='Warning')
+
+                with self.lock:
+                    self.event_list[:0] = event_list
+                    del self.event_list[:-INGEST_MAX_BUFFER_NUM]
+
+                return False
+
+            for rejected_dic in result_dic.get('rejected', []):
+                bprint('[SaveLog] Event is rejected by "' + str(self.ingest_url) + '", ' + str(rejected_dic.get('error')), level='Warning')
+
+            return True
+
+    def flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def close(self):
+        """
+        Post the queued events at exit, they are lost if web is unavailable.
+        """
+        if not self.flush():
+            with self.lock:
+                lost_num = len(self.event_list)
+
+            bprint('[SaveLog] ' + str(lost_num) + ' events are lost.', level='Warning')
+
+
+def get_ingest_client(ingest_url, ingest_token=''):
+    """
+    Get the process-wide IngestClient of ingest_url.
+    """
+    global INGEST_CLIENT
+
+    with INGEST_CLIENT_LOCK:
+        if (INGEST_CLIENT is None) or (INGEST_CLIENT.ingest_url != ingest_url) or (INGEST_CLIENT.ingest_token != ingest_token):
+            INGEST_CLIENT = IngestClient(ingest_url, ingest_token)
+
+    return INGEST_CLIENT
+
+
+class EventHandler():
+    """
+    Write the events shipped by SaveLog (from the local collector or web /ingest) into db_path of config_dic.
+    * {"kind": "log"/"alarm"/"heartbeat", "direction", "monitor_item", "record"}: a record line, written by the shared DayFileWriter, alarm records are counted into the alarm counter store.
+    * {"kind": "send_alarm", "direction", "monitor_item", "title", "message", "receivers", "frequency"}: checked against alarm_frequency, then sent by the shared AlarmDispatcher.
+    * {"kind": "monitor_item", "direction", "monitor_item", "info"}: monitor_item.yaml is rewritten if anything is changed.
+    Events come from any user, so the directions, monitor items, message levels and record times are checked, and the alarm command comes from config_dic only.
+    Untrusted events (web /ingest without ingest_token) may only be records, they can not send alarms or rewrite monitor_item.yaml.
+    """
+    def __init__(self, config_dic, day_file_writer=None):
+        self.config_dic = config_dic
+        self.day_file_writer = day_file_writer or get_day_file_writer()
+        self.alarm_dispatcher = None
+        # Serialize the check-then-submit of alarms, so concurrent scripts never pass a frequency limit together.
+        self.alarm_lock = threading.Lock()
+        self.direction_dir_set = set()
+
+    def get_monitor_item_dir(self, event_dic):
+        """
+        Get <db_path>/<direction>/<monitor_item> of event_dic, the direction directory is created if missing.
+        """
+        direction = event_dic.get('direction')
+        monitor_item = event_dic.get('monitor_item')
+
+        if direction not in self.config_dic['valid_direction_dic']:
+            raise ValueError('"' + str(direction) + '": Invalid direction.')
+
+        if (not isinstance(monitor_item, str)) or (not re.match(r'^[^/\s.][^/\s]*$', monitor_item)):
+            raise ValueError('"' + str(monitor_item) + '": Invalid monitor_item.')
+
+        direction_dir = str(self.config_dic['db_path']) + '/' + str(direction)
+
+        if direction_dir not in self.direction_dir_set:
+            if not os.path.exists(direction_dir):
+                os.makedirs(direction_dir, exist_ok=True)
+                os.chmod(direction_dir, 0o777)
+
+            self.direction_dir_set.add(direction_dir)
+
+        return str(direction_dir) + '/' + str(monitor_item)
+
+    def handle_event(self, event_dic, flush=None, trusted=True):
+        """
+        Handle one event, flush=None flushes alarm and heartbeat records at once, and leaves log records to the DayFileWriter.
+        """
+        if not isinstance(event_dic, dict):
+            raise ValueError('Event should be a json object.')
 
-        with open(alarm_log_file, 'a') as LF:
-            alarm_info_dic = {"time": current_time, "md5": md5, "receivers": alarm_receivers, "send_alarm_result": result, "message": message}
-            LF.write(str(json.dumps(alarm_info_dic, ensure_ascii=False)) + '\n')
+        kind = event_dic.get('kind')
+
+        if (not trusted) and (kind not in common_db.KIND_LIST):
+            raise ValueError('"' + str(kind) + '": Event kind is not allowed without ingest_token.')
+
+        monitor_item_dir = self.get_monitor_item_dir(event_dic)
+
+        if kind in common_db.KIND_LIST:
+            record_dic = event_dic.get('record')
+
+            if (not isinstance(record_dic, dict)) or (not re.match(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$', str(record_dic.get('time')))):
+                raise ValueError('Invalid record.')
+
+            if (kind == 'log') and (record_dic.get('message_level') not in self.config_dic['valid_message_level_list']):
+                raise ValueError('"' + str(record_dic.get('message_level')) + '": Invalid message_level.')
+
+            if kind == 'alarm':
+                count_alarm(str(monitor_item_dir) + '/alarm', get_alarm_md5(record_dic.get('message'), record_dic.get('receivers')))
+
+            # "time" must be the first key of a record line.
+            record_dic = {'time': record_dic['time'], **record_dic}
+            current_time = record_dic['time']
+            current_date = current_time[:10].replace('-', '')
+            line = str(json.dumps(record_dic, ensure_ascii=False)) + '\n'
+            self.day_file_writer.write(str(monitor_item_dir) + '/' + str(kind), current_date, current_time, line, flush=(kind != 'log') if flush is None else flush)
+        elif kind == 'send_alarm':
+            (title, message, receivers, frequency) = (str(event_dic.get('title', '')), str(event_dic.get('message', '')), str(event_dic.get('receivers', '')), str(event_dic.get('frequency', '')))
+
+            with self.alarm_lock:
+                if self.alarm_dispatcher is None:
+                    self.alarm_dispatcher = get_alarm_dispatcher(self.config_dic)
+
+                if check_alarm_frequency(monitor_item_dir, message, receivers, frequency, self.alarm_dispatcher):
+                    (send_alarm_command, env_dic) = gen_send_alarm_command(self.config_dic['send_alarm_command'], title, message, receivers)
+                    self.alarm_dispatcher.submit(str(monitor_item_dir) + '/alarm', message, receivers, send_alarm_command, env_dic)
+        elif kind == 'monitor_item':
+            self.update_monitor_item_yaml(monitor_item_dir, event_dic)
+        else:
+            raise ValueError('"' + str(kind) + '": Invalid event kind.')
+
+    def update_monitor_item_yaml(self, monitor_item_dir, event_dic):
+        """
+        Update the script settings of monitor_item.yaml with event_dic['info'].
+        """
+        info_dic = event_dic.get('info')
+
+        if not isinstance(info_dic, dict):
+            raise ValueError('Invalid monitor item info.')
+
+        (direction, monitor_item) = (event_dic['direction'], event_dic['monitor_item'])
+        old_monitor_item_dic = {}
+
+        if os.path.exists(str(monitor_item_dir) + '/monitor_item.yaml'):
+            with open(str(monitor_item_dir) + '/monitor_item.yaml', 'r') as MIF:
+                old_monitor_item_dic = yaml.load(MIF, Loader=common_db.YAML_LOADER) or {}
+
+        monitor_item_dic = copy.copy(old_monitor_item_dic)
+
+        for key in ['script_path', 'script_auther', 'script_startup_method', 'script_startup_host', 'script_execute_frequency', 'alarm_receivers', 'alarm_frequency']:
+            if isinstance(info_dic.get(key), str):
+                monitor_item_dic[key] = info_dic[key]
+
+        monitor_item_dic['direction'] = direction
+        monitor_item_dic['direction_admin'] = self.config_dic['valid_direction_dic'][direction]
+        monitor_item_dic['monitor_item'] = monitor_item
+
+        if monitor_item_dic != old_monitor_item_dic:
+            save_monitor_item_yaml(self.config_dic['db_path'], direction, monitor_item, monitor_item_dic)
+
+
+def save_monitor_item_yaml(db_path, direction, monitor_item, monitor_item_dic):
+    """
+    Write monitor_item_dic into <db_path>/<direction>/<monitor_item>/monitor_item.yaml, and tell the catalog readers (web/GUI) to reload it.
+    """
+    monitor_item_dir = str(db_path) + '/' + str(direction) + '/' + str(monitor_item)
+
+    if not os.path.exists(monitor_item_dir):
+        os.makedirs(monitor_item_dir)
+        os.chmod(monitor_item_dir, 0o755)
+
+    with open(str(monitor_item_dir) + '/monitor_item.yaml', 'w') as MIF:
+        MIF.write(yaml.dump(monitor_item_dic, allow_unicode=True))
+
+    try:
+        common_db.append_catalog_journal(db_path, direction, monitor_item)
+    except Exception as error:
+        bprint('[SaveLog] Failed on appending catalog journal, ' + str(error), level='Warning')
+
+
+def gen_send_alarm_command(send_alarm_command, alarm_title, message, alarm_receivers):
+    """
+    Turn <TITLE>/<MESSAGE>/<RECEIVERS> of send_alarm_command into references of environment variables $MONITOR_VIEWER_ALARM_TITLE/MESSAGE/RECEIVERS, return (command, env_dic).
+    The values never go through shell parsing, a placeholder is referenced as one word unquoted, inside double quotes or inside single quotes.
+    """
+    env_dic = {'MONITOR_VIEWER_ALARM_TITLE': str(alarm_title), 'MONITOR_VIEWER_ALARM_MESSAGE': str(message), 'MONITOR_VIEWER_ALARM_RECEIVERS': str(alarm_receivers)}
+    quote = ''
+    command = ''
+    i = 0
+
+    while i < len(send_alarm_command):
+        my_match = re.match(r'<(TITLE|MESSAGE|RECEIVERS)>', send_alarm_command[i:])
+
+        if my_match:
+            variable = 'MONITOR_VIEWER_ALARM_' + str(my_match.group(1))
+
+            if quote == '"':
+                command += '${' + str(variable) + '}'
+            elif quote == "'":
+                command += '\'"${' + str(variable) + '}"\''
+            else:
+                command += '"${' + str(variable) + '}"'
+
+            i += len(my_match.group(0))
+            continue
+
+        char = send_alarm_command[i]
+
+        if (char == '\\') and (quote != "'"):
+            command += send_alarm_command[i:i + 2]
+            i += 2
+            continue
+
+        if quote == '':
+            if char in ['"', "'"]:
+                quote = char
+        elif char == quote:
+            quote = ''
+
+        command += char
+        i += 1
+
+    return (command, env_dic)
+
+
+def execute_alarm_command(send_alarm_command, timeout=0, env_dic=None):
+    """
+    Execute send_alarm_command with the extra environment variables of env_dic, return "PASSED", "FAILED" or "TIMEOUT".
+    """
+    try:
+        (return_code, stdout, stderr) = run_command(send_alarm_command, timeout=timeout or None, env={**os.environ, **(env_dic or {})})
+    except subprocess.TimeoutExpired:
+        return 'TIMEOUT'
+
+    if return_code == 0:
+        return 'PASSED'
+    else:
+        return 'FAILED'
+
+
+def get_alarm_md5(message, alarm_receivers):
+    """
+    Get the md5 which identifies an alarm, by receivers and message.
+    """
+    receivers_message = str(alarm_receivers) + ' ' + str(message)
+
+    return hashlib.md5(receivers_message.encode()).hexdigest()
+
+
+def gen_alarm_info_dic(current_time, message, alarm_receivers, result, latency=None, attempt_num=1):
+    """
+    Generate the alarm log record.
+    """
+    alarm_info_dic = {"time": current_time, "md5": get_alarm_md5(message, alarm_receivers), "receivers": alarm_receivers, "send_alarm_result": result, "message": message}
+
+    if latency is not None:
+        alarm_info_dic['send_alarm_latency'] = round(latency, 3)
+        alarm_info_dic['send_alarm_attempts'] = attempt_num
+
+    return alarm_info_dic
+
+
+def check_alarm_frequency(monitor_item_dir, message, alarm_receivers, alarm_frequency, alarm_dispatcher=None):
+    """
+    Make sure alarm or not, with the alarm counter store of monitor_item_dir.
+    """
+    if re.search(r'everytime', alarm_frequency):
+        return True
+
+    alarm_policy = parse_alarm_frequency(alarm_frequency)
+
+    if not alarm_policy:
+        bprint('[SaveLog] "' + str(alarm_frequency) + '": Invalid alarm_frequency setting, will not send alarm.', level='Warning')
+        return False
+
+    (policy, limit) = alarm_policy
+    md5 = get_alarm_md5(message, alarm_receivers)
+    (day_count, hour_count, last_time) = common_db.read_alarm_counter(monitor_item_dir, md5)
+
+    # The asynchronous alarms not counted yet.
+    pending_num = alarm_dispatcher.get_pending_num(md5) if alarm_dispatcher else 0
+
+    if policy == 'day':
+        if day_count + pending_num >= limit:
+            bprint('[SaveLog] It have reached the max alarm limitation, will not send alarm any more today.', level='Warning')
+            return False
+    elif policy == 'hour':
+        if hour_count + pending_num >= limit:
+            bprint('[SaveLog] It have reached the max alarm limitation, will not send alarm any more this hour.', level='Warning')
+            return False
+    elif policy == 'interval':
+        if pending_num or (time.time() - last_time < limit):
+            bprint('[SaveLog] It have sent the alarm in the last ' + str(limit) + ' seconds, will not send it again.', level='Warning')
+            return False
+
+    return True
+
+
+def parse_alarm_frequency(alarm_frequency):
+    """
+    Parse alarm_frequency into (policy, limit), None if it is invalid.
+    * "max <n> times"                -> ("day", n), at most n alarms per day.
+    * "max <n> per hour"             -> ("hour", n), at most n alarms per clock hour.
+    * "at most once per <duration>"  -> ("interval", seconds), duration is like "30 minutes", "2 hours" or "1 day".
+    """
+    if re.match(r'^\s*max\s+(\d+)\s+times\s*$', alarm_frequency):
+        my_match = re.match(r'^\s*max\s+(\d+)\s+times\s*$', alarm_frequency)
+        return 'day', int(my_match.group(1))
+    elif re.match(r'^\s*max\s+(\d+)\s+(times\s+)?per\s+hour\s*$', alarm_frequency):
+        my_match = re.match(r'^\s*max\s+(\d+)\s+(times\s+)?per\s+hour\s*$', alarm_frequency)
+        return 'hour', int(my_match.group(1))
+    elif re.match(r'^\s*at\s+most\s+once\s+per\s+(\d+\s*)?(second|minute|hour|day)s?\s*$', alarm_frequency):
+        my_match = re.match(r'^\s*at\s+most\s+once\s+per\s+(\d+\s*)?(second|minute|hour|day)s?\s*$', alarm_frequency)
+        unit_seconds_dic = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+        return 'interval', int(my_match.group(1) or 1) * unit_seconds_dic[my_match.group(2)]
+
+    return None
+
+
+def parse_execute_frequency(script_execute_frequency):
+    """
+    Parse script_execute_frequency into the expected interval (seconds) between two runs, None if it is not understood.
+    * "every <n> <unit>s" / "every <unit>" / "<unit>ly"  -> n units, unit is second/minute/hour/day/week.
+    * "once a <unit>" / "<n> times a <unit>"              -> 1/n unit ("per" works as "a").
+    * "每<n><单位>" / "每<单位>"                           -> n units, 单位 is 秒/分钟/小时/天/周.
+    * crontab "<minute> <hour> <day> <month> <weekday>"   -> the longest gap between two runs.
+    """
+    unit_seconds_dic = {'second': 1, 'minute': 60, 'min': 60, 'hour': 3600, 'day': 86400, 'week': 604800,
+                        '秒': 1, '分钟': 60, '分': 60, '小时': 3600, '时': 3600, '天': 86400, '日': 86400, '周': 604800}
+    script_execute_frequency = str(script_execute_frequency).strip().lower()
+
+    if re.match(r'^every\s+(\d+\s*)?(second|minute|min|hour|day|week)s?$', script_execute_frequency):
+        my_match = re.match(r'^every\s+(\d+\s*)?(second|minute|min|hour|day|week)s?$', script_execute_frequency)
+        return int(my_match.group(1) or 1) * unit_seconds_dic[my_match.group(2)]
+    elif re.match(r'^(secondly|minutely|hourly|daily|weekly)$', script_execute_frequency):
+        return {'secondly': 1, 'minutely': 60, 'hourly': 3600, 'daily': 86400, 'weekly': 604800}[script_execute_frequency]
+    elif re.match(r'^(once|twice|(\d+)\s+times?)\s+(a|an|per|every)\s+(second|minute|min|hour|day|week)$', script_execute_frequency):
+        my_match = re.match(r'^(once|twice|(\d+)\s+times?)\s+(a|an|per|every)\s+(second|minute|min|hour|day|week)$', script_execute_frequency)
+        times = {'once': 1, 'twice': 2}.get(my_match.group(1)) or int(my_match.group(2))
+        return int(unit_seconds_dic[my_match.group(4)] / times) if times else None
+    elif re.match(r'^每\s*(\d+)?\s*(个)?\s*(秒|分钟|分|小时|时|天|日|周)', script_execute_frequency):
+        my_match = re.match(r'^每\s*(\d+)?\s*(个)?\s*(秒|分钟|分|小时|时|天|日|周)', script_execute_frequency)
+        return int(my_match.group(1) or 1) * unit_seconds_dic[my_match.group(3)]
+    elif is_crontab_expression(script_execute_frequency):
+        return parse_crontab_interval(script_execute_frequency)
+
+    return None
+
+
+def parse_crontab_field(field, min_value, max_value):
+    """
+    Get the sorted values of a crontab field, like "*", "*/5", "1-10/2" or "0,30".
+    """
+    value_set = set()
+
+    for item in field.split(','):
+        my_match = re.match(r'^(\*|(\d+)(-(\d+))?)(/(\d+))?$', item)
+
+        if not my_match:
+            raise ValueError('"' + str(field) + '": Invalid crontab field.')
+
+        if my_match.group(1) == '*':
+            (begin_value, end_value) = (min_value, max_value)
+        else:
+            begin_value = int(my_match.group(2))
+            end_value = int(my_match.group(4)) if my_match.group(4) else (max_value if my_match.group(6) else begin_value)
+
+        value_set.update(range(begin_value, end_value + 1, int(my_match.group(6) or 1)))
+
+    return sorted(value for value in value_set if min_value <= value <= max_value)
+
+
+def parse_crontab_interval(crontab_expression):
+    """
+    Get the longest gap (seconds) between two runs of crontab_expression, None if it is invalid.
+    A day/month/weekday restriction is taken as a week (weekday) or a month (day/month), the runs are not expanded over the calendar.
+    """
+    try:
+        (minute_field, hour_field, day_field, month_field, weekday_field) = str(crontab_expression).split()
+        minute_list = parse_crontab_field(minute_field, 0, 59)
+        hour_list = parse_crontab_field(hour_field, 0, 23)
+    except ValueError:
+        return None
+
+    if (not minute_list) or (not hour_list):
+        return None
+
+    if (day_field != '*') or (month_field != '*'):
+        return 31 * 86400
+    elif weekday_field != '*':
+        return 7 * 86400
+
+    # Minutes of the day the job runs at, the gap over midnight counts too.
+    run_minute_list = [hour * 60 + minute for hour in hour_list for minute in minute_list]
+    gap_list = [next_minute - minute for (minute, next_minute) in zip(run_minute_list, run_minute_list[1:] + [run_minute_list[0] + 1440])]
+
+    return max(gap_list) * 60
+
+
+def is_crontab_expression(script_execute_frequency):
+    return bool(re.match(r'^[\d*,/-]+(\s+[\d*,/-]+){4}$', str(script_execute_frequency).strip()))
+
+
+def get_next_crontab_time(crontab_expression, current_datetime):
+    """
+    Get the next run time (datetime) of crontab_expression after current_datetime, None if it is invalid or does not run in a year.
+    Like cron, a day matches if either day or weekday matches when both are restricted.
+    """
+    try:
+        (minute_field, hour_field, day_field, month_field, weekday_field) = str(crontab_expression).split()
+        minute_list = parse_crontab_field(minute_field, 0, 59)
+        hour_list = parse_crontab_field(hour_field, 0, 23)
+        day_list = parse_crontab_field(day_field, 1, 31)
+        month_list = parse_crontab_field(month_field, 1, 12)
+        # 0 and 7 are both Sunday.
+        weekday_list = [weekday % 7 for weekday in parse_crontab_field(weekday_field, 0, 7)]
+    except ValueError:
+        return None
+
+    next_datetime = current_datetime.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+
+    for day in range(367):
+        date = next_datetime.date() + datetime.timedelta(days=day)
+
+        if date.month not in month_list:
+            continue
+
+        if (day_field != '*') and (weekday_field != '*'):
+            day_match = (date.day in day_list) or ((date.isoweekday() % 7) in weekday_list)
+        else:
+            day_match = (date.day in day_list) and ((date.isoweekday() % 7) in weekday_list)
+
+        if day_match:
+            for hour in hour_list:
+                for minute in minute_list:
+                    run_datetime = datetime.datetime.combine(date, datetime.time(hour, minute))
+
+                    if run_datetime >= next_datetime:
+                        return run_datetime
+
+    return None
+
+
+def count_alarm(alarm_log_dir, md5):
+    """
+    Count the alarm into the alarm counter store of monitor item, before it is written into alarm log.
+    """
+    try:
+        common_db.update_alarm_counter(os.path.dirname(alarm_log_dir), md5)
+    except Exception as error:
+        bprint('[SaveLog] Failed on updating alarm counter of "' + str(os.path.dirname(alarm_log_dir)) + '", ' + str(error), level='Warning')
+
+
+def is_pid_alive(pid):
+    """
+    Check whether process pid is alive on current host.
+    """
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def get_host_ip():
+    """
+    Get the ip of current host, from HOST_CACHE_FILE if it is fresh and for the same hostname.
+    """
+    hostname = socket.gethostname()
+
+    try:
+        with open(HOST_CACHE_FILE, 'r') as HCF:
+            host_dic = json.load(HCF)
+
+        if (host_dic['hostname'] == hostname) and (0 <= time.time() - host_dic['time'] < HOST_CACHE_TIME):
+            return host_dic['ip']
+    except Exception:
+        pass
+
+    ip = socket.gethostbyname(hostname)
+
+    # Every script refreshes it on expiry, write a temporary file first so the readers never see a partial one.
+    try:
+        tmp_host_cache_file = str(HOST_CACHE_FILE) + '.' + str(os.getpid())
+
+        with open(tmp_host_cache_file, 'w') as HCF:
+            HCF.write(json.dumps({'hostname': hostname, 'ip': ip, 'time': time.time()}))
+
+        os.replace(tmp_host_cache_file, HOST_CACHE_FILE)
+    except OSError:
+        pass
+
+    return ip
+
+
+def get_current_date_time():
+    """
+    Get current ("%Y%m%d", "%Y-%m-%d %H:%M:%S") from one clock reading, so they always match at midnight.
+    """
+    current_datetime = datetime.datetime.now()
+
+    return current_datetime.strftime('%Y%m%d'), current_datetime.strftime('%Y-%m-%d %H:%M:%S')
 
 
 def bprint(message, color='', background_color='', display_method='', date_format='', level='', indent=0, end='\n', save_file='', save_file_method='a'):
@@ -654,12 +1737,19 @@ def bprint(message, color='', background_color='', display_method='', date_forma
             return
 
 
-def run_command(command, mystdin=subprocess.PIPE, mystdout=subprocess.PIPE, mystderr=subprocess.PIPE, show=None):
+def run_command(command, mystdin=subprocess.PIPE, mystdout=subprocess.PIPE, mystderr=subprocess.PIPE, show=None, timeout=None, env=None):
     """
-    Run system command with subprocess.Popen, get returncode/stdout/stderr.
+    Run system command with subprocess.Popen, get returncode/stdout/stderr, env replaces the environment of the command if specified.
+    With timeout, the command is killed (with its children) and subprocess.TimeoutExpired is raised if it runs longer than timeout seconds.
     """
-    SP = subprocess.Popen(command, shell=True, stdin=mystdin, stdout=mystdout, stderr=mystderr)
-    (stdout, stderr) = SP.communicate()
+    SP = subprocess.Popen(command, shell=True, stdin=mystdin, stdout=mystdout, stderr=mystderr, start_new_session=bool(timeout), env=env)
+
+    try:
+        (stdout, stderr) = SP.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        os.killpg(SP.pid, signal.SIGKILL)
+        SP.communicate()
+        raise
 
     if show:
         if show == 'stdout':
@@ -679,5 +1769,8 @@ def write_csv(csv_file, content_dic):
         ...
     }
     """
+    # pandas costs hundreds of milliseconds to import, only import it here, so the monitor scripts start fast.
+    import pandas
+
     df = pandas.DataFrame(content_dic)
     df.to_csv(csv_file, index=False)
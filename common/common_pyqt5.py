@@ -1,17 +1,28 @@
 import re
 import math
+import time
+import array
+import numpy
+import weakref
+import bisect
+import operator
+import itertools
 import datetime
 import screeninfo
 
 from PyQt5.QtWidgets import QDesktopWidget, QComboBox, QLineEdit, QListWidget, QCheckBox, QListWidgetItem, QCompleter
 from PyQt5.QtGui import QTextCursor, QFont
 from PyQt5.Qt import QFontMetrics
-from PyQt5.QtCore import Qt, QEvent, QObject
+from PyQt5.QtCore import Qt, QEvent, QObject, QAbstractTableModel, QModelIndex, QThread, pyqtSignal
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 from matplotlib.backends.backend_qt5 import NavigationToolbar2QT
 from matplotlib.dates import num2date
 
+# Max points of a line drawn by DecimatedPlot, about twice the pixel width of a big screen.
+DECIMATE_POINT_NUM = 4000
+
 
 def center_window(window):
     """
@@ -283,6 +294,295 @@ class QComboCheckBox(QComboBox):
         self.checkBoxList = []
 
 
+class RecordTableModel(QAbstractTableModel):
+    """
+    Table model for big record tables (heartbeat/log/alarm), used with QTableView.
+    * Records are kept as one string list per column, no item object per cell.
+    * A record takes one row per line of multi_line_field, the other columns are empty on its following rows.
+    * The view gets FETCH_SIZE more rows with fetchMore() when it scrolls to the bottom.
+    * Sorting reorders whole records, the lines of a record stay together.
+    """
+    FETCH_SIZE = 1000
+
+    def __init__(self, title_list, field_list, multi_line_field='', parent=None):
+        super().__init__(parent)
+        self.title_list = title_list
+        self.field_list = field_list
+        self.multi_line_field = multi_line_field
+        self.column_list_list = [[] for field in self.field_list]
+        # First row of every record.
+        self.record_row_list = array.array('q')
+        self.fetched_row_num = 0
+        # (column, order) the records are sorted with.
+        self.sort_key = None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return self.fetched_row_num
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+
+        return len(self.field_list)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and (role == Qt.DisplayRole):
+            return self.column_list_list[index.column()][index.row()]
+
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if (orientation == Qt.Horizontal) and (role == Qt.DisplayRole):
+            return self.title_list[section]
+
+        return super().headerData(section, orientation, role)
+
+    def get_row_num(self):
+        """
+        Get the row number of all records, include the rows not fetched yet.
+        """
+        return len(self.column_list_list[0])
+
+    def get_record_num(self):
+        return len(self.record_row_list)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+
+        return self.fetched_row_num < self.get_row_num()
+
+    def fetchMore(self, parent=QModelIndex()):
+        fetch_num = min(self.FETCH_SIZE, self.get_row_num() - self.fetched_row_num)
+
+        if parent.isValid() or (fetch_num <= 0):
+            return
+
+        self.beginInsertRows(QModelIndex(), self.fetched_row_num, self.fetched_row_num + fetch_num - 1)
+        self.fetched_row_num += fetch_num
+        self.endInsertRows()
+
+    def gen_record_chunk(self, record_iter):
+        """
+        Convert records (an iterable of record dicts) into (column_list_list, record_row_list) with rows counted from 0.
+        It does not touch the model, RecordLoader runs it in the worker thread.
+        """
+        column_list_list = [[] for field in self.field_list]
+        record_row_list = array.array('q')
+        row_num = 0
+        multi_line_column = self.field_list.index(self.multi_line_field) if self.multi_line_field else -1
+
+        for record_dic in record_iter:
+            record_row_list.append(row_num)
+            value_list = [str(record_dic.get(field, '')) for field in self.field_list]
+            line_list = value_list[multi_line_column].strip().split('\n') if multi_line_column >= 0 else []
+
+            if len(line_list) > 1:
+                for (column, column_list) in enumerate(column_list_list):
+                    if column == multi_line_column:
+                        column_list.extend(line_list)
+                    else:
+                        column_list.append(value_list[column])
+                        column_list.extend([''] * (len(line_list) - 1))
+
+                row_num += len(line_list)
+            else:
+                if line_list:
+                    value_list[multi_line_column] = line_list[0]
+
+                for (column_list, value) in zip(column_list_list, value_list):
+                    column_list.append(value)
+
+                row_num += 1
+
+        return column_list_list, record_row_list
+
+    def add_record_chunk(self, record_chunk):
+        """
+        Save a chunk from gen_record_chunk into the column lists, the rows are shown after fetchMore().
+        """
+        (column_list_list, record_row_list) = record_chunk
+        self.record_row_list.extend(array.array('q', map(self.get_row_num().__add__, record_row_list)))
+
+        for (column_list, chunk_column_list) in zip(self.column_list_list, column_list_list):
+            column_list.extend(chunk_column_list)
+
+        self.sort_key = None
+
+    def add_records(self, record_iter):
+        """
+        Save records (an iterable of record dicts) into the column lists, they are shown after fetchMore().
+        """
+        self.add_record_chunk(self.gen_record_chunk(record_iter))
+
+    def append_record_chunk(self, record_chunk):
+        """
+        Add a chunk from gen_record_chunk after the current records, the first rows are shown at once.
+        """
+        self.add_record_chunk(record_chunk)
+
+        if self.fetched_row_num < self.FETCH_SIZE:
+            self.fetchMore()
+
+    def set_records(self, record_iter):
+        """
+        Replace all records with record_iter (an iterable of record dicts).
+        """
+        self.beginResetModel()
+        self.column_list_list = [[] for field in self.field_list]
+        self.record_row_list = array.array('q')
+        self.fetched_row_num = 0
+        self.add_records(record_iter)
+        self.endResetModel()
+
+        # Show the first rows at once.
+        self.fetchMore()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """
+        Sort records with the first row value of the column.
+        """
+        record_num = len(self.record_row_list)
+
+        if (column < 0) or (column >= len(self.field_list)) or (record_num == 0) or (self.sort_key == (column, order)):
+            return
+
+        self.layoutAboutToBeChanged.emit()
+
+        row_num = self.get_row_num()
+        old_record_row_list = self.record_row_list
+        old_record_end_row_list = old_record_row_list[1:] + array.array('q', [row_num])
+        key_list = self.column_list_list[column]
+        record_key_list = list(map(key_list.__getitem__, old_record_row_list))
+        record_order_list = sorted(range(record_num), key=record_key_list.__getitem__, reverse=(order == Qt.DescendingOrder))
+
+        if record_num == row_num:
+            # Every record takes one row.
+            row_order_list = record_order_list
+        else:
+            begin_row_list = list(map(old_record_row_list.__getitem__, record_order_list))
+            end_row_list = list(map(old_record_end_row_list.__getitem__, record_order_list))
+            row_order_list = list(itertools.chain.from_iterable(map(range, begin_row_list, end_row_list)))
+            self.record_row_list = array.array('q', [0])
+            self.record_row_list.extend(itertools.accumulate(map(operator.sub, end_row_list[:-1], begin_row_list[:-1])))
+
+        self.column_list_list = [list(map(column_list.__getitem__, row_order_list)) for column_list in self.column_list_list]
+
+        # Keep selection on the same cells.
+        old_index_list = self.persistentIndexList()
+        new_index_list = []
+
+        if old_index_list:
+            record_position_dic = {record: position for (position, record) in enumerate(record_order_list)}
+
+            for index in old_index_list:
+                record = bisect.bisect_right(old_record_row_list, index.row()) - 1
+                new_row = self.record_row_list[record_position_dic[record]] + index.row() - old_record_row_list[record]
+                new_index_list.append(self.index(new_row, index.column()))
+
+        self.changePersistentIndexList(old_index_list, new_index_list)
+        self.sort_key = (column, order)
+        self.layoutChanged.emit()
+
+
+class RecordLoader(QThread):
+    """
+    Iterate record_iter (a record generator) in a worker thread, hand the records to the GUI thread with records_loaded in chunks.
+    chunk_function converts every record list in the worker thread, so the GUI thread only needs to save the result (RecordTableModel.gen_record_chunk).
+    Stop it with requestInterruption(), the records in the unfinished chunk are dropped.
+    """
+    records_loaded = pyqtSignal(object)
+    CHUNK_SIZE = 5000
+    CHUNK_INTERVAL = 0.2
+
+    def __init__(self, record_iter, chunk_function=None, parent=None):
+        super().__init__(parent)
+        self.record_iter = record_iter
+        self.chunk_function = chunk_function
+        self.record_num = 0
+        self.error = ''
+
+    def run(self):
+        record_list = []
+        last_time = time.time()
+
+        try:
+            for record_dic in self.record_iter:
+                if self.isInterruptionRequested():
+                    break
+
+                record_list.append(record_dic)
+
+                if (len(record_list) >= self.CHUNK_SIZE) or (time.time() - last_time >= self.CHUNK_INTERVAL):
+                    self.emit_records(record_list)
+                    record_list = []
+                    last_time = time.time()
+
+            if record_list and (not self.isInterruptionRequested()):
+                self.emit_records(record_list)
+        except Exception as error:
+            self.error = str(error)
+        finally:
+            # Close the day files at once.
+            if hasattr(self.record_iter, 'close'):
+                self.record_iter.close()
+
+    def emit_records(self, record_list):
+        self.record_num += len(record_list)
+
+        if self.chunk_function:
+            self.records_loaded.emit(self.chunk_function(record_list))
+        else:
+            self.records_loaded.emit(record_list)
+
+
+class RecordExporter(QThread):
+    """
+    Run export_function(record_iter) (like common_db.export_records) in a worker thread, emit progress with the record number read so far.
+    Stop it with requestInterruption(), record_iter raises InterruptedError to export_function then, which should drop the unfinished file.
+    """
+    progress = pyqtSignal(int)
+    PROGRESS_INTERVAL = 0.2
+
+    def __init__(self, record_iter, export_function, parent=None):
+        super().__init__(parent)
+        self.record_iter = record_iter
+        self.export_function = export_function
+        self.record_num = 0
+        self.cancelled = False
+        self.error = ''
+
+    def run(self):
+        try:
+            self.export_function(self.iter_records())
+        except InterruptedError:
+            self.cancelled = True
+        except Exception as error:
+            self.error = str(error)
+        finally:
+            if hasattr(self.record_iter, 'close'):
+                self.record_iter.close()
+
+    def iter_records(self):
+        last_time = time.time()
+
+        for record_dic in self.record_iter:
+            if self.isInterruptionRequested():
+                raise InterruptedError('Export is cancelled.')
+
+            self.record_num += 1
+            yield record_dic
+
+            if time.time() - last_time >= self.PROGRESS_INTERVAL:
+                self.progress.emit(self.record_num)
+                last_time = time.time()
+
+        self.progress.emit(self.record_num)
+
+
 class FigureCanvasQTAgg(FigureCanvasQTAgg):
     """
     Generate a new figure canvas.
@@ -293,6 +593,98 @@ class FigureCanvasQTAgg(FigureCanvasQTAgg):
         super().__init__(self.figure)
 
 
+def decimate(x_array, y_array, max_point_num=DECIMATE_POINT_NUM):
+    """
+    Downsample (x_array, y_array) to about max_point_num points for display.
+    The min and max points of every group are kept, so a spike is still shown.
+    """
+    point_num = len(y_array)
+
+    if point_num <= max_point_num:
+        return x_array, y_array
+
+    group_size = int(math.ceil(point_num / (max_point_num // 2)))
+    group_num = point_num // group_size
+    group_array = y_array[:group_num * group_size].reshape(group_num, group_size)
+    group_begin_array = numpy.arange(group_num) * group_size
+    index_array = numpy.concatenate([group_begin_array + group_array.argmin(axis=1),
+                                     group_begin_array + group_array.argmax(axis=1),
+                                     numpy.arange(group_num * group_size, point_num)])
+    index_array = numpy.unique(index_array)
+
+    return x_array[index_array], y_array[index_array]
+
+
+class DecimatedPlot():
+    """
+    Plot big series on axes with at most max_point_num points per line.
+    The full series are kept, the visible range is downsampled again after zooming or panning.
+    """
+    def __init__(self, axes, max_point_num=DECIMATE_POINT_NUM):
+        self.axes = axes
+        self.max_point_num = max_point_num
+        # {line: (x_array, y_array)}, x_array is sorted.
+        self.line_dic = {}
+        self.axes.callbacks.connect('xlim_changed', self.update_lines)
+
+    def plot(self, x_array, y_array, **kwargs):
+        (line, ) = self.axes.plot(*decimate(x_array, y_array, self.max_point_num), **kwargs)
+        self.line_dic[line] = (x_array, y_array)
+
+        return line
+
+    def update_lines(self, axes):
+        (x_min, x_max) = axes.get_xlim()
+
+        for (line, (x_array, y_array)) in self.line_dic.items():
+            # Keep one more point on both sides, so the line runs to the edges.
+            begin_index = max(int(numpy.searchsorted(x_array, x_min, side='left')) - 1, 0)
+            end_index = min(int(numpy.searchsorted(x_array, x_max, side='right')) + 1, len(x_array))
+            line.set_data(*decimate(x_array[begin_index:end_index], y_array[begin_index:end_index], self.max_point_num))
+
+
+class BlitCursor():
+    """
+    A vertical cursor line on every axes of canvas, which follows the mouse.
+    The cursor is drawn with blitting over the saved figure background, the figure itself is not redrawn on mouse move.
+    """
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self.background = None
+        self.line_list = []
+        self.canvas.mpl_connect('draw_event', self.save_background)
+        self.canvas.mpl_connect('motion_notify_event', self.move)
+
+    def reset(self):
+        """
+        Add the cursor lines again after the axes are (re)generated.
+        """
+        self.line_list = []
+
+        for axes in self.canvas.figure.axes:
+            # Not added as a plot line, so it is out of autoscale and the line list.
+            line = Line2D([0, 0], [0, 1], transform=axes.get_xaxis_transform(), color='gray', linewidth=0.8, animated=True, visible=False)
+            axes.add_artist(line)
+            self.line_list.append(line)
+
+    def save_background(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+
+    def move(self, event):
+        if (self.background is None) or (not self.line_list):
+            return
+
+        self.canvas.restore_region(self.background)
+
+        if event.inaxes and (event.xdata is not None):
+            for line in self.line_list:
+                line.set_xdata([event.xdata, event.xdata])
+                line.set_visible(True)
+                line.axes.draw_artist(line)
+
+        self.canvas.blit(self.canvas.figure.bbox)
+
+
 class NavigationToolbar2QT(NavigationToolbar2QT):
     """
     Enhancement for NavigationToolbar2QT, can get and show label value.
@@ -300,80 +692,65 @@ class NavigationToolbar2QT(NavigationToolbar2QT):
     def __init__(self, canvas, parent, coordinates=True, x_is_date=True):
         super().__init__(canvas, parent, coordinates)
         self.x_is_date = x_is_date
+        # {line: (xdata, ydata, sorted x array, y array in the same order)}, rebuilt when the line data is changed.
+        self.line_cache_dic = weakref.WeakKeyDictionary()
 
-    @staticmethod
-    def bisection(event_xdata, xdata_list):
-        xdata = None
-        index = None
-        lower = 0
-        upper = len(xdata_list) - 1
-        bisection_index = (upper - lower) // 2
-
-        if xdata_list:
-            if event_xdata > xdata_list[upper]:
-                xdata = xdata_list[upper]
-                index = upper
-            elif (event_xdata < xdata_list[lower]) or (len(xdata_list) <= 2):
-                xdata = xdata_list[lower]
-                index = lower
-            elif event_xdata in xdata_list:
-                xdata = event_xdata
-                index = xdata_list.index(event_xdata)
-
-            while xdata is None:
-                if upper - lower == 1:
-                    if event_xdata - xdata_list[lower] <= xdata_list[upper] - event_xdata:
-                        xdata = xdata_list[lower]
-                        index = lower
-                    else:
-                        xdata = xdata_list[upper]
-                        index = upper
+    def get_line_data(self, line):
+        """
+        Get (sorted x array, y array) of line, x is in axes units (dates are numbers).
+        """
+        (xdata, ydata) = (line.get_xdata(orig=True), line.get_ydata(orig=True))
+        line_cache = self.line_cache_dic.get(line)
 
-                    break
+        if (line_cache is None) or (line_cache[0] is not xdata) or (line_cache[1] is not ydata):
+            x_array = numpy.asarray(line.get_xdata(orig=False), dtype=float)
+            y_array = numpy.asarray(line.get_ydata(orig=False))
+            order_array = numpy.argsort(x_array, kind='stable')
+            line_cache = (xdata, ydata, x_array[order_array], y_array[order_array])
+            self.line_cache_dic[line] = line_cache
 
-                if event_xdata > xdata_list[bisection_index]:
-                    lower = bisection_index
-                elif event_xdata < xdata_list[bisection_index]:
-                    upper = bisection_index
+        return line_cache[2], line_cache[3]
 
-                bisection_index = (upper - lower) // 2 + lower
+    @staticmethod
+    def get_nearest_index(x_array, x):
+        """
+        Get the index of the value nearest to x on sorted x_array.
+        """
+        index = int(numpy.searchsorted(x_array, x))
+
+        if index >= len(x_array):
+            return len(x_array) - 1
+
+        if (index > 0) and (x - x_array[index - 1] <= x_array[index] - x):
+            return index - 1
 
-        return xdata, index
+        return index
 
     def _mouse_event_to_message(self, event):
-        if event.inaxes and event.inaxes.get_navigate():
-            try:
-                if self.x_is_date:
-                    event_xdata = num2date(event.xdata).strftime('%Y,%m,%d,%H,%M,%S')
-                else:
-                    event_xdata = event.xdata
-            except (ValueError, OverflowError):
-                pass
-            else:
-                if self.x_is_date and (len(event_xdata.split(',')) == 6):
-                    (year, month, day, hour, minute, second) = event_xdata.split(',')
-                    event_xdata = datetime.datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+        if event.inaxes and event.inaxes.get_navigate() and (event.xdata is not None):
+            line_list = [line for line in event.inaxes.get_lines() if len(line.get_xdata(orig=True)) and (not line.get_animated())]
 
-                xdata_list = list(self.canvas.figure.gca().get_lines()[0].get_xdata())
-                (xdata, index) = self.bisection(event_xdata, sorted(xdata_list))
+            if line_list:
+                (x_array, y_array) = self.get_line_data(line_list[0])
+                xdata = x_array[self.get_nearest_index(x_array, event.xdata)]
+                info_list = []
 
-                if xdata is not None:
-                    info_list = []
+                for line in line_list:
+                    (x_array, y_array) = self.get_line_data(line)
+                    ydata = y_array[self.get_nearest_index(x_array, xdata)]
 
-                    for line in self.canvas.figure.gca().get_lines():
-                        label = line.get_label()
-                        ydata_string = line.get_ydata()
-                        ydata_list = list(ydata_string)
-                        ydata = ydata_list[index]
+                    info_list.append('%s=%s' % (line.get_label(), ydata))
 
-                        info_list.append('%s=%s' % (label, ydata))
+                info_string = '  '.join(info_list)
 
-                    info_string = '  '.join(info_list)
+                if self.x_is_date:
+                    try:
+                        xdata_string = num2date(xdata).strftime('%Y-%m-%d %H:%M:%S')
+                    except (ValueError, OverflowError):
+                        return ''
 
-                    if self.x_is_date:
-                        xdata_string = xdata.strftime('%Y-%m-%d %H:%M:%S')
-                        xdata_string = re.sub(r' 00:00:00', '', xdata_string)
-                        info_string = '[%s]\n%s' % (xdata_string, info_string)
+                    xdata_string = re.sub(r' 00:00:00', '', xdata_string)
+                    info_string = '[%s]\n%s' % (xdata_string, info_string)
 
-                    return info_string
+                return info_string
         return ''
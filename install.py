@@ -1,6 +1,7 @@
 import os
 import sys
 import getpass
+import secrets
 
 CWD = os.getcwd()
 USER = getpass.getuser()
@@ -36,7 +37,7 @@ def gen_shell_tools():
     """
     Generate shell scripts under <MONITOR_VIEWER_INSTALL_PATH>/tools.
     """
-    tool_list = ['bin/monitor_viewer', 'scripts/gen_monitor_script', 'scripts/default/check_script_heartbeat', 'tools/patch']
+    tool_list = ['bin/monitor_viewer', 'scripts/gen_monitor_script', 'scripts/default/check_script_heartbeat', 'tools/patch', 'tools/reindex_db', 'tools/compact_db', 'tools/benchmark_scan', 'tools/benchmark_startup', 'tools/gen_synthetic_db', 'tools/benchmark_service', 'tools/monitor_collector', 'tools/monitor_runner']
 
     for tool_name in tool_list:
         tool = str(CWD) + '/' + str(tool_name)
@@ -90,8 +91,44 @@ db_path = "''' + str(db_path) + '''"
 # Specify valid message level list, which is used on SaveLog.save_log argument.
 valid_message_level_list = ['Debug', 'Info', 'Warning', 'Error', 'Fatal']
 
-# Specify how to execute alarm command.
+# Specify how to execute alarm command, <TITLE>/<MESSAGE>/<RECEIVERS> are taken from environment variables $MONITOR_VIEWER_ALARM_TITLE/MESSAGE/RECEIVERS, never parsed by shell.
 send_alarm_command = ""
+
+# Specify the timeout (seconds) of alarm command, 0 means no timeout.
+alarm_timeout = 60
+
+# Specify how many alarm commands are executed in parallel by SaveLog(async_alarm=True).
+alarm_worker_num = 4
+
+# Specify how many times a failed alarm is retried by SaveLog(async_alarm=True), with 1s/2s/4s/... backoff.
+alarm_retry_num = 2
+
+# Specify the unix socket of the local collector (tools/monitor_collector), SaveLog ships events to it when it is running, empty means SaveLog always writes db_path directly.
+collector_socket = ""
+
+# Specify the web /ingest url (like "http://<web_host>:5000/ingest"), SaveLog posts everything to it in batches instead of writing db_path, for the hosts which can not mount db_path.
+ingest_url = ""
+
+# Specify the shared token of web /ingest, SaveLog sends it, web only takes send_alarm/monitor_item events (which run send_alarm_command) with it, empty means /ingest only takes records.
+ingest_token = "''' + str(secrets.token_hex(16)) + '''"
+
+# Specify how many monitor scripts are run in parallel by tools/monitor_runner.
+runner_worker_num = 8
+
+# Specify how tools/monitor_runner runs the scripts, "thread" (imported once, a run over timeout can not be stopped) or "process" (a child process per run, killed on timeout).
+runner_mode = "thread"
+
+# Specify the max seconds tools/monitor_runner shifts a run from its scheduled time, so the scripts of the same frequency do not start together.
+runner_max_jitter = 30
+
+# Specify how many monitor items are scanned in parallel on web, 0 or 1 means scanning one by one.
+scan_worker_num = 8
+
+# Specify the parallel scanning executor, "thread" (good for NFS db_path) or "process" (decode records in worker processes).
+scan_executor = "thread"
+
+# Specify the max total size (MB) of day files cached decoded in memory on web, 0 disables the cache.
+day_file_cache_size = 128
 ''')
 
             os.chmod(config_file, 0o755)
@@ -1,62 +1,349 @@
 # -*- coding: utf-8 -*-
 
 import os
+import re
 import sys
+import json
+import time
+import argparse
 import datetime
 
 os.environ['PYTHONUNBUFFERED'] = '1'
 
 sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
 import common_monitor
+import common_db
 sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/config')
 import config
 
+# Heartbeat state <db_path>/.heartbeat_state, {"journal_offset", "check_time", "item_dic": {"<direction> <monitor_item>": item_state_dic}}.
+# item_state_dic is {"frequency", "interval", "last_time", "date", "offset", "alarm_last_time", "alarm_time", "late_last_time"}, the heartbeat day file of "date" is read up to byte "offset".
+HEARTBEAT_STATE_FILE = '.heartbeat_state'
+# Relist all monitor items this often (seconds), for the monitor_item.yaml changes out of the catalog journal, like editing by hand.
+FULL_CHECK_INTERVAL = 86400
+# Expected interval (seconds) of the monitor items without a known script_execute_frequency, like the former daily check.
+DEFAULT_INTERVAL = 86400
+# Bytes read from the end of a heartbeat day file for the last heartbeat.
+TAIL_SIZE = 4096
+# Max days to look back for the last heartbeat of a new monitor item.
+MAX_LOOKBACK_DAYS = 31
+# Alarm a late monitor item again after this long (seconds) if it is still late.
+REALARM_INTERVAL = 86400
+
 save_log_ins = common_monitor.SaveLog(
     direction='default',
     monitor_item='check_script_heartbeat',
     script_path=os.path.abspath(__file__),
     script_auther='',
     script_startup_method='crontab',
-    script_execute_frequency='once a day',
+    script_execute_frequency='every minute',
     alarm_receivers='',
     alarm_frequency='max 1 times')
 
 
-def check_script_heartbeat():
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--late_factor',
+                        type=float,
+                        default=2,
+                        help='A monitor item is late if it has no heartbeat for late_factor expected intervals, default is 2 (one run is missed).')
+    parser.add_argument('--grace',
+                        type=int,
+                        default=60,
+                        help='Specify the extra seconds allowed before a monitor item is late, for the script run time, default is 60.')
+    parser.add_argument('--full_check_interval',
+                        type=int,
+                        default=FULL_CHECK_INTERVAL,
+                        help='Specify how often (seconds) all monitor items are relisted, default is ' + str(FULL_CHECK_INTERVAL) + '.')
+    parser.add_argument('--rebuild',
+                        action='store_true',
+                        default=False,
+                        help='Drop the heartbeat state, relist all monitor items and read their last heartbeats again.')
+    parser.add_argument('--alarm_no_heartbeat',
+                        action='store_true',
+                        default=False,
+                        help='Also alarm the monitor items which never had a heartbeat, default they are skipped.')
+    parser.add_argument('--all',
+                        action='store_true',
+                        default=False,
+                        help='Show the lateness of all monitor items, default only the newly late ones (or late with a changed last heartbeat) are shown.')
+
+    args = parser.parse_args()
+
+    return args.late_factor, args.grace, args.full_check_interval, args.rebuild, args.alarm_no_heartbeat, args.all
+
+
+def load_heartbeat_state(state_file):
+    """
+    Load the heartbeat state, None if it is missing or broken.
+    """
+    try:
+        with open(state_file, 'r') as SF:
+            return json.load(SF)
+    except (OSError, ValueError):
+        return None
+
+
+def save_heartbeat_state(state_file, state_dic):
+    """
+    Write a temporary file first, so a concurrent run never reads a partial one.
+    """
+    tmp_state_file = str(state_file) + '.' + str(os.getpid())
+
+    with open(tmp_state_file, 'w') as SF:
+        SF.write(json.dumps(state_dic))
+
+    os.replace(tmp_state_file, state_file)
+
+
+def update_item_info(state_dic, direction, monitor_item, info_dic):
+    """
+    Save script_execute_frequency of monitor item into the state, drop the monitor item if info_dic is None (monitor_item.yaml is missing).
+    """
+    item_key = str(direction) + ' ' + str(monitor_item)
+
+    if info_dic is None:
+        state_dic['item_dic'].pop(item_key, None)
+        return
+
+    item_state_dic = state_dic['item_dic'].setdefault(item_key, {'frequency': '', 'interval': None, 'last_time': '', 'date': '', 'offset': 0, 'alarm_last_time': None, 'alarm_time': 0, 'late_last_time': None})
+    item_state_dic['frequency'] = str(info_dic.get('script_execute_frequency', ''))
+    item_state_dic['interval'] = common_monitor.parse_execute_frequency(item_state_dic['frequency'])
+
+
+def rebuild_item_info(state_dic):
+    """
+    Relist all monitor items from the catalog, the heartbeat positions of the known monitor items are kept.
+    """
+    journal_file = str(config.db_path) + '/' + str(common_db.CATALOG_JOURNAL)
+    # The journal after this is read next time, it may cover a change twice, but never misses one.
+    state_dic['journal_offset'] = os.path.getsize(journal_file) if os.path.isfile(journal_file) else 0
+    state_dic['check_time'] = time.time()
+    item_key_set = set()
+
+    for (direction, monitor_item_dic) in common_db.get_catalog(config.db_path).items():
+        for (monitor_item, info_dic) in monitor_item_dic.items():
+            update_item_info(state_dic, direction, monitor_item, info_dic)
+            item_key_set.add(str(direction) + ' ' + str(monitor_item))
+
+    for item_key in list(state_dic['item_dic'].keys()):
+        if item_key not in item_key_set:
+            del state_dic['item_dic'][item_key]
+
+
+def read_catalog_journal(state_dic):
+    """
+    Reload monitor_item.yaml of the monitor items written into the catalog journal since last time, return False if the journal is truncated.
+    """
+    journal_file = str(config.db_path) + '/' + str(common_db.CATALOG_JOURNAL)
+
+    try:
+        journal_size = os.path.getsize(journal_file)
+    except OSError:
+        journal_size = 0
+
+    if journal_size < state_dic['journal_offset']:
+        return False
+    elif journal_size > state_dic['journal_offset']:
+        changed_item_set = set()
+
+        with open(journal_file, 'rb') as JF:
+            JF.seek(state_dic['journal_offset'])
+
+            for line in JF:
+                if not line.endswith(b'\n'):
+                    break
+
+                state_dic['journal_offset'] += len(line)
+                fields = line.decode(errors='replace').split()
+
+                if len(fields) == 2:
+                    changed_item_set.add((fields[0], fields[1]))
+
+        for (direction, monitor_item) in changed_item_set:
+            monitor_item_yaml = str(config.db_path) + '/' + str(direction) + '/' + str(monitor_item) + '/monitor_item.yaml'
+            update_item_info(state_dic, direction, monitor_item, common_db.load_monitor_item_yaml(monitor_item_yaml))
+
+    return True
+
+
+def get_day_file_last_time(day_file, offset=0):
     """
-    Check if the script heartbeat log is continuous.
+    Get (last heartbeat time after byte offset, new offset) of heartbeat day_file, only the complete lines at the end are read.
+    A compacted (closed) day file is read from its time column.
+    """
+    try:
+        size = os.path.getsize(day_file)
+    except OSError:
+        compact_dic = common_db.load_compact_day_file(day_file)
+
+        if compact_dic and compact_dic['time_list']:
+            return max(compact_dic['time_list']), 0
+
+        return '', 0
+
+    if size < offset:
+        # Replaced by a smaller file, read it again.
+        offset = 0
+
+    if size == offset:
+        return '', offset
+
+    begin_offset = max(offset, size - TAIL_SIZE)
+
+    with open(day_file, 'rb') as DF:
+        DF.seek(begin_offset)
+        line_list = DF.read(size - begin_offset).split(b'\n')
+
+    # The last one is the line being written (or b''), the first one may be cut by TAIL_SIZE.
+    new_offset = size - len(line_list[-1])
+    line_list = line_list[1:-1] if begin_offset > offset else line_list[:-1]
+    time_list = []
+
+    for line in line_list:
+        if line.strip():
+            try:
+                time_list.append(common_db.get_line_time(line))
+            except (ValueError, KeyError):
+                pass
+
+    return (max(time_list) if time_list else ''), new_offset
+
+
+def update_last_time(direction, monitor_item, item_state_dic, current_datetime):
+    """
+    Read the heartbeats written since last time, only today's day file is checked, unless the date is changed.
+    """
+    today = current_datetime.strftime('%Y%m%d')
+    last_time_list = [item_state_dic['last_time']]
+
+    if item_state_dic['date'] != today:
+        if item_state_dic['date']:
+            # Finish the day files since last time in order.
+            last_date = datetime.datetime.strptime(item_state_dic['date'], '%Y%m%d')
+            days = min((current_datetime - last_date).days, MAX_LOOKBACK_DAYS)
+
+            for day in range(days, 0, -1):
+                date = (current_datetime - datetime.timedelta(days=day)).strftime('%Y%m%d')
+                offset = item_state_dic['offset'] if (date == item_state_dic['date']) else 0
+                last_time_list.append(get_day_file_last_time(common_db.get_day_file(config.db_path, direction, monitor_item, 'heartbeat', date), offset)[0])
+        else:
+            # A new monitor item, look back for its last heartbeat.
+            for day in range(1, MAX_LOOKBACK_DAYS + 1):
+                date = (current_datetime - datetime.timedelta(days=day)).strftime('%Y%m%d')
+                last_time = get_day_file_last_time(common_db.get_day_file(config.db_path, direction, monitor_item, 'heartbeat', date))[0]
+
+                if last_time:
+                    last_time_list.append(last_time)
+                    break
+
+        item_state_dic['date'] = today
+        item_state_dic['offset'] = 0
+
+    (last_time, item_state_dic['offset']) = get_day_file_last_time(common_db.get_day_file(config.db_path, direction, monitor_item, 'heartbeat', today), item_state_dic['offset'])
+    last_time_list.append(last_time)
+    item_state_dic['last_time'] = max(last_time_list)
+
+
+def has_heartbeat_file(direction, monitor_item):
+    """
+    Check whether monitor item has any heartbeat day file (json or compacted).
+    """
+    heartbeat_dir = str(config.db_path) + '/' + str(direction) + '/' + str(monitor_item) + '/heartbeat'
+
+    try:
+        return any(re.match(r'^\d{8}(' + re.escape(common_db.COMPACT_SUFFIX) + ')?$', file_name) for file_name in os.listdir(heartbeat_dir))
+    except OSError:
+        return False
+
+
+def get_lateness(item_state_dic, current_datetime, late_factor, grace):
+    """
+    Get (expected interval, seconds since the expected next heartbeat, is late or not) of monitor item.
+    """
+    interval = item_state_dic['interval'] or DEFAULT_INTERVAL
+
+    if item_state_dic['last_time']:
+        elapsed = (current_datetime - datetime.datetime.strptime(item_state_dic['last_time'], '%Y-%m-%d %H:%M:%S')).total_seconds()
+    else:
+        elapsed = MAX_LOOKBACK_DAYS * 86400
+
+    return interval, int(elapsed - interval), (elapsed > interval * late_factor + grace)
+
+
+def check_script_heartbeat(late_factor, grace, full_check_interval, rebuild, alarm_no_heartbeat, show_all):
+    """
+    Check if every monitor item has heartbeat in the expected interval of its script_execute_frequency.
+    The monitor items and their last heartbeats are kept in HEARTBEAT_STATE_FILE, a run only reads the catalog journal and the new heartbeats of today.
+    The monitor items which never had a heartbeat file are skipped, unless alarm_no_heartbeat.
     """
     if (not config.db_path) or (not os.path.exists(config.db_path)):
         common_monitor.bprint('', level='Error')
         sys.exit(1)
 
+    state_file = str(config.db_path) + '/' + str(HEARTBEAT_STATE_FILE)
+    state_dic = None if rebuild else load_heartbeat_state(state_file)
+
+    if state_dic is None:
+        state_dic = {'journal_offset': 0, 'check_time': 0, 'item_dic': {}}
+        rebuild_item_info(state_dic)
+    elif (time.time() - state_dic['check_time'] > full_check_interval) or (not read_catalog_journal(state_dic)):
+        rebuild_item_info(state_dic)
+
     alarm_title = 'Default Alarm: 心跳日志中断!'
-    today = datetime.datetime.now().strftime('%Y%m%d')
-    yesterday = (datetime.datetime.now() - datetime.timedelta(days=1)).strftime('%Y%m%d')
+    current_datetime = datetime.datetime.now()
+    late_num = 0
+    line_list = []
+
+    for (item_key, item_state_dic) in sorted(state_dic['item_dic'].items()):
+        (direction, monitor_item) = item_key.split(' ', 1)
+        update_last_time(direction, monitor_item, item_state_dic, current_datetime)
+        (interval, lateness, late) = get_lateness(item_state_dic, current_datetime, late_factor, grace)
+
+        if late and (not item_state_dic['last_time']) and (not alarm_no_heartbeat) and (not has_heartbeat_file(direction, monitor_item)):
+            late = False
+
+        if late:
+            late_num += 1
+
+        # A run every minute only shows the items which are newly late, or still late with a new last heartbeat.
+        if show_all or (late and (item_state_dic.get('late_last_time') != item_state_dic['last_time'])):
+            line_list.append('%-48s %-20s %-10s %-20s %-10s' % (str(direction) + '/' + str(monitor_item), item_state_dic['frequency'] or 'N/A', interval, item_state_dic['last_time'] or 'N/A', max(lateness, 0)))
+
+        item_state_dic['late_last_time'] = item_state_dic['last_time'] if late else None
+
+        # Alarm once per outage (last heartbeat), and again every REALARM_INTERVAL, so a long outage costs nothing on every run.
+        if late and ((item_state_dic.get('alarm_last_time') != item_state_dic['last_time']) or (time.time() - item_state_dic.get('alarm_time', 0) >= REALARM_INTERVAL)):
+            item_state_dic['alarm_last_time'] = item_state_dic['last_time']
+            item_state_dic['alarm_time'] = time.time()
 
-    for direction in os.listdir(config.db_path):
-        direction_path = str(config.db_path) + '/' + str(direction)
+            if item_state_dic['last_time']:
+                alarm_message = '针对' + str(direction) + '方向的监控项' + str(monitor_item) + ', 心跳日志已经中断, 最后一次心跳在' + str(item_state_dic['last_time']) + ', 预期执行频率为"' + str(item_state_dic['frequency'] or 'N/A') + '", 请检查服务是否未正常启动.'
+            else:
+                alarm_message = '针对' + str(direction) + '方向的监控项' + str(monitor_item) + ', 心跳日志已经中断超过' + str(MAX_LOOKBACK_DAYS) + '天, 请检查服务是否未正常启动.'
 
-        if os.path.exists(direction_path) and os.path.isdir(direction_path):
-            for monitor_item in os.listdir(direction_path):
-                monitor_item_path = str(direction_path) + '/' + str(monitor_item)
+            save_log_ins.send_alarm(message=alarm_message, alarm_title=alarm_title)
 
-                for dir_name in os.listdir(monitor_item_path):
-                    dir_path = str(monitor_item_path) + '/' + str(dir_name)
+    if line_list:
+        print('%-48s %-20s %-10s %-20s %-10s' % ('MONITOR_ITEM', 'EXECUTE_FREQUENCY', 'INTERVAL', 'LAST_HEARTBEAT', 'LATENESS'))
 
-                    if (dir_name == 'heartbeat') and os.path.isdir(dir_path):
-                        log_name_list = list(os.listdir(dir_path))
+        for line in line_list:
+            print(line)
 
-                        if len(log_name_list) and (today not in log_name_list) and (yesterday not in log_name_list):
-                            alarm_message = '针对' + str(direction) + '方向的监控项' + str(monitor_item) + ', 心跳日志已经中断超过一天, 请检查服务是否未正常启动.'
-                            save_log_ins.send_alarm(message=alarm_message, alarm_title=alarm_title)
+    save_heartbeat_state(state_file, state_dic)
+    common_monitor.bprint(str(len(state_dic['item_dic'])) + ' monitor items are checked, ' + str(late_num) + ' are late.', level='Info')
 
 
 ################
 # Main Process #
 ################
 def main():
-    check_script_heartbeat()
+    (late_factor, grace, full_check_interval, rebuild, alarm_no_heartbeat, show_all) = read_args()
+    check_script_heartbeat(late_factor, grace, full_check_interval, rebuild, alarm_no_heartbeat, show_all)
 
 
 if __name__ == '__main__':
@@ -37,7 +37,7 @@ def gen_python_script():
 
     if dir_name != '':
         if not os.path.exists(dir_name):
-            os.mkdirs(dir_name)
+            os.makedirs(dir_name)
 
     user = getpass.getuser()
     current_time = datetime.datetime.today().strftime('%Y-%m-%d %H:%M:%S')
@@ -63,6 +63,9 @@ def gen_python_script():
             PF.write("sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')\n")
             PF.write('import common_monitor\n')
             PF.write('\n')
+            PF.write('# The script works standalone (crontab/jenkins) and on tools/monitor_runner.\n')
+            PF.write('# monitor_runner imports it once (save_log_ins is reused), then calls main() on every run from script_execute_frequency,\n')
+            PF.write('# like "every 5 minutes" or "*/5 * * * *", so keep the per-run work in main().\n')
             PF.write("save_log_ins = common_monitor.SaveLog(\n")
             PF.write("    direction='',\n")
             PF.write("    monitor_item='',\n")
@@ -0,0 +1,10 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+import os
+import sys
+
+INSTALL_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('MONITOR_VIEWER_INSTALL_PATH', INSTALL_PATH)
+
+if INSTALL_PATH not in sys.path:
+    sys.path.insert(0, INSTALL_PATH)
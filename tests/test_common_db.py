@@ -0,0 +1,225 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+import os
+import re
+import json
+
+import pytest
+
+from common import common_db
+
+RECORD_LIST = [
+    {'time': '2026-10-17 10:00:00', 'message_level': 'Info', 'message': 'disk usage 50%', 'receivers': 'alice'},
+    {'time': '2026-10-17 10:01:00', 'message_level': 'Error', 'message': 'Disk full on host1', 'receivers': 'alice,bob'},
+    {'time': '2026-10-17 10:02:00', 'message_level': 'Error', 'message': 'no space left on host2', 'receivers': 'carol'},
+    {'time': '2026-10-17 10:03:00', 'message_level': 'Warning', 'message': 'say "hi"\nsecond line', 'receivers': 'bob carol'},
+]
+
+
+def write_day_file(day_file, record_list, mode='w'):
+    """
+    Write record_list into day_file like SaveLog, return the byte offset of every record.
+    """
+    offset_list = []
+
+    with open(day_file, mode + 'b') as DF:
+        for record_dic in record_list:
+            offset_list.append(DF.tell())
+            DF.write(json.dumps(record_dic).encode() + b'\n')
+
+    return offset_list
+
+
+def filter_records(record_list, **filter_dic):
+    """
+    Apply gen_record_filters like read_records, line filters on the raw lines first.
+    """
+    (line_filter_list, record_filter_list) = common_db.gen_record_filters(**filter_dic)
+    time_list = []
+
+    for record_dic in record_list:
+        line = json.dumps(record_dic).encode() + b'\n'
+
+        if all(line_filter(line) for line_filter in line_filter_list) and all(record_filter(record_dic) for record_filter in record_filter_list):
+            time_list.append(record_dic['time'][-8:-3])
+
+    return time_list
+
+
+@pytest.mark.parametrize('filter_dic, expected', [
+    ({}, ['10:00', '10:01', '10:02', '10:03']),
+    ({'message_level': 'Error'}, ['10:01', '10:02']),
+    ({'receiver_list': ['bob', '']}, ['10:01', '10:03']),
+    ({'receiver_list': ['ali']}, []),
+    ({'keyword': 'disk host1'}, []),
+    ({'keyword': 'Disk host1'}, ['10:01']),
+    ({'keyword': 'disk host1', 'ignore_case': True}, ['10:01']),
+    ({'keyword': 'disk host2', 'any_term': True}, ['10:00', '10:02']),
+    ({'keyword': '"no space" host2'}, ['10:02']),
+    ({'keyword': '"hi"'}, ['10:03']),
+    ({'keyword': r'host\d \d+%', 'regex': True, 'any_term': True}, ['10:01', '10:02', '10:00']),
+    ({'message_level': 'Error', 'receiver_list': ['carol'], 'keyword': 'space'}, ['10:02']),
+])
+def test_gen_record_filters(filter_dic, expected):
+    assert sorted(filter_records(RECORD_LIST, **filter_dic)) == sorted(expected)
+
+
+def test_gen_record_filters_invalid_regex():
+    with pytest.raises(re.error):
+        common_db.gen_record_filters(keyword='host[', regex=True)
+
+
+@pytest.fixture
+def indexed_day_file(tmp_path):
+    """
+    Day file 20261017 with one record per minute 10:00 - 10:09, indexed by one writer and a late writer.
+    """
+    day_file = str(tmp_path / '20261017')
+    record_list = [{'time': '2026-10-17 10:0' + str(minute) + ':30', 'message': 'm' + str(minute)} for minute in range(10)]
+    offset_list = write_day_file(day_file, record_list)
+
+    for (minute, offset) in enumerate(offset_list):
+        common_db.append_day_file_index(day_file, '10:0' + str(minute), offset)
+
+    # The smallest offset of a bucket wins, broken lines are ignored.
+    common_db.append_day_file_index(day_file, '10:02', offset_list[5])
+
+    with open(common_db.get_index_file(day_file), 'a') as IF:
+        IF.write('10:04\nbroken line\n')
+
+    return day_file, offset_list
+
+
+def test_read_day_file_index(indexed_day_file):
+    (day_file, offset_list) = indexed_day_file
+    index_dic = common_db.read_day_file_index(day_file)
+
+    assert index_dic == {'10:0' + str(minute): offset for (minute, offset) in enumerate(offset_list)}
+    assert common_db.read_day_file_index(day_file + '.missing') == {}
+
+    os.remove(common_db.get_index_file(day_file))
+    assert common_db.build_day_file_index(day_file) == index_dic
+    assert common_db.read_day_file_index(day_file) == index_dic
+
+
+def test_get_index_range(indexed_day_file):
+    (day_file, offset_list) = indexed_day_file
+
+    # The end bucket is extended by INDEX_END_SLACK (5 minutes).
+    assert common_db.get_index_range(day_file, '2026-10-17 10:02:00', '2026-10-17 10:03:00') == (offset_list[2], offset_list[9])
+    assert common_db.get_index_range(day_file, '2026-10-17 10:02:00', '2026-10-17 10:04:00') == (offset_list[2], None)
+    assert common_db.get_index_range(day_file, '2026-10-16 00:00:00', '2026-10-17 10:01:00') == (0, offset_list[7])
+    assert common_db.get_index_range(day_file, '2026-10-17 11:00:00', '') == (os.path.getsize(day_file), None)
+    assert common_db.get_index_range(day_file, '2026-10-16 00:00:00', '2026-10-18 00:00:00') == (0, None)
+    assert common_db.get_index_range(day_file + '.missing', '2026-10-17 10:02:00', '2026-10-17 10:03:00') == (0, None)
+
+
+def test_iter_day_file_lines_with_index(indexed_day_file):
+    (day_file, offset_list) = indexed_day_file
+    offset_dic = {}
+
+    time_list = [time for (time, line) in common_db.iter_day_file_lines(day_file, '2026-10-17 10:02:00', '2026-10-17 10:03:59')]
+    assert time_list == ['2026-10-17 10:02:30', '2026-10-17 10:03:30']
+
+    time_list = [time for (time, line) in common_db.iter_day_file_lines(day_file, '2026-10-17 10:08:00', '', offset_dic=offset_dic)]
+    assert time_list == ['2026-10-17 10:08:30', '2026-10-17 10:09:30']
+    assert offset_dic == {day_file: os.path.getsize(day_file)}
+
+    # A stale index pointing into the middle of a line starts on the next line.
+    common_db.append_day_file_index(day_file, '10:03', offset_list[3] - 3)
+    time_list = [time for (time, line) in common_db.iter_day_file_lines(day_file, '2026-10-17 10:03:00', '2026-10-17 10:03:59')]
+    assert time_list == ['2026-10-17 10:03:30']
+
+
+def test_count_day_file_records(tmp_path):
+    day_file = str(tmp_path / '20261017')
+    write_day_file(day_file, RECORD_LIST)
+
+    with open(day_file, 'ab') as DF:
+        DF.write(b'\n  \n{"time": "2026-10-17 10:04:00", "mess')
+
+    assert common_db.count_day_file_records(day_file, '2026-10-16 00:00:00', '2026-10-18 00:00:00') == 4
+    assert common_db.count_day_file_records(day_file, '2026-10-17 10:01:00', '2026-10-17 10:02:00') == 2
+
+
+def set_mtime(day_file, mtime):
+    os.utime(day_file, ns=(mtime, mtime))
+
+
+def test_day_file_cache(tmp_path):
+    day_file_cache = common_db.DayFileCache(1024 * 1024)
+    day_file = str(tmp_path / '20261017')
+    write_day_file(day_file, RECORD_LIST[:2])
+    set_mtime(day_file, 10 ** 18)
+
+    assert day_file_cache.get(day_file, load=False) is None
+    assert day_file_cache.get(day_file)['time_list'] == ['2026-10-17 10:00:00', '2026-10-17 10:01:00']
+    assert day_file_cache.get(day_file)['record_list'][1] == RECORD_LIST[1]
+    assert day_file_cache.get_stats()['hit'] == 1
+
+    # Appended records are decoded on the cached ones, the line being written is left for later.
+    write_day_file(day_file, RECORD_LIST[2:], mode='a')
+
+    with open(day_file, 'ab') as DF:
+        DF.write(b'{"time": "2026-10-17 10:04:00", "mess')
+
+    set_mtime(day_file, 2 * 10 ** 18)
+    day_file_block = day_file_cache.get(day_file)
+    assert day_file_block['record_list'] == RECORD_LIST
+    assert day_file_block['source_size'] < day_file_block['size']
+    assert day_file_cache.get_stats()['extend'] == 1
+
+    # A smaller day file (rotated or truncated) is decoded again, not extended.
+    write_day_file(day_file, RECORD_LIST[3:])
+    set_mtime(day_file, 3 * 10 ** 18)
+    assert day_file_cache.get(day_file)['record_list'] == RECORD_LIST[3:]
+    assert day_file_cache.get_stats()['miss'] == 2
+
+    # A late record keeps the file order, the block is not sorted any more.
+    write_day_file(day_file, RECORD_LIST[:1], mode='a')
+    set_mtime(day_file, 4 * 10 ** 18)
+    day_file_block = day_file_cache.get(day_file)
+    assert (day_file_block['record_list'], day_file_block['sorted']) == (RECORD_LIST[3:] + RECORD_LIST[:1], False)
+    assert day_file_cache.get_stats()['extend'] == 2
+
+    os.remove(day_file)
+    assert day_file_cache.get(day_file) is None
+
+    day_file_cache.set_max_size(0)
+    assert day_file_cache.get_stats()['day_file_num'] == 0
+    write_day_file(day_file, RECORD_LIST)
+    assert day_file_cache.get(day_file) is None
+
+
+def test_day_file_cache_compacted(tmp_path):
+    pytest.importorskip('pandas')
+    day_file_cache = common_db.DayFileCache(1024 * 1024)
+    day_file = str(tmp_path / '20261017')
+    write_day_file(day_file, RECORD_LIST)
+    day_file_cache.get(day_file)
+
+    # The json day file is removed after compaction, the records are decoded from <YYYYMMDD>.npz.
+    common_db.compact_day_file(day_file)
+    os.remove(day_file)
+    day_file_block = day_file_cache.get(day_file)
+    assert (day_file_block['source_file'], day_file_block['record_list']) == (common_db.get_compact_file(day_file), RECORD_LIST)
+    assert day_file_cache.get_stats()['miss'] == 2
+
+    os.remove(common_db.get_compact_file(day_file))
+    assert day_file_cache.get(day_file) is None
+
+
+def test_day_file_cache_eviction(tmp_path):
+    day_file_list = [str(tmp_path / ('2026101' + str(day))) for day in range(3)]
+
+    for day_file in day_file_list:
+        write_day_file(day_file, RECORD_LIST)
+
+    day_file_cache = common_db.DayFileCache(2 * os.path.getsize(day_file_list[0]))
+
+    for day_file in day_file_list + day_file_list[2:]:
+        day_file_cache.get(day_file)
+
+    stats_dic = day_file_cache.get_stats()
+    assert (stats_dic['day_file_num'], stats_dic['eviction'], stats_dic['hit'], stats_dic['miss']) == (2, 1, 1, 3)
+    assert day_file_cache.get(day_file_list[0], load=False) is None
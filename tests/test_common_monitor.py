@@ -0,0 +1,85 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+import os
+import datetime
+
+import pytest
+
+from common import common_monitor
+
+PAYLOAD_LIST = ['x $(id) `id`', "it's \"quoted\" \\ $HOME", '<RECEIVERS> ; touch pwned']
+
+
+def run_alarm_command(send_alarm_command, alarm_title, message, alarm_receivers):
+    (command, env_dic) = common_monitor.gen_send_alarm_command(send_alarm_command, alarm_title, message, alarm_receivers)
+    (return_code, stdout, stderr) = common_monitor.run_command(command, env={**os.environ, **env_dic})
+    assert return_code == 0, stderr
+    return str(stdout, 'utf-8')
+
+
+@pytest.mark.parametrize('payload', PAYLOAD_LIST)
+def test_send_alarm_command_in_double_quotes(payload):
+    stdout = run_alarm_command('printf "%s|" "Alarm <TITLE>: <MESSAGE>" <RECEIVERS>', 't', payload, 'a,b')
+    assert stdout == 'Alarm t: ' + payload + '|a,b|'
+
+
+@pytest.mark.parametrize('payload', PAYLOAD_LIST)
+def test_send_alarm_command_unquoted(payload):
+    stdout = run_alarm_command('printf "%s|" <TITLE> <MESSAGE> <RECEIVERS>', payload, payload, payload)
+    assert stdout == (payload + '|') * 3
+
+
+@pytest.mark.parametrize('payload', PAYLOAD_LIST)
+def test_send_alarm_command_in_single_quotes(payload):
+    stdout = run_alarm_command("printf '%s|' 'Alarm <TITLE>: <MESSAGE>' '<RECEIVERS>'", 't', payload, 'a b')
+    assert stdout == 'Alarm t: ' + payload + '|a b|'
+
+
+def test_send_alarm_command_keeps_template():
+    (command, env_dic) = common_monitor.gen_send_alarm_command('echo \\"<TITLE> "a\\"<MESSAGE>"', 't', 'm', 'r')
+    assert command == 'echo \\""${MONITOR_VIEWER_ALARM_TITLE}" "a\\"${MONITOR_VIEWER_ALARM_MESSAGE}"'
+    assert env_dic == {'MONITOR_VIEWER_ALARM_TITLE': 't', 'MONITOR_VIEWER_ALARM_MESSAGE': 'm', 'MONITOR_VIEWER_ALARM_RECEIVERS': 'r'}
+
+
+@pytest.mark.parametrize('alarm_frequency, expected', [
+    ('max 3 times', ('day', 3)),
+    ('max 2 per hour', ('hour', 2)),
+    ('at most once per 30 minutes', ('interval', 1800)),
+    ('', None),
+    ('whenever', None),
+])
+def test_parse_alarm_frequency(alarm_frequency, expected):
+    assert common_monitor.parse_alarm_frequency(alarm_frequency) == expected
+
+
+@pytest.mark.parametrize('script_execute_frequency, expected', [
+    ('every 5 minutes', 300),
+    ('hourly', 3600),
+    ('twice a day', 43200),
+    ('每5分钟', 300),
+    ('*/10 * * * *', 600),
+    ('0 */6 * * *', 21600),
+    ('0 3 * * *', 86400),
+    ('0 3 1 * *', 31 * 86400),
+    ('0 3 * * 1', 7 * 86400),
+    ('', None),
+    ('sometimes', None),
+])
+def test_parse_execute_frequency(script_execute_frequency, expected):
+    assert common_monitor.parse_execute_frequency(script_execute_frequency) == expected
+
+
+@pytest.mark.parametrize('crontab_expression, expected', [
+    ('*/10 * * * *', datetime.datetime(2026, 10, 17, 10, 10)),
+    ('7 10 * * *', datetime.datetime(2026, 10, 18, 10, 7)),
+    ('0 3 1 * *', datetime.datetime(2026, 11, 1, 3, 0)),
+    ('30 9 * * 1', datetime.datetime(2026, 10, 19, 9, 30)),
+    # Day or weekday when both are restricted, 2026-10-23 is a Friday.
+    ('0 0 13 * 5', datetime.datetime(2026, 10, 23, 0, 0)),
+    ('0 0 30 2 *', None),
+    ('61 * * * *', None),
+    ('* * *', None),
+])
+def test_get_next_crontab_time(crontab_expression, expected):
+    # 2026-10-17 is a Saturday.
+    assert common_monitor.get_next_crontab_time(crontab_expression, datetime.datetime(2026, 10, 17, 10, 7, 30)) == expected
@@ -0,0 +1,82 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtCore import Qt, QPersistentModelIndex  # noqa: E402
+from common import common_pyqt5  # noqa: E402
+
+RECORD_LIST = [
+    {'time': '10:01', 'level': 'Error', 'message': 'b line1\nb line2\nb line3'},
+    {'time': '10:00', 'level': 'Info', 'message': 'a line1'},
+    {'time': '10:02', 'level': 'Warning', 'message': '\nc line1\nc line2\n'},
+]
+
+
+@pytest.fixture
+def model():
+    model = common_pyqt5.RecordTableModel(['Time', 'Level', 'Message'], ['time', 'level', 'message'], multi_line_field='message')
+    model.set_records(RECORD_LIST)
+    return model
+
+
+def get_row_list(model):
+    return [tuple(model.data(model.index(row, column)) for column in range(model.columnCount())) for row in range(model.rowCount())]
+
+
+def test_record_table_model_multi_line(model):
+    assert (model.get_record_num(), model.get_row_num(), model.rowCount()) == (3, 6, 6)
+    assert list(model.record_row_list) == [0, 3, 4]
+    assert get_row_list(model) == [
+        ('10:01', 'Error', 'b line1'), ('', '', 'b line2'), ('', '', 'b line3'),
+        ('10:00', 'Info', 'a line1'),
+        ('10:02', 'Warning', 'c line1'), ('', '', 'c line2'),
+    ]
+
+
+def test_record_table_model_sort(model):
+    model.sort(0, Qt.AscendingOrder)
+    assert list(model.record_row_list) == [0, 1, 4]
+    assert get_row_list(model) == [
+        ('10:00', 'Info', 'a line1'),
+        ('10:01', 'Error', 'b line1'), ('', '', 'b line2'), ('', '', 'b line3'),
+        ('10:02', 'Warning', 'c line1'), ('', '', 'c line2'),
+    ]
+
+    model.sort(1, Qt.DescendingOrder)
+    assert list(model.record_row_list) == [0, 2, 3]
+    assert get_row_list(model) == [
+        ('10:02', 'Warning', 'c line1'), ('', '', 'c line2'),
+        ('10:00', 'Info', 'a line1'),
+        ('10:01', 'Error', 'b line1'), ('', '', 'b line2'), ('', '', 'b line3'),
+    ]
+
+
+def test_record_table_model_sort_keeps_selection(model):
+    index = QPersistentModelIndex(model.index(2, 2))
+    assert index.data() == 'b line3'
+
+    model.sort(0, Qt.DescendingOrder)
+    assert (index.row(), index.data()) == (4, 'b line3')
+
+    model.sort(0, Qt.AscendingOrder)
+    assert (index.row(), index.data()) == (3, 'b line3')
+
+
+def test_record_table_model_sort_unfetched(model):
+    model.FETCH_SIZE = 2
+    model.set_records(RECORD_LIST * 2)
+    assert (model.rowCount(), model.get_row_num()) == (2, 12)
+
+    # All records are sorted, not only the fetched rows.
+    model.sort(0, Qt.AscendingOrder)
+    assert model.data(model.index(0, 0)) == '10:00'
+
+    while model.canFetchMore():
+        model.fetchMore()
+
+    assert [row[0] for row in get_row_list(model) if row[0]] == ['10:00', '10:00', '10:01', '10:01', '10:02', '10:02']
@@ -0,0 +1,85 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+import os
+import sys
+import json
+import importlib
+
+import pytest
+
+BEGIN_DATETIME = '2026-10-16 00:00:00'
+END_DATETIME = '2026-10-17 23:59:59'
+# {(monitor_item, date): [(time, message), ...]}
+DAY_FILE_DIC = {
+    ('item_a', '20261016'): [('2026-10-16 08:00:00', 'a0'), ('2026-10-16 09:00:00', 'a1'), ('2026-10-16 23:00:00', 'a2')],
+    ('item_a', '20261017'): [('2026-10-17 10:00:00', 'a3'), ('2026-10-17 10:02:00', 'a4')],
+    ('item_b', '20261017'): [('2026-10-17 10:01:00', 'b0'), ('2026-10-17 10:03:00', 'b1')],
+}
+MESSAGE_LIST = ['a0', 'a1', 'a2', 'a3', 'b0', 'a4', 'b1']
+
+
+@pytest.fixture(scope='module')
+def monitor_service(tmp_path_factory):
+    """
+    MonitorService on a temporary config/config.py and db_path, day files with blank lines and a line being written.
+    """
+    tmp_install_path = tmp_path_factory.mktemp('install')
+    db_path = tmp_install_path / 'db'
+
+    for ((monitor_item, date), record_list) in DAY_FILE_DIC.items():
+        log_dir = db_path / 'default' / monitor_item / 'log'
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+        with open(log_dir / date, 'wb') as DF:
+            for (time, message) in record_list:
+                DF.write(json.dumps({'time': time, 'message_level': 'Info', 'message': message}).encode() + b'\n\n')
+
+            DF.write(b'{"time": "' + date.encode() + b'", "mess')
+
+    (tmp_install_path / 'config').mkdir()
+    (tmp_install_path / 'config' / 'config.py').write_text('valid_direction_dic = {"default": "tester"}\ndb_path = "' + str(db_path) + '"\n')
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.syspath_prepend(str(tmp_install_path))
+        monkeypatch.syspath_prepend(os.path.join(os.environ['MONITOR_VIEWER_INSTALL_PATH'], 'web'))
+
+        for module in ['config', 'config.config']:
+            monkeypatch.delitem(sys.modules, module, raising=False)
+
+        service_module = importlib.import_module('service.monitor_service')
+
+        yield service_module.MonitorService()
+
+
+def get_message_list(page_data):
+    return [record['message'] for record in page_data]
+
+
+@pytest.mark.parametrize('start, length, order_direction, expected', [
+    (0, -1, 'asc', MESSAGE_LIST),
+    (0, -1, 'desc', MESSAGE_LIST[::-1]),
+    (2, 3, 'asc', MESSAGE_LIST[2:5]),
+    (2, 3, 'desc', MESSAGE_LIST[::-1][2:5]),
+    (5, 10, 'asc', MESSAGE_LIST[5:]),
+    (10, 10, 'asc', []),
+])
+def test_get_table_page(monitor_service, start, length, order_direction, expected):
+    (records_total, records_filtered, page_data) = monitor_service.get_table_page('log', BEGIN_DATETIME, END_DATETIME, start, length, order_column='time', order_direction=order_direction)
+
+    assert (records_total, records_filtered) == (7, 7)
+    assert get_message_list(page_data) == expected
+    assert {record['monitor_item'] for record in page_data} <= {'item_a', 'item_b'}
+
+
+def test_get_table_page_in_range(monitor_service):
+    (records_total, records_filtered, page_data) = monitor_service.get_table_page('log', '2026-10-16 09:00:00', '2026-10-17 10:01:00', 1, 2)
+
+    assert (records_total, get_message_list(page_data)) == (4, ['a2', 'a3'])
+
+
+def test_get_sorted_table_page(monitor_service):
+    (records_total, records_filtered, page_data) = monitor_service.get_table_page('log', BEGIN_DATETIME, END_DATETIME, 1, 2, order_column='message', order_direction='desc')
+    assert (records_total, records_filtered, get_message_list(page_data)) == (7, 7, ['b0', 'a4'])
+
+    (records_total, records_filtered, page_data) = monitor_service.get_table_page('log', BEGIN_DATETIME, END_DATETIME, 0, 10, search_value='b', column_search_dic={'monitor_item': 'item_b'})
+    assert (records_total, records_filtered, get_message_list(page_data)) == (7, 2, ['b0', 'b1'])
@@ -0,0 +1,120 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import logging
+import argparse
+import datetime
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']))
+from common import common_monitor
+from common import common_db
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/web')
+from service.monitor_service import MonitorService
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    current_time = datetime.datetime.now()
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-b', '--begin_datetime',
+                        default=(current_time - datetime.timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S'),
+                        help='Specify begin datetime, default is 7 days ago.')
+    parser.add_argument('-e', '--end_datetime',
+                        default=current_time.strftime('%Y-%m-%d %H:%M:%S'),
+                        help='Specify end datetime, default is now.')
+    parser.add_argument('-k', '--kind',
+                        default='log',
+                        choices=['log', 'alarm', 'heartbeat'],
+                        help='Specify which get_all_<kind>_table_data to benchmark, default is "log".')
+    parser.add_argument('-w', '--worker_num',
+                        nargs='+',
+                        type=int,
+                        default=[1, 2, 4, 8, 16],
+                        help='Specify worker numbers to benchmark, default is "1 2 4 8 16".')
+    parser.add_argument('-n', '--item_num',
+                        nargs='+',
+                        type=int,
+                        default=[],
+                        help='Specify monitor item numbers to benchmark, default is all monitor items.')
+    parser.add_argument('-x', '--executor',
+                        nargs='+',
+                        default=['thread', 'process'],
+                        choices=['thread', 'process'],
+                        help='Specify executors to benchmark, default is "thread process".')
+    parser.add_argument('-r', '--repeat',
+                        type=int,
+                        default=3,
+                        help='Specify repeat times, the best one is reported, default is 3.')
+    parser.add_argument('-c', '--cache',
+                        action='store_true',
+                        default=False,
+                        help='Keep the decoded day file cache on, the repeated runs are cache hits then, by default every run decodes the day files.')
+
+    args = parser.parse_args()
+
+    return args.begin_datetime, args.end_datetime, args.kind, args.worker_num, args.item_num, args.executor, args.repeat, args.cache
+
+
+def benchmark_scan(begin_datetime, end_datetime, kind, worker_num_list, item_num_list, executor_list, repeat, cache):
+    """
+    Time MonitorService.scan_monitor_items for every item number x executor x worker number.
+    """
+    logging.disable(logging.CRITICAL)
+
+    # Set before the scan worker processes are started, they take the cache size of this process.
+    if not cache:
+        common_db.DAY_FILE_CACHE.set_max_size(0)
+
+    monitor_service = MonitorService()
+    scan_function = getattr(monitor_service, 'get_' + str(kind) + '_table_data')
+    monitor_item_pair_list = monitor_service.get_monitor_item_pair_list()
+
+    if not monitor_item_pair_list:
+        common_monitor.bprint('No monitor item is found.', level='Error')
+        sys.exit(1)
+
+    if not item_num_list:
+        item_num_list = [len(monitor_item_pair_list)]
+
+    print('%-10s %-10s %-10s %-10s %-12s %-10s' % ('ITEM_NUM', 'EXECUTOR', 'WORKER', 'RECORDS', 'SECONDS', 'SPEEDUP'))
+
+    for item_num in item_num_list:
+        item_pair_list = monitor_item_pair_list[:item_num]
+        base_cost = None
+
+        for executor_type in executor_list:
+            for worker_num in worker_num_list:
+                cost_list = []
+
+                for i in range(repeat):
+                    start_time = time.time()
+                    record_list = monitor_service.scan_monitor_items(scan_function, begin_datetime, end_datetime, item_pair_list, worker_num, executor_type)
+                    cost_list.append(time.time() - start_time)
+
+                cost = min(cost_list)
+
+                if base_cost is None:
+                    base_cost = cost
+
+                print('%-10s %-10s %-10s %-10s %-12.4f %-10.2f' % (len(item_pair_list), executor_type, worker_num, len(record_list), cost, base_cost / cost if cost else 0))
+
+
+################
+# Main Process #
+################
+def main():
+    (begin_datetime, end_datetime, kind, worker_num_list, item_num_list, executor_list, repeat, cache) = read_args()
+    benchmark_scan(begin_datetime, end_datetime, kind, worker_num_list, item_num_list, executor_list, repeat, cache)
+
+
+if __name__ == '__main__':
+    main()
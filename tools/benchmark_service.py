@@ -0,0 +1,313 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import math
+import time
+import socket
+import logging
+import argparse
+import datetime
+import resource
+import platform
+import subprocess
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']))
+from common import common_monitor
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/web')
+from service import monitor_service
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+# Written by tools/gen_synthetic_db on the synthetic db_path.
+SYNTHETIC_INFO_FILE = '.synthetic_db.json'
+
+# {case: (method, args)}, args are formatted with begin_datetime/end_datetime/direction/monitor_item.
+SERVICE_CASE_DIC = {
+    'service.get_monitor_item_pair_list': ('get_monitor_item_pair_list', []),
+    'service.get_monitor_table_data': ('get_monitor_table_data', []),
+    'service.get_logs_trend_data': ('get_logs_trend_data', ['{begin_datetime}', '{end_datetime}']),
+    'service.get_heartbeat_trend_data': ('get_heartbeat_trend_data', ['{begin_datetime}', '{end_datetime}']),
+    'service.get_top_alarms_per_monitor_item': ('get_top_alarms_per_monitor_item', ['{begin_datetime}', '{end_datetime}']),
+    'service.get_alarm_chart_data': ('get_alarm_chart_data', ['{begin_datetime}', '{end_datetime}', 'auto']),
+    'service.get_error_log_count': ('get_error_log_count', ['{begin_datetime}', '{end_datetime}']),
+    'service.iter_overview_data': ('iter_overview_data', ['{begin_datetime}', '{end_datetime}']),
+    'service.get_log_table_data': ('get_log_table_data', ['{begin_datetime}', '{end_datetime}', '{direction}', '{monitor_item}']),
+    'service.get_all_log_table_data': ('get_all_log_table_data', ['{begin_datetime}', '{end_datetime}']),
+    'service.get_table_page(log)': ('get_table_page', ['log', '{begin_datetime}', '{end_datetime}', 0, 10]),
+    'service.get_table_page(log,last)': ('get_table_page', ['log', '{begin_datetime}', '{end_datetime}', 0, 10, '', None, 'time', 'desc']),
+    'service.get_table_page(log,search)': ('get_table_page', ['log', '{begin_datetime}', '{end_datetime}', 0, 10, 'unreachable']),
+    'service.get_table_page(log,order)': ('get_table_page', ['log', '{begin_datetime}', '{end_datetime}', 0, 10, '', None, 'message_level', 'asc']),
+    'service.get_table_page(alarm)': ('get_table_page', ['alarm', '{begin_datetime}', '{end_datetime}', 0, 10]),
+    'service.get_table_page(heartbeat)': ('get_table_page', ['heartbeat', '{begin_datetime}', '{end_datetime}', 0, 10]),
+}
+
+# {case: (url, query_dic)}, /ingest is not benchmarked, it writes db_path.
+ENDPOINT_CASE_DIC = {
+    'endpoint./': ('/', {'begin_datetime': '{begin_datetime}', 'end_datetime': '{end_datetime}'}),
+    'endpoint./overview_data': ('/overview_data', {'begin_datetime': '{begin_datetime}', 'end_datetime': '{end_datetime}'}),
+    'endpoint./monitor_table_data': ('/monitor_table_data', {'draw': '1', 'start': '0', 'length': '10'}),
+    'endpoint./log_table_data': ('/log_table_data', {'draw': '1', 'start': '0', 'length': '10', 'begin_datetime': '{begin_datetime}', 'end_datetime': '{end_datetime}'}),
+    'endpoint./log_table_data(search)': ('/log_table_data', {'draw': '1', 'start': '0', 'length': '10', 'search[value]': 'unreachable', 'begin_datetime': '{begin_datetime}', 'end_datetime': '{end_datetime}'}),
+    'endpoint./alarm_table_data': ('/alarm_table_data', {'draw': '1', 'start': '0', 'length': '10', 'begin_datetime': '{begin_datetime}', 'end_datetime': '{end_datetime}'}),
+    'endpoint./heartbeat_table_data': ('/heartbeat_table_data', {'draw': '1', 'start': '0', 'length': '10', 'begin_datetime': '{begin_datetime}', 'end_datetime': '{end_datetime}'}),
+    'endpoint./cache_stats': ('/cache_stats', {}),
+}
+
+CASE_LIST = list(SERVICE_CASE_DIC.keys()) + list(ENDPOINT_CASE_DIC.keys())
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-p', '--db_path',
+                        default=monitor_service.config.db_path,
+                        help='Specify db_path to benchmark, suggest a db_path generated by tools/gen_synthetic_db, default is "db_path" on config/config.py.')
+    parser.add_argument('-b', '--begin_datetime',
+                        default='',
+                        help='Specify begin datetime, default is the first day of the synthetic db_path, or 7 days ago.')
+    parser.add_argument('-e', '--end_datetime',
+                        default='',
+                        help='Specify end datetime, default is the last day of the synthetic db_path, or now.')
+    parser.add_argument('-c', '--case',
+                        nargs='+',
+                        default=CASE_LIST,
+                        choices=CASE_LIST,
+                        metavar='CASE',
+                        help='Specify cases to benchmark, default is all cases: ' + str(' '.join(CASE_LIST)))
+    parser.add_argument('-n', '--repeat',
+                        type=int,
+                        default=10,
+                        help='Specify how many times every case runs, the first (cold) run is reported alone, p50/p95 are of the others, default is 10.')
+    parser.add_argument('--no_cache',
+                        action='store_true',
+                        default=False,
+                        help='Disable the decoded day file cache, like day_file_cache_size = 0 on config/config.py.')
+    parser.add_argument('-s', '--save',
+                        default='',
+                        help='Save the result into a json baseline file.')
+    parser.add_argument('-C', '--compare',
+                        default='',
+                        help='Compare the result with a json baseline file, exit 1 if any p50 is slower than --threshold.')
+    parser.add_argument('-t', '--threshold',
+                        type=float,
+                        default=20,
+                        help='Specify the p50 regression threshold (percent) of --compare, default is 20.')
+    # Internal, run one case in this process and print the result as json.
+    parser.add_argument('--run_case',
+                        default='',
+                        help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.db_path):
+        common_monitor.bprint('"' + str(args.db_path) + '": No such database path.', level='Error')
+        sys.exit(1)
+
+    if args.repeat < 1:
+        common_monitor.bprint('"repeat" must be at least 1.', level='Error')
+        sys.exit(1)
+
+    if args.compare and (not os.path.isfile(args.compare)):
+        common_monitor.bprint('"' + str(args.compare) + '": No such baseline file.', level='Error')
+        sys.exit(1)
+
+    return os.path.abspath(args.db_path), args.begin_datetime, args.end_datetime, args.case, args.repeat, args.no_cache, args.save, args.compare, args.threshold, args.run_case
+
+
+def get_db_info(db_path, begin_datetime, end_datetime):
+    """
+    Get (synthetic_info_dic, valid_direction_dic, begin_datetime, end_datetime) of db_path, synthetic_info_dic is {} if db_path is not synthetic.
+    """
+    synthetic_info_dic = {}
+    synthetic_info_file = str(db_path) + '/' + str(SYNTHETIC_INFO_FILE)
+
+    if os.path.isfile(synthetic_info_file):
+        with open(synthetic_info_file, 'r') as SIF:
+            synthetic_info_dic = json.load(SIF)
+
+    current_time = datetime.datetime.now()
+    valid_direction_dic = synthetic_info_dic.get('valid_direction_dic', monitor_service.config.valid_direction_dic)
+    begin_datetime = begin_datetime or synthetic_info_dic.get('begin_datetime', (current_time - datetime.timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S'))
+    end_datetime = end_datetime or synthetic_info_dic.get('end_datetime', current_time.strftime('%Y-%m-%d %H:%M:%S'))
+
+    return synthetic_info_dic, valid_direction_dic, begin_datetime, end_datetime
+
+
+def get_percentile(value_list, percent):
+    """
+    Get the nearest-rank percentile of value_list.
+    """
+    value_list = sorted(value_list)
+
+    return value_list[max(0, math.ceil(len(value_list) * percent / 100) - 1)]
+
+
+def get_peak_rss():
+    """
+    Get peak RSS (MB) of this process, ru_maxrss is KB on Linux and bytes on macOS.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return max_rss / (1024 * 1024) if platform.system() == 'Darwin' else max_rss / 1024
+
+
+def format_arg(arg, format_dic):
+    return arg.format(**format_dic) if isinstance(arg, str) else arg
+
+
+def run_case(case, db_path, begin_datetime, end_datetime, repeat, no_cache):
+    """
+    Run case repeat times in this process, print {"cost_list": [seconds], "setup_rss": MB, "peak_rss": MB} as json.
+    """
+    (synthetic_info_dic, valid_direction_dic, begin_datetime, end_datetime) = get_db_info(db_path, begin_datetime, end_datetime)
+
+    # MonitorService reads db_path and valid_direction_dic from config.py on every call.
+    monitor_service.config.db_path = db_path
+    monitor_service.config.valid_direction_dic = valid_direction_dic
+    logging.disable(logging.CRITICAL)
+
+    if no_cache:
+        monitor_service.common_db.DAY_FILE_CACHE.set_max_size(0)
+
+    service = monitor_service.MonitorService()
+    monitor_item_pair_list = service.get_monitor_item_pair_list()
+
+    if not monitor_item_pair_list:
+        common_monitor.bprint('No monitor item is found on "' + str(db_path) + '".', level='Error')
+        sys.exit(1)
+
+    format_dic = {'begin_datetime': begin_datetime, 'end_datetime': end_datetime, 'direction': monitor_item_pair_list[0][0], 'monitor_item': monitor_item_pair_list[0][1]}
+
+    if case in SERVICE_CASE_DIC:
+        (method, arg_list) = SERVICE_CASE_DIC[case]
+        function = getattr(service, method)
+        arg_list = [format_arg(arg, format_dic) for arg in arg_list]
+
+        def run():
+            result = function(*arg_list)
+
+            # Generators (iter_overview_data) are consumed.
+            if hasattr(result, '__next__'):
+                for item in result:
+                    pass
+    else:
+        import app
+        client = app.app.test_client()
+        (url, query_dic) = ENDPOINT_CASE_DIC[case]
+        query_dic = {key: format_arg(value, format_dic) for (key, value) in query_dic.items()}
+
+        def run():
+            response = client.get(url, query_string=query_dic)
+            # Streamed responses are read to the end.
+            response.get_data()
+
+            if response.status_code != 200:
+                raise RuntimeError('"' + str(url) + '" returns ' + str(response.status_code) + '.')
+
+    setup_rss = get_peak_rss()
+    cost_list = []
+
+    for i in range(repeat):
+        start_time = time.perf_counter()
+        run()
+        cost_list.append(time.perf_counter() - start_time)
+
+    print(json.dumps({'cost_list': cost_list, 'setup_rss': setup_rss, 'peak_rss': get_peak_rss()}))
+
+
+def benchmark_service(db_path, begin_datetime, end_datetime, case_list, repeat, no_cache, save_file, compare_file, threshold):
+    """
+    Benchmark every case in a fresh process, so the cold run and the peak RSS are of the case only.
+    """
+    (synthetic_info_dic, valid_direction_dic, begin_datetime, end_datetime) = get_db_info(db_path, begin_datetime, end_datetime)
+    baseline_dic = {}
+    regression_list = []
+
+    if compare_file:
+        with open(compare_file, 'r') as BF:
+            baseline_dic = json.load(BF)
+
+        if baseline_dic.get('synthetic_info', {}).get('argument') != synthetic_info_dic.get('argument'):
+            common_monitor.bprint('"' + str(compare_file) + '" is benchmarked on a different db_path, the comparison may be meaningless.', level='Warning')
+
+    result_dic = {
+        'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'host': socket.gethostname(),
+        'python': platform.python_version(),
+        'db_path': db_path,
+        'synthetic_info': synthetic_info_dic,
+        'begin_datetime': begin_datetime,
+        'end_datetime': end_datetime,
+        'repeat': repeat,
+        'no_cache': no_cache,
+        'case_dic': {},
+    }
+
+    print('Benchmark "' + str(db_path) + '" from "' + str(begin_datetime) + '" to "' + str(end_datetime) + '", ' + str(repeat) + ' runs per case.')
+    print('%-44s %-10s %-10s %-10s %-10s %-10s %-10s' % ('CASE', 'FIRST(ms)', 'P50(ms)', 'P95(ms)', 'RSS(MB)', '+RSS(MB)', 'P50_DIFF'))
+
+    for case in case_list:
+        command = [sys.executable, os.path.abspath(__file__), '--run_case', case, '-p', db_path, '-b', begin_datetime, '-e', end_datetime, '-n', str(repeat)]
+
+        if no_cache:
+            command.append('--no_cache')
+
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+
+        if process.returncode != 0:
+            common_monitor.bprint('Failed on case "' + str(case) + '": ' + str(process.stderr.strip().splitlines()[-1:]), level='Warning')
+            continue
+
+        case_dic = json.loads(process.stdout.strip().splitlines()[-1])
+        warm_cost_list = case_dic['cost_list'][1:] or case_dic['cost_list']
+        case_result_dic = {
+            'first': round(case_dic['cost_list'][0] * 1000, 3),
+            'p50': round(get_percentile(warm_cost_list, 50) * 1000, 3),
+            'p95': round(get_percentile(warm_cost_list, 95) * 1000, 3),
+            'peak_rss': round(case_dic['peak_rss'], 1),
+            'case_rss': round(case_dic['peak_rss'] - case_dic['setup_rss'], 1),
+        }
+        result_dic['case_dic'][case] = case_result_dic
+        p50_diff = ''
+        base_case_dic = baseline_dic.get('case_dic', {}).get(case)
+
+        if base_case_dic and base_case_dic['p50']:
+            p50_change = (case_result_dic['p50'] - base_case_dic['p50']) * 100 / base_case_dic['p50']
+            p50_diff = '%+.1f%%' % p50_change
+
+            if p50_change > threshold:
+                regression_list.append(case)
+
+        print('%-44s %-10.1f %-10.1f %-10.1f %-10.1f %-10.1f %-10s' % (case, case_result_dic['first'], case_result_dic['p50'], case_result_dic['p95'], case_result_dic['peak_rss'], case_result_dic['case_rss'], p50_diff))
+
+    if save_file:
+        with open(save_file, 'w') as SF:
+            SF.write(json.dumps(result_dic, indent=4))
+
+        common_monitor.bprint('Baseline is saved into "' + str(save_file) + '".', level='Info')
+
+    if regression_list:
+        common_monitor.bprint('p50 of ' + str(len(regression_list)) + ' cases is over ' + str(threshold) + '% slower than "' + str(compare_file) + '": ' + str(' '.join(regression_list)), level='Error')
+        sys.exit(1)
+
+
+################
+# Main Process #
+################
+def main():
+    (db_path, begin_datetime, end_datetime, case_list, repeat, no_cache, save_file, compare_file, threshold, run_case_name) = read_args()
+
+    if run_case_name:
+        run_case(run_case_name, db_path, begin_datetime, end_datetime, repeat, no_cache)
+    else:
+        benchmark_service(db_path, begin_datetime, end_datetime, case_list, repeat, no_cache, save_file, compare_file, threshold)
+
+
+if __name__ == '__main__':
+    main()
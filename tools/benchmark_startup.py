@@ -0,0 +1,137 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+import common_monitor
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+# Modules which must not be imported by "import common_monitor", they cost hundreds of milliseconds.
+HEAVY_MODULE_LIST = ['pandas', 'numpy']
+
+# Executed in a fresh python process for every run, the db_path is replaced with a temporary one so the real database is untouched.
+STARTUP_CODE = '''
+import os
+import sys
+import json
+import time
+
+start_time = time.perf_counter()
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+import common_monitor
+import_time = time.perf_counter() - start_time
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/config')
+import config
+config.db_path = sys.argv[1]
+direction = list(config.valid_direction_dic.keys())[0]
+
+start_time = time.perf_counter()
+common_monitor.SaveLog(direction=direction, monitor_item='benchmark_startup', script_path=sys.argv[2], script_auther='benchmark', script_startup_method='benchmark', script_execute_frequency='benchmark', alarm_receivers='benchmark')
+init_time = time.perf_counter() - start_time
+
+print(json.dumps({'import_time': import_time, 'init_time': init_time, 'heavy_module_list': [module for module in sys.argv[3:] if module in sys.modules]}))
+'''
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-n', '--repeat',
+                        type=int,
+                        default=10,
+                        help='Specify how many fresh processes to start, the median is reported, default is 10.')
+    parser.add_argument('--max_import_time',
+                        type=float,
+                        default=0,
+                        help='Fail if the median "import common_monitor" time (ms) is over it, default is 0 (no limit).')
+    parser.add_argument('--max_init_time',
+                        type=float,
+                        default=0,
+                        help='Fail if the median "SaveLog(...)" time (ms) is over it, default is 0 (no limit).')
+
+    args = parser.parse_args()
+
+    return args.repeat, args.max_import_time, args.max_init_time
+
+
+def get_median(value_list):
+    value_list = sorted(value_list)
+
+    return value_list[len(value_list) // 2]
+
+
+def benchmark_startup(repeat, max_import_time, max_init_time):
+    """
+    Time "import common_monitor" and "SaveLog(...)" of a monitor script in fresh processes, exit 1 if it is slower than the limits, or imports heavy modules.
+    """
+    db_path = tempfile.mkdtemp(prefix='monitorViewer_benchmark_')
+    import_time_list = []
+    init_time_list = []
+    heavy_module_list = []
+
+    try:
+        # The first run creates the monitor item, like the first cron run of a new script, it is not counted.
+        for i in range(repeat + 1):
+            SP = subprocess.run([sys.executable, '-c', STARTUP_CODE, db_path, os.path.abspath(__file__)] + HEAVY_MODULE_LIST, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+            if SP.returncode != 0:
+                common_monitor.bprint('Failed on starting up SaveLog, ' + str(SP.stderr, 'utf-8').strip(), level='Error')
+                sys.exit(1)
+
+            if i == 0:
+                continue
+
+            result_dic = json.loads(str(SP.stdout, 'utf-8').strip().splitlines()[-1])
+            import_time_list.append(result_dic['import_time'] * 1000)
+            init_time_list.append(result_dic['init_time'] * 1000)
+            heavy_module_list = result_dic['heavy_module_list']
+    finally:
+        shutil.rmtree(db_path, ignore_errors=True)
+
+    import_time = get_median(import_time_list)
+    init_time = get_median(init_time_list)
+
+    print('%-14s %-10s %-10s %-10s' % ('STEP', 'MEDIAN_MS', 'MIN_MS', 'MAX_MS'))
+    print('%-14s %-10.2f %-10.2f %-10.2f' % ('import', import_time, min(import_time_list), max(import_time_list)))
+    print('%-14s %-10.2f %-10.2f %-10.2f' % ('init', init_time, min(init_time_list), max(init_time_list)))
+
+    failed = False
+
+    if heavy_module_list:
+        common_monitor.bprint('"import common_monitor" imports heavy modules: ' + str(' '.join(heavy_module_list)), level='Error')
+        failed = True
+
+    if max_import_time and (import_time > max_import_time):
+        common_monitor.bprint('Import time ' + str(round(import_time, 2)) + 'ms is over the limit ' + str(max_import_time) + 'ms.', level='Error')
+        failed = True
+
+    if max_init_time and (init_time > max_init_time):
+        common_monitor.bprint('Init time ' + str(round(init_time, 2)) + 'ms is over the limit ' + str(max_init_time) + 'ms.', level='Error')
+        failed = True
+
+    if failed:
+        sys.exit(1)
+
+
+################
+# Main Process #
+################
+def main():
+    (repeat, max_import_time, max_init_time) = read_args()
+    benchmark_startup(repeat, max_import_time, max_init_time)
+
+
+if __name__ == '__main__':
+    main()
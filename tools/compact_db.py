@@ -0,0 +1,120 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import argparse
+import datetime
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+import common_monitor
+import common_db
+sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/config')
+import config
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-d', '--direction',
+                        nargs='+',
+                        default=[],
+                        help='Specify directions to compact, default is all valid directions.')
+    parser.add_argument('-i', '--monitor_item',
+                        nargs='+',
+                        default=[],
+                        help='Specify monitor items to compact, default is all monitor items.')
+    parser.add_argument('-k', '--kind',
+                        nargs='+',
+                        default=common_db.KIND_LIST,
+                        choices=common_db.KIND_LIST,
+                        help='Specify day file kinds to compact, default is "' + str(' '.join(common_db.KIND_LIST)) + '".')
+    parser.add_argument('-f', '--force',
+                        action='store_true',
+                        default=False,
+                        help='Compact the day file again even if the compacted file is up to date.')
+    parser.add_argument('-r', '--remove_source',
+                        action='store_true',
+                        default=False,
+                        help='Remove the json day file and its index after compaction.')
+
+    args = parser.parse_args()
+
+    for direction in args.direction:
+        if direction not in config.valid_direction_dic:
+            common_monitor.bprint('"' + str(direction) + '": Invalid direction, missing on valid_direction_dic of config/config.py.', level='Error')
+            sys.exit(1)
+
+    return args.direction, args.monitor_item, args.kind, args.force, args.remove_source
+
+
+def compact_db(direction_list, monitor_item_list, kind_list, force, remove_source):
+    """
+    Compact closed day files under <db_path>/<direction>/<monitor_item>/<kind> into columnar <YYYYMMDD>.npz.
+    Today's day files are skipped, they are still written by SaveLog.
+    Readers pick up the compacted file automatically, and fall back to the json day file if it is appended after compaction.
+    """
+    today = datetime.datetime.now().strftime('%Y%m%d')
+    compact_num = 0
+    record_num = 0
+
+    if not direction_list:
+        direction_list = list(config.valid_direction_dic.keys())
+
+    for direction in direction_list:
+        direction_path = str(config.db_path) + '/' + str(direction)
+
+        if not os.path.isdir(direction_path):
+            continue
+
+        for monitor_item in os.listdir(direction_path):
+            if monitor_item_list and (monitor_item not in monitor_item_list):
+                continue
+
+            for kind in kind_list:
+                kind_path = str(direction_path) + '/' + str(monitor_item) + '/' + str(kind)
+
+                if not os.path.isdir(kind_path):
+                    continue
+
+                for date in sorted(os.listdir(kind_path)):
+                    if (not re.match(r'^\d{8}$', date)) or (date >= today):
+                        continue
+
+                    day_file = str(kind_path) + '/' + str(date)
+
+                    if not os.path.isfile(day_file):
+                        continue
+
+                    if force or (common_db.load_compact_day_file(day_file) is None):
+                        try:
+                            record_num += common_db.compact_day_file(day_file)
+                            compact_num += 1
+                        except Exception as error:
+                            common_monitor.bprint('Failed on compacting day file "' + str(day_file) + '": ' + str(error), level='Warning')
+                            continue
+
+                    if remove_source:
+                        for source_file in [day_file, common_db.get_index_file(day_file)]:
+                            if os.path.exists(source_file):
+                                os.remove(source_file)
+
+    common_monitor.bprint('Compacted ' + str(compact_num) + ' day files (' + str(record_num) + ' records).', level='Info')
+
+
+################
+# Main Process #
+################
+def main():
+    (direction_list, monitor_item_list, kind_list, force, remove_source) = read_args()
+    compact_db(direction_list, monitor_item_list, kind_list, force, remove_source)
+
+
+if __name__ == '__main__':
+    main()
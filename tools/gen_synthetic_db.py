@@ -0,0 +1,295 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import math
+import random
+import argparse
+import datetime
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+import common_db
+import common_monitor
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+# Generation settings of a synthetic db_path, tools/benchmark_service reads it for valid_direction_dic and the date range.
+SYNTHETIC_INFO_FILE = '.synthetic_db.json'
+
+# Relative weights of the save_log message levels, most monitor scripts log Info.
+MESSAGE_LEVEL_WEIGHT_DIC = {'Debug': 8, 'Info': 70, 'Warning': 15, 'Error': 6, 'Fatal': 1}
+
+LOG_MESSAGE_LIST = [
+    'Checked {n} hosts, {m} are unreachable.',
+    'Disk usage of /data{m} is {p}%.',
+    'License usage of feature_{m} is {n}/{t}.',
+    'Job {id} is pending for {n} seconds.',
+    'Queue normal has {n} running jobs and {t} pending jobs.',
+    'Command "ssh host{m} uptime" returns {m}.\nload average: {p}.{m}',
+    '磁盘 /data{m} 使用率 {p}%。',
+]
+
+# Alarms of a monitor item come from a few messages, so they repeat like the real ones.
+ALARM_MESSAGE_LIST = [
+    'Disk usage of /data{m} is over {p}%.',
+    'Host host{m} is unreachable.',
+    'License feature_{m} is used up.',
+    '作业 {id} 等待超过 {n} 秒。',
+]
+ALARM_MESSAGE_NUM = 3
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-o', '--db_path',
+                        required=True,
+                        help='Specify the synthetic db_path to generate, it must not exist or be empty.')
+    parser.add_argument('-d', '--direction_num',
+                        type=int,
+                        default=2,
+                        help='Specify direction number, default is 2.')
+    parser.add_argument('-m', '--item_num',
+                        type=int,
+                        default=50,
+                        help='Specify monitor item number of every direction, default is 50.')
+    parser.add_argument('-D', '--day_num',
+                        type=int,
+                        default=7,
+                        help='Specify day number, default is 7.')
+    parser.add_argument('-e', '--end_date',
+                        default=datetime.datetime.now().strftime('%Y%m%d'),
+                        help='Specify the last day (YYYYMMDD), default is today, today is only generated up to now.')
+    parser.add_argument('-l', '--log_rate',
+                        type=int,
+                        default=1000,
+                        help='Specify average logs per monitor item per day, default is 1000.')
+    parser.add_argument('-a', '--alarm_rate',
+                        type=int,
+                        default=5,
+                        help='Specify average alarms per monitor item per day, default is 5.')
+    parser.add_argument('-H', '--heartbeat_rate',
+                        type=int,
+                        default=288,
+                        help='Specify heartbeats (script runs) per monitor item per day, default is 288 (every 5 minutes).')
+    parser.add_argument('-k', '--skew',
+                        type=float,
+                        default=1.0,
+                        help='Specify the lognormal sigma of the per monitor item rates, 0 means all monitor items are the same, default is 1.0.')
+    parser.add_argument('-s', '--seed',
+                        type=int,
+                        default=0,
+                        help='Specify random seed, the same arguments always generate the same db_path, default is 0.')
+    parser.add_argument('-c', '--compact',
+                        action='store_true',
+                        default=False,
+                        help='Compact the closed day files like tools/compact_db.')
+    parser.add_argument('--no_rollup',
+                        action='store_true',
+                        default=False,
+                        help='Do not build the day file rollups, the first query builds them like on a new db_path.')
+
+    args = parser.parse_args()
+
+    if os.path.exists(args.db_path) and ((not os.path.isdir(args.db_path)) or os.listdir(args.db_path)):
+        common_monitor.bprint('"' + str(args.db_path) + '": db_path exists and is not empty.', level='Error')
+        sys.exit(1)
+
+    for (name, value) in [('direction_num', args.direction_num), ('item_num', args.item_num), ('day_num', args.day_num)]:
+        if value < 1:
+            common_monitor.bprint('"' + str(name) + '" must be at least 1.', level='Error')
+            sys.exit(1)
+
+    try:
+        datetime.datetime.strptime(args.end_date, '%Y%m%d')
+    except ValueError:
+        common_monitor.bprint('"' + str(args.end_date) + '": Invalid end_date, it must be YYYYMMDD.', level='Error')
+        sys.exit(1)
+
+    return os.path.abspath(args.db_path), args.direction_num, args.item_num, args.day_num, args.end_date, args.log_rate, args.alarm_rate, args.heartbeat_rate, args.skew, args.seed, args.compact, args.no_rollup
+
+
+def format_message(rand, message):
+    return message.format(n=rand.randint(1, 3000), m=rand.randint(0, 99), p=rand.randint(50, 100), t=rand.randint(100, 500), id=rand.randint(100000, 999999))
+
+
+def get_count(rand, rate, factor):
+    """
+    Get the record number of one day, around rate * factor.
+    """
+    mean = rate * factor
+
+    return max(0, int(rand.gauss(mean, math.sqrt(mean)) + 0.5)) if mean > 0 else 0
+
+
+def gen_second_list(rand, run_second_list, count, max_second):
+    """
+    Get count sorted record seconds of a day, logs and alarms are saved in the first minute of a script run.
+    """
+    if run_second_list:
+        second_list = [min(rand.choice(run_second_list) + int(rand.expovariate(1 / 5)), max_second) for i in range(count)]
+    else:
+        second_list = [rand.randint(0, max_second) for i in range(count)]
+
+    return sorted(second_list)
+
+
+def write_day_file(day_file, line_list, compact, rollup):
+    """
+    Write line_list into day_file, then build its sidecar files like SaveLog and the tools do.
+    """
+    kind_dir = os.path.dirname(day_file)
+
+    if not os.path.exists(kind_dir):
+        os.makedirs(kind_dir)
+        os.chmod(kind_dir, 0o755)
+
+    with open(day_file, 'w') as DF:
+        DF.write(''.join(line_list))
+
+    common_db.build_day_file_index(day_file)
+
+    if rollup:
+        common_db.read_day_file_rollup(day_file, os.path.basename(kind_dir))
+
+    if compact:
+        common_db.compact_day_file(day_file)
+
+
+def gen_monitor_item(db_path, direction, direction_admin, monitor_item, date_list, rate_dic, factor, rand, compact, rollup):
+    """
+    Generate monitor_item.yaml and the log/alarm/heartbeat day files of one monitor item, return {kind: record_num}.
+    """
+    current_datetime = datetime.datetime.now()
+    today = current_datetime.strftime('%Y%m%d')
+    run_interval = (86400 // rate_dic['heartbeat']) if rate_dic['heartbeat'] else 0
+    user = 'user' + str(rand.randint(0, 9))
+    host = '10.0.' + str(rand.randint(0, 255)) + '.' + str(rand.randint(1, 254))
+    script_path = '/synthetic/scripts/' + str(direction) + '/' + str(monitor_item) + '.py'
+    alarm_receivers = ' '.join(sorted(set([direction_admin, user])))
+    alarm_message_list = [format_message(rand, rand.choice(ALARM_MESSAGE_LIST)) for i in range(ALARM_MESSAGE_NUM)]
+    record_num_dic = {kind: 0 for kind in common_db.KIND_LIST}
+    monitor_item_dic = {
+        'direction': direction,
+        'direction_admin': direction_admin,
+        'monitor_item': monitor_item,
+        'script_path': script_path,
+        'script_auther': user,
+        'script_startup_method': 'crontab',
+        'script_startup_host': host,
+        'script_execute_frequency': ('every ' + str(run_interval // 60) + ' minutes') if run_interval >= 60 else 'once a day',
+        'alarm_receivers': alarm_receivers,
+        'alarm_frequency': 'everytime',
+    }
+    common_monitor.save_monitor_item_yaml(db_path, direction, monitor_item, monitor_item_dic)
+
+    for date in date_list:
+        day_datetime = datetime.datetime.strptime(date, '%Y%m%d')
+        max_second = 86399
+
+        if date == today:
+            max_second = int((current_datetime - day_datetime).total_seconds())
+        elif date > today:
+            continue
+
+        # The script runs every run_interval seconds since a random offset, a little late now and then.
+        run_second_list = []
+
+        if run_interval:
+            run_second = rand.randint(0, run_interval - 1)
+
+            while run_second <= max_second:
+                run_second_list.append(min(run_second + int(rand.expovariate(1 / 2)), max_second))
+                run_second += run_interval
+
+        second_list_dic = {
+            'heartbeat': run_second_list,
+            'log': gen_second_list(rand, run_second_list, int(get_count(rand, rate_dic['log'], factor) * (max_second + 1) / 86400), max_second),
+            'alarm': gen_second_list(rand, run_second_list, int(get_count(rand, rate_dic['alarm'], factor) * (max_second + 1) / 86400), max_second),
+        }
+
+        for kind in common_db.KIND_LIST:
+            line_list = []
+
+            for second in second_list_dic[kind]:
+                current_time = (day_datetime + datetime.timedelta(seconds=second)).strftime('%Y-%m-%d %H:%M:%S')
+
+                if kind == 'log':
+                    message_level = rand.choices(list(MESSAGE_LEVEL_WEIGHT_DIC.keys()), weights=list(MESSAGE_LEVEL_WEIGHT_DIC.values()))[0]
+                    info_dic = {"time": current_time, "message_level": message_level, "message": format_message(rand, rand.choice(LOG_MESSAGE_LIST))}
+                elif kind == 'alarm':
+                    result = 'PASSED' if rand.random() < 0.95 else 'FAILED'
+                    info_dic = common_monitor.gen_alarm_info_dic(current_time, rand.choice(alarm_message_list), alarm_receivers, result, rand.uniform(0.05, 2), 1 if result == 'PASSED' else 3)
+                else:
+                    info_dic = {"time": current_time, "user": user, "host": host, "script": script_path}
+
+                line_list.append(str(json.dumps(info_dic, ensure_ascii=False)) + '\n')
+
+            if line_list:
+                day_file = common_db.get_day_file(db_path, direction, monitor_item, kind, date)
+                # Today's day files are still written by SaveLog, they are never compacted.
+                write_day_file(day_file, line_list, compact and (date != today), rollup)
+                record_num_dic[kind] += len(line_list)
+
+    return record_num_dic
+
+
+def gen_synthetic_db(db_path, direction_num, item_num, day_num, end_date, log_rate, alarm_rate, heartbeat_rate, skew, seed, compact, no_rollup):
+    """
+    Generate a db_path of direction_num * item_num monitor items with day_num days of log/alarm/heartbeat records in SaveLog format.
+    """
+    rand = random.Random(seed)
+    end_datetime = datetime.datetime.strptime(end_date, '%Y%m%d')
+    date_list = [(end_datetime - datetime.timedelta(days=day)).strftime('%Y%m%d') for day in range(day_num - 1, -1, -1)]
+    rate_dic = {'log': log_rate, 'alarm': alarm_rate, 'heartbeat': min(heartbeat_rate, 86400)}
+    valid_direction_dic = {}
+    record_num_dic = {kind: 0 for kind in common_db.KIND_LIST}
+
+    if not os.path.exists(db_path):
+        os.makedirs(db_path)
+        os.chmod(db_path, 0o755)
+
+    for direction_index in range(direction_num):
+        direction = 'direction' + str(direction_index)
+        valid_direction_dic[direction] = 'admin' + str(direction_index)
+        common_monitor.bprint('Generating direction "' + str(direction) + '" ...', level='Info')
+
+        for item_index in range(item_num):
+            monitor_item = 'synthetic_item_' + str(item_index).zfill(len(str(item_num - 1)))
+            # A few monitor items save most records, like on a real db_path.
+            factor = rand.lognormvariate(-skew * skew / 2, skew) if skew > 0 else 1.0
+            item_record_num_dic = gen_monitor_item(db_path, direction, valid_direction_dic[direction], monitor_item, date_list, rate_dic, factor, rand, compact, not no_rollup)
+
+            for kind in common_db.KIND_LIST:
+                record_num_dic[kind] += item_record_num_dic[kind]
+
+    synthetic_info_dic = {
+        'argument': {'direction_num': direction_num, 'item_num': item_num, 'day_num': day_num, 'end_date': end_date, 'log_rate': log_rate, 'alarm_rate': alarm_rate, 'heartbeat_rate': heartbeat_rate, 'skew': skew, 'seed': seed, 'compact': compact, 'no_rollup': no_rollup},
+        'valid_direction_dic': valid_direction_dic,
+        'begin_datetime': datetime.datetime.strptime(date_list[0], '%Y%m%d').strftime('%Y-%m-%d 00:00:00'),
+        'end_datetime': end_datetime.strftime('%Y-%m-%d 23:59:59'),
+        'record_num': record_num_dic,
+    }
+
+    with open(str(db_path) + '/' + str(SYNTHETIC_INFO_FILE), 'w') as SIF:
+        SIF.write(json.dumps(synthetic_info_dic, indent=4))
+
+    common_monitor.bprint('Generated ' + str(direction_num * item_num) + ' monitor items, ' + ', '.join(str(record_num_dic[kind]) + ' ' + str(kind) for kind in common_db.KIND_LIST) + ' records on "' + str(db_path) + '".', level='Info')
+    common_monitor.bprint('Set valid_direction_dic = ' + str(json.dumps(valid_direction_dic)) + ' on config/config.py to browse it, tools/benchmark_service uses it automatically.', level='Info')
+
+
+################
+# Main Process #
+################
+def main():
+    (db_path, direction_num, item_num, day_num, end_date, log_rate, alarm_rate, heartbeat_rate, skew, seed, compact, no_rollup) = read_args()
+    gen_synthetic_db(db_path, direction_num, item_num, day_num, end_date, log_rate, alarm_rate, heartbeat_rate, skew, seed, compact, no_rollup)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import json
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+import common_monitor
+sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/config')
+import config
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+# The collector serves many short-lived scripts, so it buffers more than a single SaveLog(buffered_write=True).
+COLLECTOR_FLUSH_SIZE = 1024 * 1024
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-s', '--socket',
+                        default=getattr(config, 'collector_socket', ''),
+                        help='Specify the unix socket to listen on, default is "collector_socket" on config/config.py.')
+    parser.add_argument('-m', '--mode',
+                        default='600',
+                        help='Specify the (octal) access permission of the socket, default is "600", only the collector user can connect. '
+                             'Every user who can connect writes records and sends alarms as the collector user (the alarm values reach send_alarm_command as environment variables, never as shell code), only open it to trusted users.')
+    parser.add_argument('--flush_size',
+                        type=int,
+                        default=COLLECTOR_FLUSH_SIZE,
+                        help='Specify how many bytes are buffered before writing, default is ' + str(COLLECTOR_FLUSH_SIZE) + '.')
+    parser.add_argument('--flush_interval',
+                        type=float,
+                        default=common_monitor.BUFFER_FLUSH_INTERVAL,
+                        help='Specify the max seconds an event is buffered, default is ' + str(common_monitor.BUFFER_FLUSH_INTERVAL) + '.')
+
+    args = parser.parse_args()
+
+    if not args.socket:
+        common_monitor.bprint('No socket is specified, set "collector_socket" on config/config.py or specify it with "-s".', level='Error')
+        sys.exit(1)
+
+    if not re.match(r'^[0-7]{3}$', args.mode):
+        common_monitor.bprint('"' + str(args.mode) + '": Invalid socket mode.', level='Error')
+        sys.exit(1)
+
+    return args.socket, int(args.mode, 8), args.flush_size, args.flush_interval
+
+
+class CollectorRequestHandler(socketserver.StreamRequestHandler):
+    """
+    One connection per SaveLog process, every line is a json event.
+    """
+    def setup(self):
+        super().setup()
+
+        with self.server.connection_lock:
+            self.server.connection_set.add(self.connection)
+
+    def finish(self):
+        with self.server.connection_lock:
+            self.server.connection_set.discard(self.connection)
+
+        super().finish()
+
+    def handle(self):
+        for line in self.rfile:
+            # The client is gone in the middle of a line.
+            if not line.endswith(b'\n'):
+                break
+
+            try:
+                self.server.event_handler.handle_event(json.loads(line))
+            except Exception as error:
+                common_monitor.bprint('Failed on handling event, ' + str(error), level='Warning')
+
+
+class CollectorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    server_close() waits for the connection threads, after close_connections() lets them drain.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connection_set = set()
+        self.connection_lock = threading.Lock()
+
+    def close_connections(self):
+        """
+        Stop receiving, the events already sent are still read, then the clients get EPIPE and write db_path directly.
+        """
+        with self.connection_lock:
+            for connection in self.connection_set:
+                try:
+                    connection.shutdown(socket.SHUT_RD)
+                except OSError:
+                    pass
+
+
+def run_collector(socket_path, socket_mode, flush_size, flush_interval):
+    """
+    Listen on socket_path until SIGTERM/SIGINT, then flush everything.
+    """
+    if os.path.exists(socket_path):
+        try:
+            common_monitor.CollectorClient(socket_path).socket.close()
+            common_monitor.bprint('"' + str(socket_path) + '": Another collector is running.', level='Error')
+            sys.exit(1)
+        except OSError:
+            # Left by a dead collector.
+            os.remove(socket_path)
+
+    config_dic = {var: getattr(config, var) for var in dir(config) if not re.match(r'^_.*$', var)}
+    event_handler = common_monitor.EventHandler(config_dic, common_monitor.get_day_file_writer(flush_size, flush_interval))
+    # Start the alarm dispatcher now, to send the alarms left in spool.
+    event_handler.alarm_dispatcher = common_monitor.get_alarm_dispatcher(config_dic)
+    # Create the socket with socket_mode directly, a connection in between can not bypass it.
+    old_umask = os.umask(0o777 & ~socket_mode)
+
+    try:
+        server = CollectorServer(socket_path, CollectorRequestHandler)
+    finally:
+        os.umask(old_umask)
+
+    server.event_handler = event_handler
+
+    def stop(signal_num, frame):
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    common_monitor.bprint('Collector is listening on "' + str(socket_path) + '".', level='Info')
+
+    try:
+        server.serve_forever()
+    finally:
+        os.remove(socket_path)
+        server.close_connections()
+        server.server_close()
+        event_handler.day_file_writer.close()
+        common_monitor.bprint('Collector is stopped.', level='Info')
+
+
+################
+# Main Process #
+################
+def main():
+    (socket_path, socket_mode, flush_size, flush_interval) = read_args()
+    run_collector(socket_path, socket_mode, flush_size, flush_interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,472 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import re
+import ast
+import sys
+import time
+import zlib
+import queue
+import signal
+import argparse
+import datetime
+import threading
+import subprocess
+import importlib.util
+import importlib.machinery
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+import common_monitor
+sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/config')
+import config
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+# Rescan the script directories this often (seconds), for the new, changed and removed scripts.
+SCAN_INTERVAL = 60
+# Register the runner heartbeat this often (seconds).
+HEARTBEAT_INTERVAL = 60
+# Seconds to wait for the running jobs on stop.
+STOP_TIMEOUT = 30
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-s', '--scripts_path',
+                        default=str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/scripts',
+                        help='Specify the scripts path, the scripts under <scripts_path>/<direction>/ are run, default is "$MONITOR_VIEWER_INSTALL_PATH/scripts".')
+    parser.add_argument('-d', '--directions',
+                        nargs='+',
+                        default=[],
+                        help='Specify the directions to run, default is all directions under scripts_path.')
+    parser.add_argument('-w', '--worker_num',
+                        type=int,
+                        default=getattr(config, 'runner_worker_num', 8),
+                        help='Specify how many scripts are run in parallel, default is "runner_worker_num" on config/config.py or 8.')
+    parser.add_argument('-m', '--mode',
+                        choices=['thread', 'process'],
+                        default=getattr(config, 'runner_mode', 'thread'),
+                        help='Specify how the scripts are run, "thread" imports a script once and calls its main() in a worker thread, a run over timeout can not be stopped; '
+                             '"process" runs the script in a child process every time, which is killed on timeout. Default is "runner_mode" on config/config.py or "thread".')
+    parser.add_argument('-t', '--timeout',
+                        type=int,
+                        default=0,
+                        help='Specify the timeout (seconds) of a run, default is 0, the execute interval of the script.')
+    parser.add_argument('-j', '--max_jitter',
+                        type=int,
+                        default=getattr(config, 'runner_max_jitter', 30),
+                        help='Specify the max seconds a run is shifted from the scheduled time, default is "runner_max_jitter" on config/config.py or 30.')
+    parser.add_argument('-l', '--list',
+                        action='store_true',
+                        default=False,
+                        help='List the scripts with their next run time, then exit.')
+
+    args = parser.parse_args()
+
+    if args.worker_num < 1:
+        common_monitor.bprint('"' + str(args.worker_num) + '": Invalid worker_num, it must be positive.', level='Error')
+        sys.exit(1)
+
+    return args.scripts_path, args.directions, args.worker_num, args.mode, args.timeout, args.max_jitter, args.list
+
+
+def read_script_info(script_path):
+    """
+    Get script_execute_frequency on the SaveLog(...) call of a python monitor script without running it.
+    Return None if it is not a monitor script, or it has no main() for the runner to call.
+    """
+    try:
+        with open(script_path, 'r', encoding='utf-8') as SF:
+            script_content = SF.read()
+
+        # Cheap checks first, then parse it.
+        if ('SaveLog' not in script_content) or (not (script_path.endswith('.py') or re.match(r'^#!.*python', script_content))):
+            return None
+
+        module_node = ast.parse(script_content, filename=script_path)
+    except (OSError, UnicodeDecodeError, SyntaxError, ValueError):
+        return None
+
+    script_info_dic = {'frequency': '', 'has_main': False}
+
+    for node in ast.walk(module_node):
+        if isinstance(node, ast.Call) and (getattr(node.func, 'attr', getattr(node.func, 'id', '')) == 'SaveLog'):
+            for keyword in node.keywords:
+                if (keyword.arg == 'script_execute_frequency') and isinstance(keyword.value, ast.Constant):
+                    script_info_dic['frequency'] = str(keyword.value.value)
+        elif isinstance(node, ast.FunctionDef) and (node.name == 'main') and (node in module_node.body):
+            script_info_dic['has_main'] = True
+
+    return script_info_dic if script_info_dic['has_main'] else None
+
+
+def get_save_log_list(module):
+    """
+    Get the SaveLog instances on module level of a monitor script.
+    """
+    return [value for value in vars(module).values() if isinstance(value, common_monitor.SaveLog)]
+
+
+class MonitorJob():
+    """
+    A monitor script run by the runner.
+    * In thread mode, the script is imported once, the SaveLog instances it creates on module level are kept warm, main() is called on every run.
+      The first run registers the heartbeat with SaveLog(...) on import, the following runs with heartbeat_registration().
+    * In process mode, every run executes the script in a child process (its own session), which is killed with its children on timeout.
+    * Runs are scheduled from script_execute_frequency, shifted by a stable offset (from the script path) up to max_jitter seconds,
+      so the scripts of the same frequency do not all start at the top of the minute.
+    """
+    def __init__(self, script_path, frequency, mtime, max_jitter):
+        self.script_path = script_path
+        self.frequency = frequency
+        self.mtime = mtime
+        self.interval = common_monitor.parse_execute_frequency(frequency)
+        self.crontab = common_monitor.is_crontab_expression(frequency)
+        max_offset = min(int(self.interval or 1), max_jitter)
+
+        if self.crontab:
+            # Stay in the scheduled minute.
+            max_offset = min(max_offset, 60)
+
+        self.offset = zlib.crc32(script_path.encode()) % max(1, max_offset)
+        self.module = None
+        self.process = None
+        self.next_time = None
+        self.start_time = None
+        self.timeout_reported = False
+        self.run_num = 0
+        self.fail_num = 0
+
+    def get_next_time(self, current_time):
+        """
+        Get the next run time (timestamp) after current_time, None if the frequency is unknown.
+        """
+        if self.crontab:
+            next_datetime = common_monitor.get_next_crontab_time(self.frequency, datetime.datetime.fromtimestamp(current_time - self.offset))
+            return (next_datetime.timestamp() + self.offset) if next_datetime else None
+        elif self.interval:
+            # Aligned to the interval, so the runs keep the cadence after a restart.
+            return ((current_time - self.offset) // self.interval + 1) * self.interval + self.offset
+
+        return None
+
+    def load_module(self):
+        """
+        Import the script as a module, its "if __name__ == '__main__'" block is not run.
+        """
+        module_name = 'monitor_runner_job_' + str(zlib.crc32(self.script_path.encode()))
+        loader = importlib.machinery.SourceFileLoader(module_name, self.script_path)
+        spec = importlib.util.spec_from_loader(module_name, loader)
+        module = importlib.util.module_from_spec(spec)
+        loader.exec_module(module)
+
+        return module
+
+    def run(self):
+        """
+        Run the script once in current thread, an exception or sys.exit(non-zero) is a failure.
+        """
+        try:
+            if self.module is None:
+                self.module = self.load_module()
+            else:
+                for save_log_ins in get_save_log_list(self.module):
+                    save_log_ins.heartbeat_registration(save_log_ins.monitor_item_dic['direction'], save_log_ins.monitor_item_dic['monitor_item'])
+
+            self.module.main()
+        except SystemExit as error:
+            if error.code not in [None, 0]:
+                raise RuntimeError('exit with "' + str(error.code) + '"')
+
+    def run_process(self, timeout=None):
+        """
+        Run the script once in a child process, kill it (with its children) and raise subprocess.TimeoutExpired if it runs longer than timeout seconds.
+        """
+        self.process = subprocess.Popen([sys.executable, self.script_path], stdin=subprocess.DEVNULL, start_new_session=True)
+
+        try:
+            return_code = self.process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            self.kill()
+            raise
+        finally:
+            self.process = None
+
+        if return_code != 0:
+            raise RuntimeError('exit with "' + str(return_code) + '"')
+
+    def kill(self):
+        """
+        Kill the child process of the running run (process mode).
+        """
+        process = self.process
+
+        if process is not None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+            process.wait()
+
+
+class MonitorRunner():
+    """
+    Run the monitor scripts under <scripts_path>/<direction>/ with worker_num workers, one run of a script at a time.
+    A run over timeout is reported and alarmed.
+    * mode "thread": the scripts run in worker threads, a thread can not be killed, so the script is not started again until the run returns.
+    * mode "process": every worker thread runs the script in a child process, it is killed on timeout, and on stop after STOP_TIMEOUT.
+    """
+    def __init__(self, scripts_path, direction_list, worker_num, timeout, max_jitter, mode='thread'):
+        self.scripts_path = scripts_path
+        self.direction_list = direction_list
+        self.worker_num = worker_num
+        self.mode = mode
+        self.timeout = timeout
+        self.max_jitter = max_jitter
+        # {script_path: MonitorJob}
+        self.job_dic = {}
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.running_job_set = set()
+        self.stop_event = threading.Event()
+        self.save_log_ins = None
+        # Timeout messages of the worker threads (process mode), reported by the main thread.
+        self.timeout_message_list = []
+
+    def scan_scripts(self):
+        """
+        Find the monitor scripts, the changed scripts are imported again on next run.
+        """
+        script_path_set = set()
+        direction_list = self.direction_list
+
+        if not direction_list:
+            try:
+                direction_list = sorted(entry.name for entry in os.scandir(self.scripts_path) if entry.is_dir() and (not entry.name.startswith('.')) and (entry.name != '__pycache__'))
+            except OSError as error:
+                common_monitor.bprint('Failed on listing "' + str(self.scripts_path) + '", ' + str(error), level='Warning')
+
+        for direction in direction_list:
+            try:
+                entry_list = [entry for entry in os.scandir(str(self.scripts_path) + '/' + str(direction)) if entry.is_file()]
+            except OSError:
+                continue
+
+            for entry in entry_list:
+                script_path = os.path.abspath(entry.path)
+                mtime = entry.stat().st_mtime
+                job = self.job_dic.get(script_path)
+                script_path_set.add(script_path)
+
+                if job and (job.mtime == mtime):
+                    continue
+
+                script_info_dic = read_script_info(script_path)
+
+                with self.lock:
+                    if job and (job in self.running_job_set):
+                        # Replace it after the running one returns.
+                        continue
+
+                    if script_info_dic is None:
+                        self.job_dic.pop(script_path, None)
+                        continue
+
+                    job = MonitorJob(script_path, script_info_dic['frequency'], mtime, self.max_jitter)
+                    job.next_time = job.get_next_time(time.time())
+                    self.job_dic[script_path] = job
+
+                    if job.next_time is None:
+                        common_monitor.bprint('"' + str(script_path) + '": Unknown script_execute_frequency "' + str(job.frequency) + '", it is not scheduled.', level='Warning')
+
+        with self.lock:
+            for script_path in list(self.job_dic.keys()):
+                if script_path not in script_path_set:
+                    del self.job_dic[script_path]
+
+    def list_jobs(self):
+        print('%-60s %-20s %-10s %-8s %-20s' % ('SCRIPT', 'EXECUTE_FREQUENCY', 'INTERVAL', 'OFFSET', 'NEXT_RUN'))
+
+        for (script_path, job) in sorted(self.job_dic.items()):
+            next_time = datetime.datetime.fromtimestamp(job.next_time).strftime('%Y-%m-%d %H:%M:%S') if job.next_time else 'N/A'
+            print('%-60s %-20s %-10s %-8s %-20s' % (script_path, job.frequency or 'N/A', job.interval or 'N/A', job.offset, next_time))
+
+    def work(self):
+        """
+        Worker thread, run the queued jobs one by one.
+        """
+        while True:
+            job = self.queue.get()
+            start_time = time.time()
+
+            with self.lock:
+                job.start_time = start_time
+
+            try:
+                if self.mode == 'process':
+                    job.run_process(self.timeout or job.interval or None)
+                else:
+                    job.run()
+
+                status = 'PASSED'
+            except subprocess.TimeoutExpired as error:
+                job.fail_num += 1
+                status = 'TIMEOUT'
+
+                with self.lock:
+                    self.timeout_message_list.append('"' + str(job.script_path) + '": Run is over timeout ' + str(error.timeout) + ' seconds, it is killed.')
+            except Exception as error:
+                job.fail_num += 1
+                status = 'FAILED'
+                common_monitor.bprint('"' + str(job.script_path) + '": Run failed, ' + str(error), level='Warning')
+
+            with self.lock:
+                job.run_num += 1
+
+                if job.timeout_reported:
+                    common_monitor.bprint('"' + str(job.script_path) + '": The timed out run returns after ' + str(round(time.time() - start_time, 1)) + ' seconds, ' + str(status) + '.', level='Info')
+
+                self.running_job_set.discard(job)
+                job.start_time = None
+                job.timeout_reported = False
+
+    def check_timeout(self, current_time):
+        """
+        Report the runs over timeout once.
+        """
+        with self.lock:
+            (message_list, self.timeout_message_list) = (self.timeout_message_list, [])
+
+            # The child processes are killed by the workers on timeout.
+            for job in (self.running_job_set if self.mode == 'thread' else []):
+                timeout = self.timeout or job.interval
+
+                if timeout and job.start_time and (not job.timeout_reported) and (current_time - job.start_time > timeout):
+                    job.timeout_reported = True
+                    message_list.append('"' + str(job.script_path) + '": Run is over timeout ' + str(timeout) + ' seconds, it is not started again until it returns.')
+
+        for message in message_list:
+            common_monitor.bprint(message, level='Warning')
+            self.save_log_ins.save_log(message, message_level='Warning', print_mode=False)
+            self.save_log_ins.send_alarm(message=message)
+
+    def schedule(self, current_time):
+        """
+        Queue the jobs which are due, a job still running skips its turn.
+        """
+        with self.lock:
+            for job in self.job_dic.values():
+                if (job.next_time is None) or (job.next_time > current_time):
+                    continue
+
+                if job not in self.running_job_set:
+                    self.running_job_set.add(job)
+                    self.queue.put(job)
+                elif not job.timeout_reported:
+                    common_monitor.bprint('"' + str(job.script_path) + '": Last run is not finished, skip this run.', level='Warning')
+
+                job.next_time = job.get_next_time(current_time)
+
+    def stop(self, signal_num=None, frame=None):
+        self.stop_event.set()
+
+    def flush_jobs(self):
+        """
+        Write out the buffered messages of the SaveLog instances of the imported scripts (thread mode).
+        """
+        with self.lock:
+            module_list = [job.module for job in set(self.job_dic.values()) | self.running_job_set if job.module is not None]
+
+        for module in module_list:
+            for save_log_ins in get_save_log_list(module):
+                try:
+                    save_log_ins.flush()
+                except Exception as error:
+                    common_monitor.bprint('Failed on flushing SaveLog of "' + str(module.__file__) + '", ' + str(error), level='Warning')
+
+    def run(self):
+        """
+        Schedule the jobs until SIGTERM/SIGINT, then wait STOP_TIMEOUT seconds for the running jobs.
+        """
+        self.save_log_ins = common_monitor.SaveLog(
+            direction='default',
+            monitor_item='monitor_runner',
+            script_path=os.path.abspath(__file__),
+            script_auther='',
+            script_startup_method='monitor_runner',
+            script_execute_frequency='every minute',
+            alarm_receivers='',
+            alarm_frequency='max 1 times')
+
+        for i in range(self.worker_num):
+            threading.Thread(target=self.work, name='MonitorRunner-' + str(i), daemon=True).start()
+
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        common_monitor.bprint('Monitor runner is running ' + str(len(self.job_dic)) + ' scripts under "' + str(self.scripts_path) + '".', level='Info')
+        (scan_time, heartbeat_time) = (time.time(), time.time())
+
+        while not self.stop_event.is_set():
+            current_time = time.time()
+
+            if current_time - scan_time >= SCAN_INTERVAL:
+                self.scan_scripts()
+                scan_time = current_time
+
+            if current_time - heartbeat_time >= HEARTBEAT_INTERVAL:
+                self.save_log_ins.heartbeat_registration('default', 'monitor_runner')
+                heartbeat_time = current_time
+
+            self.schedule(current_time)
+            self.check_timeout(current_time)
+
+            with self.lock:
+                next_time = min([job.next_time for job in self.job_dic.values() if job.next_time] + [current_time + 1])
+
+            self.stop_event.wait(max(0, min(next_time, current_time + 1) - time.time()))
+
+        stop_time = time.time()
+
+        while self.running_job_set and (time.time() - stop_time < STOP_TIMEOUT):
+            time.sleep(0.1)
+
+        if self.running_job_set:
+            if self.mode == 'process':
+                common_monitor.bprint(str(len(self.running_job_set)) + ' runs are not finished in ' + str(STOP_TIMEOUT) + ' seconds, kill them.', level='Warning')
+
+                with self.lock:
+                    running_job_list = list(self.running_job_set)
+
+                for job in running_job_list:
+                    job.kill()
+            else:
+                common_monitor.bprint(str(len(self.running_job_set)) + ' runs are not finished in ' + str(STOP_TIMEOUT) + ' seconds, stop anyway, the messages they write after are lost.', level='Warning')
+
+        self.flush_jobs()
+        common_monitor.bprint('Monitor runner is stopped.', level='Info')
+
+
+################
+# Main Process #
+################
+def main():
+    (scripts_path, direction_list, worker_num, mode, timeout, max_jitter, list_mode) = read_args()
+    # The scripts parse their own arguments from sys.argv, they run with the defaults.
+    sys.argv = sys.argv[:1]
+    monitor_runner = MonitorRunner(scripts_path, direction_list, worker_num, timeout, max_jitter, mode)
+    monitor_runner.scan_scripts()
+
+    if list_mode:
+        monitor_runner.list_jobs()
+    else:
+        monitor_runner.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+# Copyright (c) 2024 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: GPL-3.0-only
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import argparse
+import datetime
+
+sys.path.insert(0, str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/common')
+import common_monitor
+import common_db
+sys.path.append(str(os.environ['MONITOR_VIEWER_INSTALL_PATH']) + '/config')
+import config
+
+os.environ['PYTHONUNBUFFERED'] = '1'
+
+
+def read_args():
+    """
+    Read in arguments.
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('-d', '--direction',
+                        nargs='+',
+                        default=[],
+                        help='Specify directions to reindex, default is all valid directions.')
+    parser.add_argument('-i', '--monitor_item',
+                        nargs='+',
+                        default=[],
+                        help='Specify monitor items to reindex, default is all monitor items.')
+    parser.add_argument('-k', '--kind',
+                        nargs='+',
+                        default=common_db.KIND_LIST,
+                        choices=common_db.KIND_LIST,
+                        help='Specify day file kinds to reindex, default is "' + str(' '.join(common_db.KIND_LIST)) + '".')
+    parser.add_argument('-f', '--force',
+                        action='store_true',
+                        default=False,
+                        help='Rebuild the index even if it exists.')
+
+    args = parser.parse_args()
+
+    for direction in args.direction:
+        if direction not in config.valid_direction_dic:
+            common_monitor.bprint('"' + str(direction) + '": Invalid direction, missing on valid_direction_dic of config/config.py.', level='Error')
+            sys.exit(1)
+
+    return args.direction, args.monitor_item, args.kind, args.force
+
+
+def reindex_db(direction_list, monitor_item_list, kind_list, force):
+    """
+    Build day file index <YYYYMMDD>.idx for closed day files under <db_path>/<direction>/<monitor_item>/<kind>.
+    Today's day files are skipped, SaveLog indexes new day files when it writes them.
+    """
+    today = datetime.datetime.now().strftime('%Y%m%d')
+    index_num = 0
+
+    if not direction_list:
+        direction_list = list(config.valid_direction_dic.keys())
+
+    for direction in direction_list:
+        direction_path = str(config.db_path) + '/' + str(direction)
+
+        if not os.path.isdir(direction_path):
+            continue
+
+        for monitor_item in os.listdir(direction_path):
+            if monitor_item_list and (monitor_item not in monitor_item_list):
+                continue
+
+            for kind in kind_list:
+                kind_path = str(direction_path) + '/' + str(monitor_item) + '/' + str(kind)
+
+                if not os.path.isdir(kind_path):
+                    continue
+
+                for date in sorted(os.listdir(kind_path)):
+                    if (not re.match(r'^\d{8}$', date)) or (date >= today):
+                        continue
+
+                    day_file = str(kind_path) + '/' + str(date)
+
+                    if (not force) and os.path.exists(common_db.get_index_file(day_file)):
+                        continue
+
+                    try:
+                        common_db.build_day_file_index(day_file)
+                        index_num += 1
+                    except Exception as error:
+                        common_monitor.bprint('Failed on indexing day file "' + str(day_file) + '": ' + str(error), level='Warning')
+
+    common_monitor.bprint('Indexed ' + str(index_num) + ' day files.', level='Info')
+
+
+################
+# Main Process #
+################
+def main():
+    (direction_list, monitor_item_list, kind_list, force) = read_args()
+    reindex_db(direction_list, monitor_item_list, kind_list, force)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,6 @@
+import json
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 from flask_bootstrap import Bootstrap
 from service.monitor_service import MonitorService
 from tools.decorator_helper import print_execution_time
@@ -9,13 +10,7 @@ app.config['SECRET_KEY'] = 'your_secret_key'
 bootstrap = Bootstrap(app)
 
 
-@app.route('/top_alarms_per_monitor_item', methods=['GET'])
-@print_execution_time
-def get_top_alarms_per_monitor_item():
-    begin_date = request.args.get('begin_datetime')
-    end_date = request.args.get('end_datetime')
-    monitor_service = MonitorService()
-    top_alarms_data = monitor_service.get_top_alarms_per_monitor_item(begin_date, end_date)
+def gen_top_alarms_chart_data(top_alarms_data):
     categories = [inner_list[0] for inner_list in top_alarms_data]
     series_datas = []
 
@@ -30,71 +25,72 @@ def get_top_alarms_per_monitor_item():
         'series': series_datas,
     }
 
-    return jsonify(data)
+    return data
 
 
-@app.route('/monitor_chart_data', methods=['GET'])
-@print_execution_time
-def get_monitor_chart_data():
-    begin_date = request.args.get('begin_datetime')
-    end_date = request.args.get('end_datetime')
+@app.route('/cache_stats', methods=['GET'])
+def get_cache_stats():
     monitor_service = MonitorService()
-    categories, series_data = monitor_service.get_monitor_chart_data(begin_date, end_date)
-    data = {
-        'categories': categories,
-        'series': series_data,
-    }
 
-    return jsonify(data)
+    return jsonify(monitor_service.get_cache_stats())
 
 
-@app.route('/alarm_chart_data', methods=['GET'])
+@app.route('/ingest', methods=['POST'])
 @print_execution_time
-def get_alarm_chart_data():
-    begin_date = request.args.get('begin_datetime')
-    end_date = request.args.get('end_datetime')
+def ingest():
+    """
+    Accept a batch of SaveLog events as ndjson, see common_monitor.EventHandler for the event formats.
+    send_alarm/monitor_item events need the ingest_token of config.py in header X-Ingest-Token.
+    """
     monitor_service = MonitorService()
-    categories, series_data = monitor_service.get_alarm_chart_data(begin_date, end_date)
-    data = {
-        'categories': categories,
-        'series': series_data,
-    }
+    (accepted_num, rejected_list) = monitor_service.ingest_events(request.get_data().splitlines(), request.headers.get('X-Ingest-Token', ''))
+
+    return jsonify({
+        "accepted": accepted_num,
+        "rejected": rejected_list
+    })
+
+
+def get_table_args():
+    """
+    Get DataTables server-side processing arguments from request.args.
+    """
+    draw = request.args.get('draw')
+    start = max(request.args.get('start', 0, type=int), 0)
+    length = request.args.get('length', -1, type=int)
+    search_value = request.args.get('search[value]', '')
+    order_column_index = request.args.get('order[0][column]')
+    order_column = None
+    order_direction = request.args.get('order[0][dir]', 'asc')
+    column_search_dic = {}
+
+    if order_column_index is not None:
+        order_column = request.args.get(f'columns[{order_column_index}][data]')
+
+    column_index = 0
+
+    while request.args.get(f'columns[{column_index}][data]') is not None:
+        column_search_value = request.args.get(f'columns[{column_index}][search][value]')
 
-    return jsonify(data)
+        if column_search_value:
+            column_search_dic[request.args.get(f'columns[{column_index}][data]')] = column_search_value
+
+        column_index += 1
+
+    return draw, start, length, search_value, column_search_dic, order_column, order_direction
 
 
 @app.route('/monitor_table_data', methods=['GET'])
 @print_execution_time
 def get_monitor_table_data():
-    draw = request.args.get('draw')
-    search_value = request.args.get('search[value]')
-    order_column_index = int(request.args.get('order[0][column]'))
-    order_direction = request.args.get('order[0][dir]')
+    (draw, start, length, search_value, column_search_dic, order_column, order_direction) = get_table_args()
     monitor_service = MonitorService()
-    data = monitor_service.get_monitor_table_data()
-    # 进行搜索过滤
-    filtered_data = []
-
-    if search_value:
-        for item in data:
-            if search_value.lower() in str(item.values()).lower():
-                filtered_data.append(item)
-    else:
-        filtered_data = data
-
-    # 进行排序
-    if order_direction == 'asc':
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index])
-    else:
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index], reverse=True)
-
-    # 获取当前页的数据
-    paginated_data = sorted_data
+    (records_total, records_filtered, paginated_data) = monitor_service.get_monitor_table_page(start, length, search_value, column_search_dic, order_column, order_direction)
 
     return jsonify({
         "draw": draw,
-        "recordsTotal": len(data),
-        "recordsFiltered": len(filtered_data),
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
         "data": paginated_data
     })
 
@@ -102,37 +98,16 @@ def get_monitor_table_data():
 @app.route('/heartbeat_table_data', methods=['GET'])
 @print_execution_time
 def get_heartbeat_table_data():
-    draw = request.args.get('draw')
-    search_value = request.args.get('search[value]')
-    order_column_index = int(request.args.get('order[0][column]'))
-    order_direction = request.args.get('order[0][dir]')
+    (draw, start, length, search_value, column_search_dic, order_column, order_direction) = get_table_args()
     begin_date = request.args.get('begin_datetime')
     end_date = request.args.get('end_datetime')
     monitor_service = MonitorService()
-    data = monitor_service.get_all_heartbeat_table_data(begin_date, end_date)
-    # 进行搜索过滤
-    filtered_data = []
-
-    if search_value:
-        for item in data:
-            if search_value.lower() in str(item.values()).lower():
-                filtered_data.append(item)
-    else:
-        filtered_data = data
-
-    # 进行排序
-    if order_direction == 'asc':
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index])
-    else:
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index], reverse=True)
-
-    # 获取当前页的数据
-    paginated_data = sorted_data
+    (records_total, records_filtered, paginated_data) = monitor_service.get_table_page('heartbeat', begin_date, end_date, start, length, search_value, column_search_dic, order_column, order_direction)
 
     return jsonify({
         "draw": draw,
-        "recordsTotal": len(data),
-        "recordsFiltered": len(filtered_data),
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
         "data": paginated_data
     })
 
@@ -140,37 +115,16 @@ def get_heartbeat_table_data():
 @app.route('/alarm_table_data', methods=['GET'])
 @print_execution_time
 def get_alarm_table_data():
-    draw = request.args.get('draw')
-    search_value = request.args.get('search[value]')
-    order_column_index = int(request.args.get('order[0][column]'))
-    order_direction = request.args.get('order[0][dir]')
+    (draw, start, length, search_value, column_search_dic, order_column, order_direction) = get_table_args()
     begin_date = request.args.get('begin_datetime')
     end_date = request.args.get('end_datetime')
     monitor_service = MonitorService()
-    data = monitor_service.get_all_alarm_table_data(begin_date, end_date)
-    # 进行搜索过滤
-    filtered_data = []
-
-    if search_value:
-        for item in data:
-            if search_value.lower() in str(item.values()).lower():
-                filtered_data.append(item)
-    else:
-        filtered_data = data
-
-    # 进行排序
-    if order_direction == 'asc':
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index])
-    else:
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index], reverse=True)
-
-    # 获取当前页的数据
-    paginated_data = sorted_data
+    (records_total, records_filtered, paginated_data) = monitor_service.get_table_page('alarm', begin_date, end_date, start, length, search_value, column_search_dic, order_column, order_direction)
 
     return jsonify({
         "draw": draw,
-        "recordsTotal": len(data),
-        "recordsFiltered": len(filtered_data),
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
         "data": paginated_data
     })
 
@@ -178,41 +132,75 @@ def get_alarm_table_data():
 @app.route('/log_table_data', methods=['GET'])
 @print_execution_time
 def get_log_table_data():
-    draw = request.args.get('draw')
-    search_value = request.args.get('search[value]')
-    order_column_index = int(request.args.get('order[0][column]'))
-    order_direction = request.args.get('order[0][dir]')
+    (draw, start, length, search_value, column_search_dic, order_column, order_direction) = get_table_args()
     begin_date = request.args.get('begin_datetime')
     end_date = request.args.get('end_datetime')
     monitor_service = MonitorService()
-    data = monitor_service.get_all_log_table_data(begin_date, end_date)
-    # 进行搜索过滤
-    filtered_data = []
-
-    if search_value:
-        for item in data:
-            if search_value.lower() in str(item.values()).lower():
-                filtered_data.append(item)
-    else:
-        filtered_data = data
-
-    # 进行排序
-    if order_direction == 'asc':
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index])
-    else:
-        sorted_data = sorted(filtered_data, key=lambda x: list(x.values())[order_column_index], reverse=True)
-
-    # 获取当前页的数据
-    paginated_data = sorted_data
+    (records_total, records_filtered, paginated_data) = monitor_service.get_table_page('log', begin_date, end_date, start, length, search_value, column_search_dic, order_column, order_direction)
 
     return jsonify({
         "draw": draw,
-        "recordsTotal": len(data),
-        "recordsFiltered": len(filtered_data),
+        "recordsTotal": records_total,
+        "recordsFiltered": records_filtered,
         "data": paginated_data
     })
 
 
+@app.route('/table_column_values', methods=['GET'])
+@print_execution_time
+def get_table_column_values():
+    """
+    Get the options of a column select filter in select2 format, the DataTables arguments of the table give the search and the other column filters.
+    """
+    (draw, start, length, search_value, column_search_dic, order_column, order_direction) = get_table_args()
+    kind = request.args.get('kind')
+    column = request.args.get('column')
+    begin_date = request.args.get('begin_datetime', '')
+    end_date = request.args.get('end_datetime', '')
+    results = []
+    more = False
+
+    if (kind in ['monitor', 'heartbeat', 'alarm', 'log']) and column:
+        monitor_service = MonitorService()
+        (value_list, more) = monitor_service.get_table_column_values(kind, begin_date, end_date, column, request.args.get('term', ''), search_value, column_search_dic, request.args.get('page', 1, type=int))
+        results = [{'id': value, 'text': value} for value in value_list]
+
+    return jsonify({
+        "results": results,
+        "pagination": {"more": more}
+    })
+
+
+@app.route('/overview_data', methods=['GET'])
+def get_overview_data():
+    """
+    Stream the overview page data as ndjson, {"progress": done, "total": total} lines while scanning, then one {"data": overview_data} line.
+    """
+    begin_date = request.args.get('begin_datetime')
+    end_date = request.args.get('end_datetime')
+    granularity = request.args.get('granularity', 'auto')
+    page_length = request.args.get('length', 10, type=int)
+    monitor_service = MonitorService()
+
+    def gen_overview_lines():
+        progress = -1
+
+        for (done_step_num, total_step_num, overview_data) in monitor_service.iter_overview_data(begin_date, end_date, granularity, page_length):
+            if overview_data is not None:
+                for key in ['alarm_chart', 'log_trend_chart', 'heartbeat_trend_chart']:
+                    (categories, series_data) = overview_data[key]
+                    overview_data[key] = {'categories': categories, 'series': series_data}
+
+                overview_data['top_alarms'] = gen_top_alarms_chart_data(overview_data['top_alarms'])
+                yield json.dumps({'data': overview_data}, ensure_ascii=False) + '\n'
+            elif int(done_step_num * 100 / total_step_num) > progress:
+                # At most one progress line per percent.
+                progress = int(done_step_num * 100 / total_step_num)
+                yield json.dumps({'progress': done_step_num, 'total': total_step_num}) + '\n'
+
+    return Response(stream_with_context(gen_overview_lines()), mimetype='application/x-ndjson')
+
+
 @app.route('/', methods=['GET'])
 @print_execution_time
 def monitor_overview():
@@ -229,15 +217,8 @@ def monitor_overview():
     if end_datetime is None or len(end_datetime) == 0:
         end_datetime = current_time.strftime("%Y-%m-%d %H:%M:%S")
 
-    monitor_service = MonitorService()
-    alarm_count = monitor_service.get_alarm_count(begin_datetime, end_datetime)
-    monitor_count = monitor_service.get_monitor_count()
-    error_log_count = monitor_service.get_error_log_count(begin_datetime, end_datetime)
-
+    # The counts are filled by overview.js from /overview_data, so the page is not blocked by scanning.
     return render_template('layouts/overview.html',
-                           alarm_count=alarm_count,
-                           monitor_count=monitor_count,
-                           error_log_count=error_log_count,
                            begin_date_time=begin_datetime,
                            end_date_time=end_datetime)
 
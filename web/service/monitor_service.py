@@ -1,14 +1,74 @@
 import os
 import re
 import sys
-import yaml
+import hmac
 import json
+import heapq
 import logging
+import itertools
+import threading
+import concurrent.futures
 from datetime import datetime, timedelta
 from tools.decorator_helper import print_execution_time
 
 sys.path.append(os.environ['MONITOR_VIEWER_INSTALL_PATH'])
 from config import config
+from common import common_db
+from common import common_monitor
+
+# Default worker number of MonitorService.scan_monitor_items, if scan_worker_num is not set on config.py.
+DEFAULT_SCAN_WORKER_NUM = 8
+# {(executor_type, worker_num): executor}, the pools are kept for the lifetime of the web process.
+SCAN_EXECUTOR_DIC = {}
+SCAN_EXECUTOR_LOCK = threading.Lock()
+
+# Decoded day files are cached in memory for all requests, day_file_cache_size (MB) on config.py, 0 disables the cache.
+common_db.DAY_FILE_CACHE.set_max_size(int(getattr(config, 'day_file_cache_size', common_db.DAY_FILE_CACHE_DEFAULT_MAX_SIZE // (1024 * 1024))) * 1024 * 1024)
+
+# The column select filters of the tables load TABLE_COLUMN_VALUE_LIMIT values per page.
+TABLE_COLUMN_VALUE_LIMIT = 100
+
+# granularity "auto" of the alarm chart counts per hour for ranges up to this long.
+ALARM_CHART_HOURLY_MAX_RANGE = timedelta(days=2)
+
+# Writes the /ingest events for all requests, created on the first request.
+EVENT_HANDLER = None
+EVENT_HANDLER_LOCK = threading.Lock()
+
+
+def get_scan_executor(executor_type, worker_num):
+    """
+    Get the shared thread/process pool for scanning monitor items.
+    """
+    with SCAN_EXECUTOR_LOCK:
+        if (executor_type, worker_num) not in SCAN_EXECUTOR_DIC:
+            if executor_type == 'process':
+                SCAN_EXECUTOR_DIC[(executor_type, worker_num)] = concurrent.futures.ProcessPoolExecutor(max_workers=worker_num, initializer=init_scan_worker, initargs=(common_db.DAY_FILE_CACHE.max_size,))
+            else:
+                SCAN_EXECUTOR_DIC[(executor_type, worker_num)] = concurrent.futures.ThreadPoolExecutor(max_workers=worker_num, thread_name_prefix='scan')
+
+        return SCAN_EXECUTOR_DIC[(executor_type, worker_num)]
+
+
+def init_scan_worker(day_file_cache_size):
+    """
+    Scan worker processes cache day files like the web process.
+    """
+    common_db.DAY_FILE_CACHE.set_max_size(day_file_cache_size)
+
+
+def get_event_handler():
+    """
+    Get the shared EventHandler of /ingest.
+    """
+    global EVENT_HANDLER
+
+    with EVENT_HANDLER_LOCK:
+        if EVENT_HANDLER is None:
+            config_dic = {var: getattr(config, var) for var in dir(config) if not re.match(r'^_.*$', var)}
+            EVENT_HANDLER = common_monitor.EventHandler(config_dic)
+
+        return EVENT_HANDLER
 
 
 class MonitorService:
@@ -23,318 +83,547 @@ class MonitorService:
             logging.warning("direction is None")
             return []
 
-        direction_path = f"{config.db_path}/{direction}"
+        catalog = common_db.get_catalog(config.db_path)
 
-        if not os.path.exists(direction_path):
-            logging.warning(f"direction path not exists: {direction_path}")
+        if direction not in catalog:
+            logging.warning(f"direction path not exists: {config.db_path}/{direction}")
             return []
 
-        if not os.path.isdir(direction_path):
-            logging.warning(f"direction path is not a directory: {direction_path}")
-            return []
+        return list(catalog[direction].keys())
 
-        return os.listdir(direction_path)
+    def get_monitor_item_pair_list(self, direction=None) -> list:
+        """
+        :rtype: list((direction, monitor_item)) of specified direction, or all directions if direction is None.
+        """
+        directions = self.get_direction_list() if direction is None else [direction]
+
+        return [(direction, monitor_item) for direction in directions for monitor_item in self.get_monitor_item_list(direction)]
 
     @print_execution_time
-    def get_logs_trend_data(self, begin_date, end_date):
-        return self.get_monitor_item_list(None)
+    def get_logs_trend_data(self, begin_date, end_date, rollup_list=None):
+        """
+        Count logs per day, stacked by direction and message_level.
+        :rtype: (categories, series_datas)
+        """
+        count_dic = {}
+
+        begin_date = begin_date.strip()
+        end_date = end_date.strip()
+
+        for (direction, monitor_item, date_file_name, rollup_dic) in self.get_rollup_list('log', begin_date, end_date, rollup_list):
+            date = f"{date_file_name[:4]}-{date_file_name[4:6]}-{date_file_name[6:]}"
+
+            for (message_level, count) in rollup_dic['message_level'].items():
+                key = (direction, message_level)
+                count_dic.setdefault(key, {})
+                count_dic[key][date] = count_dic[key].get(date, 0) + count
+
+        categories = self.get_trend_categories(count_dic)
+        series_datas = []
+
+        for (direction, message_level) in count_dic.keys():
+            series_datas.append({
+                'name': f"{direction}-{message_level}",
+                'data': [count_dic[(direction, message_level)].get(category, 0) for category in categories],
+                'stack': direction
+            })
+
+        return categories, series_datas
 
     @print_execution_time
-    def get_top_alarms_per_monitor_item(self, begin_date, end_date):
+    def get_heartbeat_trend_data(self, begin_date, end_date, rollup_list=None):
         """
-        :rtype: list(monitor_item_name, alarm_count)
+        Count heartbeats per day and direction.
+        :rtype: (categories, series_datas)
         """
-        filtered_alarm_data = self.get_all_alarm_table_data(begin_date, end_date)
-        top_alarm_dict = {}
+        count_dic = {}
 
-        for alarm in filtered_alarm_data:
-            if alarm['monitor_item'] not in top_alarm_dict:
-                top_alarm_dict[alarm['monitor_item']] = 1
-            else:
-                top_alarm_dict[alarm['monitor_item']] += 1
+        begin_date = begin_date.strip()
+        end_date = end_date.strip()
 
-        sorted_items = sorted(top_alarm_dict.items(), key=lambda x: x[1], reverse=True)
-        return sorted_items[:10]
+        for (direction, monitor_item, date_file_name, rollup_dic) in self.get_rollup_list('heartbeat', begin_date, end_date, rollup_list):
+            count = rollup_dic['count']
 
-    def get_monitor_chart_data(self, begin_date, end_date):
-        directions = self.get_direction_list()
+            if count:
+                date = f"{date_file_name[:4]}-{date_file_name[4:6]}-{date_file_name[6:]}"
+                count_dic.setdefault(direction, {})
+                count_dic[direction][date] = count_dic[direction].get(date, 0) + count
+
+        categories = self.get_trend_categories(count_dic)
         series_datas = []
 
-        for direction in directions:
-            monitor_items = self.get_monitor_item_list(direction)
+        for direction in count_dic.keys():
             series_datas.append({
                 'name': direction,
-                'data': [len(monitor_items)]
+                'data': [count_dic[direction].get(category, 0) for category in categories]
             })
 
-        return directions, series_datas
+        return categories, series_datas
+
+    def get_rollup_list(self, kind, begin_date, end_date, rollup_list=None):
+        """
+        :rtype: rollup_list if it is specified (rollups collected already), otherwise read the rollups of all monitor items in range.
+        """
+        if rollup_list is not None:
+            return rollup_list
+
+        return common_db.read_rollups(config.db_path, self.get_monitor_item_pair_list(), kind, begin_date, end_date)
+
+    def get_trend_categories(self, count_dic) -> list:
+        """
+        Get continuous "%Y-%m-%d" dates between the first and the last counted date.
+        """
+        date_list = [date for date_count_dic in count_dic.values() for date in date_count_dic.keys()]
+
+        if not date_list:
+            return []
+
+        current_date = datetime.strptime(min(date_list), '%Y-%m-%d')
+        end_date = datetime.strptime(max(date_list), '%Y-%m-%d')
+        categories = []
+
+        while current_date <= end_date:
+            categories.append(current_date.strftime('%Y-%m-%d'))
+            current_date += timedelta(days=1)
+
+        return categories
 
     @print_execution_time
-    def get_alarm_chart_data(self, begin_date, end_date):
-        directions = self.get_direction_list()
-        filtered_alarm_data = self.get_all_alarm_table_data(begin_date, end_date)
-        categories = self.get_all_date(begin_date, end_date)
-        series_datas = []
+    def get_top_alarms_per_monitor_item(self, begin_date, end_date, rollup_list=None):
+        """
+        :rtype: list(monitor_item_name, alarm_count)
+        """
+        top_alarm_dict = {}
 
-        for direction in directions:
-            series_data_single_direction = []
+        for (direction, monitor_item, date_file_name, rollup_dic) in self.get_rollup_list('alarm', begin_date, end_date, rollup_list):
+            if rollup_dic['count']:
+                top_alarm_dict[monitor_item] = top_alarm_dict.get(monitor_item, 0) + rollup_dic['count']
+
+        sorted_items = sorted(top_alarm_dict.items(), key=lambda x: x[1], reverse=True)
+        return sorted_items[:10]
+
+    def ingest_events(self, line_list, ingest_token=''):
+        """
+        Write the ndjson events posted by SaveLog(ingest_url=...), every day file gets one append for the whole batch.
+        Only records are taken unless ingest_token matches ingest_token on config.py, send_alarm/monitor_item events run the alarm command and rewrite monitor_item.yaml.
+        :rtype: (accepted_num, [{"line": line_num, "error": error}, ...])
+        """
+        event_handler = get_event_handler()
+        config_ingest_token = str(getattr(config, 'ingest_token', ''))
+        trusted = bool(config_ingest_token) and hmac.compare_digest(str(ingest_token).encode(), config_ingest_token.encode())
+        accepted_num = 0
+        rejected_list = []
+
+        for (line_num, line) in enumerate(line_list, start=1):
+            if not line.strip():
+                continue
+
+            try:
+                event_handler.handle_event(json.loads(line), flush=False, trusted=trusted)
+                accepted_num += 1
+            except Exception as error:
+                rejected_list.append({'line': line_num, 'error': str(error)})
 
-            for chart_date in categories:
-                alarm_count_per_dir_date = 0
+        event_handler.day_file_writer.flush()
 
-                for alarm in filtered_alarm_data:
-                    alarm_time = alarm['time'].replace('-', '')[:9].strip()
+        if rejected_list:
+            logging.warning(f"{len(rejected_list)} ingested events are rejected, the first one: {rejected_list[0]}")
 
-                    if alarm_time == chart_date and alarm['direction'] == direction:
-                        alarm_count_per_dir_date += 1
+        return accepted_num, rejected_list
 
-                series_data_single_direction.append(alarm_count_per_dir_date)
+    def get_cache_stats(self) -> dict:
+        """
+        :rtype: dict of day file cache hit/miss/extend/eviction counts and size.
+        """
+        return common_db.DAY_FILE_CACHE.get_stats()
+
+    @print_execution_time
+    def get_alarm_chart_data(self, begin_date, end_date, granularity='day', rollup_list=None):
+        """
+        Count alarms per direction and day, or per hour if granularity is "hour" ("auto" means "hour" for short ranges).
+        :rtype: (categories, series_datas)
+        """
+        if granularity == 'auto':
+            begin_time = datetime.strptime(begin_date.strip(), '%Y-%m-%d %H:%M:%S')
+            end_time = datetime.strptime(end_date.strip(), '%Y-%m-%d %H:%M:%S')
+            granularity = 'hour' if (end_time - begin_time <= ALARM_CHART_HOURLY_MAX_RANGE) else 'day'
+
+        directions = self.get_direction_list()
+        count_dic = {}
+        series_datas = []
+
+        if granularity == 'hour':
+            categories = self.get_all_hour(begin_date, end_date)
+
+            # Alarm count per hour, only the record time is needed, so the records are not decoded.
+            for (direction, monitor_item, date_file_name, date_file) in common_db.get_day_file_list(config.db_path, self.get_monitor_item_pair_list(), 'alarm', begin_date.strip(), end_date.strip()):
+                for (time, row) in common_db.iter_day_file_rows(date_file, begin_date.strip(), end_date.strip()):
+                    key = (direction, f"{date_file_name} {time[11:13]}:00")
+                    count_dic[key] = count_dic.get(key, 0) + 1
+        else:
+            categories = self.get_all_date(begin_date, end_date)
 
+            for (direction, monitor_item, date_file_name, rollup_dic) in self.get_rollup_list('alarm', begin_date, end_date, rollup_list):
+                count_dic[(direction, date_file_name)] = count_dic.get((direction, date_file_name), 0) + rollup_dic['count']
+
+        for direction in directions:
             series_datas.append({
                 'name': direction,
-                'data': series_data_single_direction
+                'data': [count_dic.get((direction, chart_date), 0) for chart_date in categories]
             })
 
         return categories, series_datas
 
     @print_execution_time
-    def get_alarm_count(self, begin_date, end_date):
-        return len(self.get_all_alarm_table_data(begin_date, end_date))
+    def get_alarm_count(self, begin_date, end_date, rollup_list=None):
+        return sum(rollup_dic['count'] for (direction, monitor_item, date_file_name, rollup_dic) in self.get_rollup_list('alarm', begin_date, end_date, rollup_list))
 
     @print_execution_time
     def get_monitor_count(self):
         return len(self.get_monitor_table_data())
 
     @print_execution_time
-    def get_error_log_count(self, begin_date, end_date):
-        all_logs = self.get_all_log_table_data(begin_date, end_date)
+    def get_error_log_count(self, begin_date, end_date, rollup_list=None):
         error_log_count = 0
 
-        for log in all_logs:
-            if log['message_level'] == 'Error':
-                error_log_count += 1
+        for (direction, monitor_item, date_file_name, rollup_dic) in self.get_rollup_list('log', begin_date, end_date, rollup_list):
+            error_log_count += rollup_dic['message_level'].get('Error', 0)
 
         return error_log_count
 
+    def iter_overview_data(self, begin_date, end_date, granularity='auto', page_length=10):
+        """
+        Collect everything of the overview page with one scan over the day files in range.
+        Yield (done_step_num, total_step_num, None) as the scan goes on, finally (total_step_num, total_step_num, overview_data).
+        """
+        begin_date = begin_date.strip()
+        end_date = end_date.strip()
+        monitor_item_pair_list = self.get_monitor_item_pair_list()
+        day_file_list_dic = {kind: common_db.get_day_file_list(config.db_path, monitor_item_pair_list, kind, begin_date, end_date) for kind in common_db.KIND_LIST}
+        table_kind_list = ['monitor'] + common_db.KIND_LIST
+        total_step_num = sum(len(day_file_list) for day_file_list in day_file_list_dic.values()) + len(table_kind_list)
+        done_step_num = 0
+        rollup_list_dic = {}
+
+        for (kind, day_file_list) in day_file_list_dic.items():
+            rollup_list_dic[kind] = []
+
+            for (direction, monitor_item, date_file_name, date_file) in day_file_list:
+                rollup_list_dic[kind].append((direction, monitor_item, date_file_name, common_db.get_day_file_rollup(date_file, kind, begin_date, end_date)))
+                done_step_num += 1
+                yield done_step_num, total_step_num, None
+
+        table_dic = {}
+
+        for kind in table_kind_list:
+            if kind == 'monitor':
+                (records_total, records_filtered, page_data) = self.get_monitor_table_page(0, page_length)
+            else:
+                # The rollups already counted the day files, only the first page is read.
+                count_list = [rollup_dic['count'] for (direction, monitor_item, date_file_name, rollup_dic) in rollup_list_dic[kind]]
+                (records_total, records_filtered, page_data) = self.get_table_page(kind, begin_date, end_date, 0, page_length, day_file_list=day_file_list_dic[kind], count_list=count_list)
+
+            table_dic[kind] = {'recordsTotal': records_total, 'recordsFiltered': records_filtered, 'data': page_data}
+            done_step_num += 1
+            yield done_step_num, total_step_num, None
+
+        overview_data = {
+            'monitor_count': table_dic['monitor']['recordsTotal'],
+            'alarm_count': self.get_alarm_count(begin_date, end_date, rollup_list_dic['alarm']),
+            'error_log_count': self.get_error_log_count(begin_date, end_date, rollup_list_dic['log']),
+            'heartbeat_count': sum(rollup_dic['count'] for (direction, monitor_item, date_file_name, rollup_dic) in rollup_list_dic['heartbeat']),
+            'alarm_chart': self.get_alarm_chart_data(begin_date, end_date, granularity, rollup_list_dic['alarm']),
+            'top_alarms': self.get_top_alarms_per_monitor_item(begin_date, end_date, rollup_list_dic['alarm']),
+            'log_trend_chart': self.get_logs_trend_data(begin_date, end_date, rollup_list_dic['log']),
+            'heartbeat_trend_chart': self.get_heartbeat_trend_data(begin_date, end_date, rollup_list_dic['heartbeat']),
+            'tables': table_dic,
+        }
+
+        yield total_step_num, total_step_num, overview_data
+
     @print_execution_time
     def get_all_log_table_data(self, begin_date, end_date):
-        directions = self.get_direction_list()
-        monitor_items = {}
-        log_table_data = []
+        return self.scan_monitor_items(self.get_log_table_data, begin_date, end_date)
 
-        for direction in directions:
-            monitor_items[direction] = self.get_monitor_item_list(direction)
+    @print_execution_time
+    def get_all_alarm_table_data(self, begin_date, end_date):
+        return self.scan_monitor_items(self.get_alarm_table_data, begin_date, end_date)
 
-            for monitor_item in monitor_items[direction]:
-                log_data = self.get_log_table_data(begin_date, end_date, direction, monitor_item)
-                log_table_data.extend(log_data)
+    @print_execution_time
+    def get_all_heartbeat_table_data(self, begin_date, end_date):
+        return self.scan_monitor_items(self.get_heartbeat_table_data, begin_date, end_date)
 
-        return log_table_data
+    def scan_monitor_items(self, scan_function, begin_date, end_date, monitor_item_pair_list=None, worker_num=None, executor_type=None):
+        """
+        Call scan_function(begin_date, end_date, direction, monitor_item) for every monitor item and chain the results in monitor item order.
+        The monitor items are scanned concurrently by config.scan_worker_num workers, scanning is mostly waiting on db_path I/O, so threads are used by default.
+        config.scan_executor = "process" decodes the records in worker processes instead, for CPU bound scanning on local disks.
+        :rtype: list
+        """
+        if monitor_item_pair_list is None:
+            monitor_item_pair_list = self.get_monitor_item_pair_list()
 
-    @print_execution_time
-    def get_all_alarm_table_data(self, begin_date, end_date):
-        directions = self.get_direction_list()
-        monitor_items = {}
-        alarm_table_data = []
+        if worker_num is None:
+            worker_num = getattr(config, 'scan_worker_num', DEFAULT_SCAN_WORKER_NUM)
 
-        for direction in directions:
-            monitor_items[direction] = self.get_monitor_item_list(direction)
+        if executor_type is None:
+            executor_type = getattr(config, 'scan_executor', 'thread')
 
-            for monitor_item in monitor_items[direction]:
-                alarm_data = self.get_alarm_table_data(begin_date, end_date, direction, monitor_item)
-                alarm_table_data.extend(alarm_data)
+        if (worker_num <= 1) or (len(monitor_item_pair_list) <= 1):
+            result_list = [scan_function(begin_date, end_date, direction, monitor_item) for (direction, monitor_item) in monitor_item_pair_list]
+        else:
+            executor = get_scan_executor(executor_type, worker_num)
+            future_list = [executor.submit(scan_function, begin_date, end_date, direction, monitor_item) for (direction, monitor_item) in monitor_item_pair_list]
+            result_list = [future.result() for future in future_list]
 
-        return alarm_table_data
+        return list(itertools.chain.from_iterable(result_list))
 
     @print_execution_time
-    def get_all_heartbeat_table_data(self, begin_date, end_date):
-        directions = self.get_direction_list()
-        monitor_items = {}
+    def get_heartbeat_table_data(self, begin_datetime, end_datetime, direction, monitor_item):
         heartbeat_table_data = []
 
-        for direction in directions:
-            monitor_items[direction] = self.get_monitor_item_list(direction)
+        if direction not in config.valid_direction_dic:
+            return heartbeat_table_data
 
-            for monitor_item in monitor_items[direction]:
-                heartbeat_data = self.get_heartbeat_table_data(begin_date, end_date, direction, monitor_item)
-                heartbeat_table_data.extend(heartbeat_data)
+        for (direction, monitor_item, heartbeat_info_dic) in common_db.read_records(config.db_path, [(direction, monitor_item)], 'heartbeat', begin_datetime, end_datetime):
+            heartbeat_info_dic.setdefault('direction', direction)
+            heartbeat_info_dic.setdefault('monitor_item', monitor_item)
+            heartbeat_table_data.append(heartbeat_info_dic)
 
         return heartbeat_table_data
 
     @print_execution_time
-    def get_heartbeat_table_data(self, begin_datetime, end_datetime, direction, monitor_item):
-        begin_date = begin_datetime[:11].replace('-', '')
-        end_date = end_datetime[:11].replace('-', '')
-        heartbeat_table_data = []
+    def get_log_table_data(self, begin_datetime, end_datetime, direction, monitor_item):
+        log_table_data = []
 
         if direction not in config.valid_direction_dic:
-            return heartbeat_table_data
+            return log_table_data
 
-        if not os.path.exists(f"{config.db_path}/{direction}/{monitor_item}/heartbeat"):
-            return heartbeat_table_data
+        for (direction, monitor_item, log_info_dic) in common_db.read_records(config.db_path, [(direction, monitor_item)], 'log', begin_datetime, end_datetime):
+            log_info_dic['message'] = re.sub(r'\n', '; ', log_info_dic['message'])
+            log_info_dic.setdefault('direction', direction)
+            log_info_dic.setdefault('monitor_item', monitor_item)
+            log_table_data.append(log_info_dic)
 
-        for date_file_name in os.listdir(f"{config.db_path}/{direction}/{monitor_item}/heartbeat"):
-            if ((begin_datetime is not None and self.compare_date(date_file_name, begin_date) == -1) or
-                    (end_datetime is not None and self.compare_date(date_file_name, end_date) == 1) or
-                    not re.match(r'^\d{8}$', date_file_name)):
+        return log_table_data
 
-                continue
+    @print_execution_time
+    def get_alarm_table_data(self, begin_datetime, end_datetime, direction, monitor_item):
+        alarm_table_data = []
 
-            with open(f"{config.db_path}/{direction}/{monitor_item}/heartbeat/{date_file_name}", 'r') as f:
-                for line in f.readlines():
-                    heartbeat_info_dic = json.loads(line.strip())
-                    time = heartbeat_info_dic['time']
+        if direction not in config.valid_direction_dic:
+            return alarm_table_data
 
-                    if self.compare_time(time, begin_datetime) == -1:
-                        continue
+        for (direction, monitor_item, alarm_info_dic) in common_db.read_records(config.db_path, [(direction, monitor_item)], 'alarm', begin_datetime, end_datetime):
+            alarm_info_dic['message'] = re.sub(r'\n', '; ', alarm_info_dic['message'])
+            alarm_info_dic.setdefault('direction', direction)
+            alarm_info_dic.setdefault('monitor_item', monitor_item)
+            alarm_table_data.append(alarm_info_dic)
 
-                    if self.compare_time(time, end_datetime) == 1:
-                        continue
+        return alarm_table_data
 
-                    heartbeat_info_dic.setdefault('direction', direction)
-                    heartbeat_info_dic.setdefault('monitor_item', monitor_item)
-                    heartbeat_table_data.append(heartbeat_info_dic)
+    @print_execution_time
+    def get_table_page(self, kind, begin_datetime, end_datetime, start=0, length=-1, search_value='', column_search_dic=None, order_column=None, order_direction='asc', day_file_list=None, count_list=None):
+        """
+        Get one DataTables page of log/alarm/heartbeat records.
+        length=-1 means all records from start.
+        day_file_list/count_list are the day files in range and their record numbers if already known (like the rollup counts), so the day files are not counted again.
+        :rtype: (records_total, records_filtered, page_data)
+        """
+        begin_datetime = begin_datetime.strip()
+        end_datetime = end_datetime.strip()
 
-        return heartbeat_table_data
+        if day_file_list is None:
+            day_file_list = common_db.get_day_file_list(config.db_path, self.get_monitor_item_pair_list(), kind, begin_datetime, end_datetime)
 
-    @print_execution_time
-    def get_log_table_data(self, begin_datetime, end_datetime, direction, monitor_item):
-        begin_date = begin_datetime[:11].replace('-', '')
-        end_date = end_datetime[:11].replace('-', '')
-        log_table_data = []
+        if search_value or column_search_dic or (order_column not in [None, 'time']):
+            return self.get_sorted_table_page(kind, day_file_list, begin_datetime, end_datetime, start, length, search_value, column_search_dic, order_column, order_direction)
 
-        if direction not in config.valid_direction_dic:
-            return log_table_data
+        # Records are appended in time order, so counting lines is enough to locate the page.
+        if count_list is None:
+            count_list = [common_db.count_day_file_records(date_file, begin_datetime, end_datetime) for (direction, monitor_item, date_file_name, date_file) in day_file_list]
 
-        if not os.path.exists(f"{config.db_path}/{direction}/{monitor_item}/log"):
-            return log_table_data
+        records_total = sum(count_list)
+        page_begin = min(start, records_total)
+        page_end = records_total if length < 0 else min(start + length, records_total)
+
+        if order_direction == 'desc':
+            (page_begin, page_end) = (records_total - page_end, records_total - page_begin)
+
+        page_data = []
+        position = 0
+        index = 0
+
+        for (date_file_name, day_file_group) in itertools.groupby(day_file_list, key=lambda x: x[2]):
+            day_file_group = list(day_file_group)
+            day_count = sum(count_list[index:index + len(day_file_group)])
+            index += len(day_file_group)
 
-        for date_file_name in os.listdir(f"{config.db_path}/{direction}/{monitor_item}/log"):
-            if ((begin_datetime is not None and self.compare_date(date_file_name, begin_date) == -1) or
-                    (end_datetime is not None and self.compare_date(date_file_name, end_date) == 1) or
-                    not re.match(r'^\d{8}$', date_file_name)):
+            if position >= page_end:
+                break
 
+            if position + day_count <= page_begin:
+                position += day_count
                 continue
 
-            with open(f"{config.db_path}/{direction}/{monitor_item}/log/{date_file_name}", 'r') as f:
-                for line in f.readlines():
-                    log_info_dic = json.loads(line.strip())
-                    time = log_info_dic['time']
+            # Merge the day files of all monitor items by time, only decode the records on the page.
+            row_iter_list = []
 
-                    if self.compare_time(time, begin_datetime) == -1:
-                        continue
+            for (direction, monitor_item, date_file_name, date_file) in day_file_group:
+                row_iter_list.append(((time, direction, monitor_item, row) for (time, row) in common_db.iter_day_file_rows(date_file, begin_datetime, end_datetime)))
 
-                    if self.compare_time(time, end_datetime) == 1:
-                        continue
+            for (time, direction, monitor_item, row) in heapq.merge(*row_iter_list, key=lambda x: x[0]):
+                if position >= page_begin:
+                    page_data.append(self.gen_table_record(kind, row, direction, monitor_item))
 
-                    log_info_dic['message'] = re.sub(r'\n', '; ', log_info_dic['message'])
-                    log_info_dic.setdefault('direction', direction)
-                    log_info_dic.setdefault('monitor_item', monitor_item)
-                    log_table_data.append(log_info_dic)
+                position += 1
 
-        return log_table_data
+                if position >= page_end:
+                    break
+
+        if order_direction == 'desc':
+            page_data.reverse()
+
+        return records_total, records_total, page_data
+
+    def get_sorted_table_page(self, kind, day_file_list, begin_datetime, end_datetime, start, length, search_value, column_search_dic, order_column, order_direction):
+        """
+        Search and sort all records in range, only keep the records up to the requested page.
+        """
+        count_dic = {'total': 0, 'filtered': 0}
+        order_column = order_column or 'time'
+
+        def iter_filtered_records():
+            for record in self.iter_table_records(kind, day_file_list, begin_datetime, end_datetime):
+                count_dic['total'] += 1
+
+                if self.match_table_record(record, search_value, column_search_dic):
+                    count_dic['filtered'] += 1
+                    yield record
+
+        def sort_key(record):
+            return str(record.get(order_column, ''))
+
+        if length < 0:
+            sorted_data = sorted(iter_filtered_records(), key=sort_key, reverse=(order_direction == 'desc'))
+        elif order_direction == 'desc':
+            sorted_data = heapq.nlargest(start + length, iter_filtered_records(), key=sort_key)
+        else:
+            sorted_data = heapq.nsmallest(start + length, iter_filtered_records(), key=sort_key)
+
+        return count_dic['total'], count_dic['filtered'], sorted_data[start:]
+
+    def iter_table_records(self, kind, day_file_list, begin_datetime, end_datetime):
+        for (direction, monitor_item, date_file_name, date_file) in day_file_list:
+            for (time, row) in common_db.iter_day_file_rows(date_file, begin_datetime, end_datetime, cache=True):
+                yield self.gen_table_record(kind, row, direction, monitor_item)
 
     @print_execution_time
-    def get_alarm_table_data(self, begin_datetime, end_datetime, direction, monitor_item):
-        begin_date = begin_datetime[:11].replace('-', '')
-        end_date = end_datetime[:11].replace('-', '')
-        alarm_table_data = []
+    def get_table_column_values(self, kind, begin_datetime, end_datetime, column, term='', search_value='', column_search_dic=None, page=1, limit=TABLE_COLUMN_VALUE_LIMIT):
+        """
+        Get the distinct values of a table column for its select filter, from the records matching the search and the filters of the other columns.
+        kind is log/alarm/heartbeat or "monitor" for the monitor item table, only the values containing term are taken.
+        :rtype: (value_list, more), value_list is the sorted values of page (limit values per page), more tells if there are more pages.
+        """
+        column_search_dic = {key: value for (key, value) in (column_search_dic or {}).items() if key != column}
+        value_set = set()
 
-        if direction not in config.valid_direction_dic:
-            return alarm_table_data
+        if kind == 'monitor':
+            record_iter = self.get_monitor_table_data()
+        else:
+            (begin_datetime, end_datetime) = (begin_datetime.strip(), end_datetime.strip())
+            day_file_list = common_db.get_day_file_list(config.db_path, self.get_monitor_item_pair_list(), kind, begin_datetime, end_datetime)
+            record_iter = self.iter_table_records(kind, day_file_list, begin_datetime, end_datetime)
 
-        if not os.path.exists(f"{config.db_path}/{direction}/{monitor_item}/alarm"):
-            return alarm_table_data
+        for record in record_iter:
+            if self.match_table_record(record, search_value, column_search_dic):
+                value = str(record.get(column, ''))
 
-        for date_file_name in os.listdir(f"{config.db_path}/{direction}/{monitor_item}/alarm"):
-            if ((begin_datetime is not None and self.compare_date(date_file_name, begin_date) == -1) or
-                    (end_datetime is not None and self.compare_date(date_file_name, end_date) == 1) or
-                    not re.match(r'^\d{8}$', date_file_name)):
+                if term.lower() in value.lower():
+                    value_set.add(value)
 
-                continue
+        value_list = sorted(value_set)
+        start = (max(page, 1) - 1) * limit
 
-            with open(f"{config.db_path}/{direction}/{monitor_item}/alarm/{date_file_name}", 'r') as f:
-                for line in f.readlines():
-                    alarm_info_dic = json.loads(line.strip())
-                    time = alarm_info_dic['time']
+        return value_list[start:start + limit], len(value_list) > start + limit
 
-                    if self.compare_time(time, begin_datetime) == -1:
-                        continue
+    def match_table_record(self, record, search_value, column_search_dic) -> bool:
+        if search_value and (search_value.lower() not in str(record.values()).lower()):
+            return False
 
-                    if self.compare_time(time, end_datetime) == 1:
-                        continue
+        if column_search_dic:
+            for (column, column_search_value) in column_search_dic.items():
+                if column_search_value.lower() not in str(record.get(column, '')).lower():
+                    return False
 
-                    alarm_info_dic['message'] = re.sub(r'\n', '; ', alarm_info_dic['message'])
-                    alarm_info_dic.setdefault('direction', direction)
-                    alarm_info_dic.setdefault('monitor_item', monitor_item)
-                    alarm_table_data.append(alarm_info_dic)
+        return True
 
-        return alarm_table_data
+    def gen_table_record(self, kind, row, direction, monitor_item) -> dict:
+        record = common_db.decode_row(row)
+
+        if kind in ['log', 'alarm']:
+            record['message'] = re.sub(r'\n', '; ', record['message'])
+
+        record.setdefault('direction', direction)
+        record.setdefault('monitor_item', monitor_item)
+
+        return record
+
+    @print_execution_time
+    def get_monitor_table_page(self, start=0, length=-1, search_value='', column_search_dic=None, order_column=None, order_direction='asc'):
+        """
+        Get one DataTables page of monitor items.
+        :rtype: (records_total, records_filtered, page_data)
+        """
+        data = self.get_monitor_table_data()
+        filtered_data = [item for item in data if self.match_table_record(item, search_value, column_search_dic)]
+
+        if order_column:
+            filtered_data = sorted(filtered_data, key=lambda x: str(x.get(order_column, '')), reverse=(order_direction == 'desc'))
+
+        if length < 0:
+            page_data = filtered_data[start:]
+        else:
+            page_data = filtered_data[start:start + length]
+
+        return len(data), len(filtered_data), page_data
 
     @print_execution_time
     def get_monitor_table_data(self):
         monitor_table_data = []
+        catalog = common_db.get_catalog(config.db_path)
 
         for direction in config.valid_direction_dic.keys():
-            if not os.path.exists(f"{config.db_path}/{direction}"):
-                continue
-
-            for monitor_item in os.listdir(f"{config.db_path}/{direction}"):
-                if not os.path.exists(f"{config.db_path}/{direction}/{monitor_item}/monitor_item.yaml"):
+            for (monitor_item, monitor_info) in catalog.get(direction, {}).items():
+                if monitor_info is None:
                     continue
 
-                with open(f"{config.db_path}/{direction}/{monitor_item}/monitor_item.yaml", 'r') as f:
-                    monitor_info = yaml.load(f, Loader=yaml.FullLoader)
-                    monitor_item_data = {}
+                monitor_item_data = {}
 
-                    if 'direction_admin' in monitor_info.keys():
-                        monitor_item_data['admin'] = monitor_info['direction_admin']
+                if 'direction_admin' in monitor_info.keys():
+                    monitor_item_data['admin'] = monitor_info['direction_admin']
 
-                    if 'script_startup_method' in monitor_info.keys():
-                        monitor_item_data['startup'] = monitor_info['script_startup_method']
+                if 'script_startup_method' in monitor_info.keys():
+                    monitor_item_data['startup'] = monitor_info['script_startup_method']
 
-                    if 'script_startup_host' in monitor_info.keys():
-                        monitor_item_data['host'] = monitor_info['script_startup_host']
+                if 'script_startup_host' in monitor_info.keys():
+                    monitor_item_data['host'] = monitor_info['script_startup_host']
 
-                    if 'script_execute_frequency' in monitor_info.keys():
-                        monitor_item_data['exec_frequency'] = monitor_info['script_execute_frequency']
+                if 'script_execute_frequency' in monitor_info.keys():
+                    monitor_item_data['exec_frequency'] = monitor_info['script_execute_frequency']
 
-                    if 'alarm_frequency' in monitor_info.keys():
-                        monitor_item_data['alarm_frequency'] = monitor_info['alarm_frequency']
+                if 'alarm_frequency' in monitor_info.keys():
+                    monitor_item_data['alarm_frequency'] = monitor_info['alarm_frequency']
 
-                    if 'script_path' in monitor_info.keys():
-                        monitor_item_data['script'] = monitor_info['script_path'] + '.'
+                if 'script_path' in monitor_info.keys():
+                    monitor_item_data['script'] = monitor_info['script_path'] + '.'
 
-                    monitor_item_data['direction'] = direction
-                    monitor_item_data['item'] = monitor_item
-                    monitor_table_data.append(monitor_item_data)
+                monitor_item_data['direction'] = direction
+                monitor_item_data['item'] = monitor_item
+                monitor_table_data.append(monitor_item_data)
 
         return monitor_table_data
 
-    def compare_time(self, time1, time2) -> int:
-        date_time1 = datetime.strptime(time1.strip(), '%Y-%m-%d %H:%M:%S')
-        date_time2 = datetime.strptime(time2.strip(), '%Y-%m-%d %H:%M:%S')
-
-        # 比较两个 datetime 对象的大小
-        if date_time1 < date_time2:
-            return -1
-        elif date_time1 > date_time2:
-            return 1
-        else:
-            return 0
-
-    def compare_date(self, date1, date2) -> int:
-        date_time1 = datetime.strptime(date1.strip(), '%Y%m%d')
-        date_time2 = datetime.strptime(date2.strip(), '%Y%m%d')
-
-        # 比较两个 datetime 对象的大小
-        if date_time1 < date_time2:
-            return -1
-        elif date_time1 > date_time2:
-            return 1
-        else:
-            return 0
-
     def get_all_date(self, begin_datetime, end_datetime):
         begin_time = datetime.strptime(begin_datetime.strip(), '%Y-%m-%d %H:%M:%S')
         end_time = datetime.strptime(end_datetime.strip(), '%Y-%m-%d %H:%M:%S')
@@ -347,3 +636,15 @@ class MonitorService:
             current_date += timedelta(days=1)
 
         return dates
+
+    def get_all_hour(self, begin_datetime, end_datetime):
+        begin_time = datetime.strptime(begin_datetime.strip(), '%Y-%m-%d %H:%M:%S').replace(minute=0, second=0)
+        end_time = datetime.strptime(end_datetime.strip(), '%Y-%m-%d %H:%M:%S')
+        hours = []
+        current_time = begin_time
+
+        while current_time <= end_time:
+            hours.append(current_time.strftime("%Y%m%d %H:00"))
+            current_time += timedelta(hours=1)
+
+        return hours
@@ -1,13 +1,13 @@
+// The server scan of /overview_data counts SCAN_PROGRESS_WEIGHT of the progress bar, rendering the charts and tables counts the rest.
+const SCAN_PROGRESS_WEIGHT = 0.8;
+let page_progress = {scan: 0, ready: 0, ready_total: 8};
+
 $(document).ready(async function () {
     start_page_loading();
 
     init_datetime_picker();
 
-    init_table_data();
-
-    init_chart();
-
-    is_data_ready();
+    load_overview_data();
 });
 
 window.onbeforeunload = function() {
@@ -15,49 +15,91 @@ window.onbeforeunload = function() {
 };
 
 function start_page_loading() {
-    localStorage.setItem("progress", 0)
-
-    let progressBar = document.getElementById('progress-bar');
-    progressBar.style.width = 0 + '%';
-    progressBar.setAttribute('aria-valuenow', 0);
+    page_progress.scan = 0;
+    page_progress.ready = 0;
+    set_progress_bar(0);
 
     document.getElementById('loading').style.display = 'block';
     document.body.insertAdjacentHTML('beforeend', '<div class="overlay"></div>');
 }
 
-function is_data_ready() {
-    let totalData = 8;
-    let dataLoaded = parseInt(localStorage.getItem("progress"));
+function set_progress_bar(progress) {
     let progressBar = document.getElementById('progress-bar');
-    let progress = (dataLoaded / totalData) * 100;
     progressBar.style.width = progress + '%';
     progressBar.setAttribute('aria-valuenow', progress);
-    console.log(progress)
+}
+
+function update_page_progress() {
+    let progress = (page_progress.scan * SCAN_PROGRESS_WEIGHT + (page_progress.ready / page_progress.ready_total) * (1 - SCAN_PROGRESS_WEIGHT)) * 100;
+    set_progress_bar(progress);
 
     // 检查是否加载完成
-    if (dataLoaded < totalData) {
-        // 如果还未加载完所有数据，则继续加载
-        setTimeout(is_data_ready, 50); // 模拟加载延迟
-    } else {
+    if (page_progress.ready >= page_progress.ready_total) {
         document.getElementById('loading').style.display = 'none';
         document.querySelector('.overlay').remove();
     }
 }
 
-function init_chart() {
-    $.get('/alarm_chart_data?begin_datetime=' + $('#begin_datetime').val() + '&end_datetime=' + $('#end_datetime').val(), function (response) {
-        init_alarm_chart(response.categories, response.series)
-    }).fail(function (xhr, status, error) {
-        console.error('Error:', status, error);
-    });
+function load_overview_data() {
+    let url = '/overview_data?begin_datetime=' + $('#begin_datetime').val() + '&end_datetime=' + $('#end_datetime').val() + '&granularity=auto';
+
+    // The response is ndjson, progress lines while the server is scanning, then the data line.
+    fetch(url).then(async function (response) {
+        let reader = response.body.getReader();
+        let decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            let {done, value} = await reader.read();
 
-    $.get('/top_alarms_per_monitor_item?begin_datetime=' + $('#begin_datetime').val() + '&end_datetime=' + $('#end_datetime').val(), function (response) {
-        init_monitor_chart(response.categories, response.series)
-    }).fail(function (xhr, status, error) {
-        console.error('Error:', status, error);
+            if (done) {
+                break;
+            }
+
+            buffer += decoder.decode(value, {stream: true});
+            let lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(function (line) {
+                if (line.length !== 0) {
+                    on_overview_message(JSON.parse(line));
+                }
+            });
+        }
+    }).catch(function (error) {
+        console.error('Error:', error);
+        page_progress.ready = page_progress.ready_total;
+        update_page_progress();
     });
 }
 
+function on_overview_message(message) {
+    if (message.data === undefined) {
+        page_progress.scan = message.progress / message.total;
+        update_page_progress();
+        return;
+    }
+
+    let overview_data = message.data;
+    page_progress.scan = 1;
+    update_page_progress();
+
+    $('#card-total-monitor-count').text('Total Monitor: ' + overview_data.monitor_count);
+    $('#card-total-alarm-count').text('Total Alarm: ' + overview_data.alarm_count);
+    $('#card-total-error-log-count').text('Total Error Log: ' + overview_data.error_log_count);
+    $('#total-heartbeat-count-p').text('Total Heartbeat: ' + overview_data.heartbeat_count);
+
+    init_table_data(overview_data.tables);
+
+    init_chart(overview_data);
+}
+
+function init_chart(overview_data) {
+    init_alarm_chart(overview_data.alarm_chart.categories, overview_data.alarm_chart.series);
+    init_monitor_chart(overview_data.top_alarms.categories, overview_data.top_alarms.series);
+    init_log_trend_chart(overview_data.log_trend_chart.categories, overview_data.log_trend_chart.series);
+    init_heartbeat_trend_chart(overview_data.heartbeat_trend_chart.categories, overview_data.heartbeat_trend_chart.series);
+}
+
 function init_datetime_picker() {
     var currentDate = new Date();
     var currentFormattedDate = currentDate.getFullYear() + '-' +
@@ -123,25 +165,37 @@ function init_datetime_picker() {
     });
 }
 
-function init_table_data() {
+function gen_table_ajax(url, first_page) {
+    // The first page comes with /overview_data, the later draws are requested from url.
+    return function (d, callback, settings) {
+        if (first_page) {
+            first_page.draw = d.draw;
+            callback(first_page);
+            first_page = null;
+            return;
+        }
+
+        d.start = d.start || 0;  // 初始记录索引
+        d.length = d.length || 10;  // 页面大小
+        d.draw = d.draw || 1;  // 绘制计数器
+        d.search = d.search || '';  // 搜索值
+        d.order = d.order || [{'column': 0, 'dir': 'asc'}];  // 排序
+        d.begin_datetime = $('#begin_datetime').val();
+        d.end_datetime = $('#end_datetime').val();
+
+        $.get(url, d, callback).fail(function (xhr, status, error) {
+            console.error('Error:', status, error);
+        });
+    };
+}
+
+function init_table_data(table_dic) {
     let monitor_table = $('#monitor-details-table').DataTable({
         responsive: true,
         "processing": true,
-        "serverSide": false,
+        "serverSide": true,
         ordering: false,
-        "ajax": {
-            "url": "/monitor_table_data",
-            "type": "GET",
-            "data": function (d) {
-                d.start = d.start || 0;  // 初始记录索引
-                d.length = d.length || 10;  // 页面大小
-                d.draw = d.draw || 1;  // 绘制计数器
-                d.search = d.search || '';  // 搜索值
-                d.order = d.order || [{'column': 0, 'dir': 'asc'}];  // 排序
-                d.begin_datetime = $('#begin_datetime').val();
-                d.end_datetime = $('#end_datetime').val();
-            }
-        },
+        "ajax": gen_table_ajax("/monitor_table_data", table_dic.monitor),
         "columns": [
             {"data": "direction"},
             {"data": "admin"},
@@ -167,10 +221,8 @@ function init_table_data() {
             "search": "Key Words:"
         },
         "initComplete": function () {
-            var current_table = $('#monitor-details-table').DataTable();
             var api = this.api();
-            bind_select_in_column(api);
-            bind_input_filter_out_of_table(api, current_table);
+            bind_select_in_column(api, 'monitor');
             // mark done
             i_am_ready();
         }
@@ -179,21 +231,9 @@ function init_table_data() {
     let alarm_table = $('#alarm-details-table').DataTable({
         responsive: true,
         "processing": true,
-        "serverSide": false,
+        "serverSide": true,
         ordering: false,
-        "ajax": {
-            "url": "/alarm_table_data",
-            "type": "GET",
-            "data": function (d) {
-                d.start = d.start || 0;  // 初始记录索引
-                d.length = d.length || 10;  // 页面大小
-                d.draw = d.draw || 1;  // 绘制计数器
-                d.search = d.search || '';  // 搜索值
-                d.order = d.order || [{'column': 0, 'dir': 'asc'}];  // 排序
-                d.begin_datetime = $('#begin_datetime').val();
-                d.end_datetime = $('#end_datetime').val();
-            }
-        },
+        "ajax": gen_table_ajax("/alarm_table_data", table_dic.alarm),
         "columns": [
             {"data": "direction"},
             {"data": "monitor_item"},
@@ -215,10 +255,8 @@ function init_table_data() {
             "search": "Key Words:"
         },
         "initComplete": function () {
-            var current_table = $('#alarm-details-table').DataTable();
             var api = this.api();
-            bind_select_in_column(api);
-            bind_input_filter_out_of_table(api, current_table);
+            bind_select_in_column(api, 'alarm');
             // mark done
             i_am_ready();
         },
@@ -226,21 +264,9 @@ function init_table_data() {
 
     let heartbeat_table = $('#heartbeat-details-table').DataTable({
         processing: true,
-        serverSide: false,
+        serverSide: true,
         ordering: false,
-        ajax: {
-            "url": "/heartbeat_table_data",
-            "type": "GET",
-            "data": function (d) {
-                d.start = d.start || 0;  // 初始记录索引
-                d.length = d.length || 10;  // 页面大小
-                d.draw = d.draw || 1;  // 绘制计数器
-                d.search = d.search || '';  // 搜索值
-                d.order = d.order || [{'column': 0, 'dir': 'asc'}];  // 排序
-                d.begin_datetime = $('#begin_datetime').val();
-                d.end_datetime = $('#end_datetime').val();
-            }
-        },
+        ajax: gen_table_ajax("/heartbeat_table_data", table_dic.heartbeat),
         "columns": [
             {"data": "direction"},
             {"data": "monitor_item"},
@@ -263,20 +289,9 @@ function init_table_data() {
             "search": "Key Words:"
         },
         "initComplete": function () {
-            let current_table = $('#heartbeat-details-table').DataTable();
             let api = this.api();
-            bind_select_in_column(api);
-            bind_input_filter_out_of_table(api, current_table);
-            $("#total-heartbeat-count-p").text("Total Heartbeat: " + api.column(0).data().length)
-
-            // get and format table data
-            let heartbeat_table_data = current_table.rows().data();
-            let heartbeat_table_records = [];
-            heartbeat_table_data.each(function (item) {
-                heartbeat_table_records.push(item);
-            });
-            let chart_data = get_heartbeat_trend_data_from_table(heartbeat_table_records)
-            init_heartbeat_trend_chart(chart_data.categories, chart_data.series_data);
+            bind_select_in_column(api, 'heartbeat');
+            $("#total-heartbeat-count-p").text("Total Heartbeat: " + api.page.info().recordsTotal)
             // mark done
             i_am_ready();
         },
@@ -284,21 +299,9 @@ function init_table_data() {
 
     let log_table = $('#log-details-table').DataTable({
         "processing": true,
-        "serverSide": false,
+        "serverSide": true,
         ordering: false,
-        "ajax": {
-            "url": "/log_table_data",
-            "type": "GET",
-            "data": function (d) {
-                d.start = d.start || 0;  // 初始记录索引
-                d.length = d.length || 10;  // 页面大小
-                d.draw = d.draw || 1;  // 绘制计数器
-                d.search = d.search || '';  // 搜索值
-                d.order = d.order || [{'column': 0, 'dir': 'asc'}];  // 排序
-                d.begin_datetime = $('#begin_datetime').val();
-                d.end_datetime = $('#end_datetime').val();
-            }
-        },
+        "ajax": gen_table_ajax("/log_table_data", table_dic.log),
         "columns": [
             {"data": "direction"},
             {"data": "monitor_item"},
@@ -319,20 +322,8 @@ function init_table_data() {
             "search": "Key Words:"
         },
         "initComplete": function () {
-            let current_table = $('#log-details-table').DataTable();
             let api = this.api();
-            bind_select_in_column(api);
-            bind_input_filter_out_of_table(api, current_table);
-
-            // get and format table data
-            let log_table_data = current_table.rows().data();
-            let log_table_records = [];
-            log_table_data.each(function (item) {
-                log_table_records.push(item);
-            });
-            let chart_data = get_logs_trend_data_from_table(log_table_records);
-            // init charts with formatted table data
-            init_log_trend_chart(chart_data.categories, chart_data.series_data);
+            bind_select_in_column(api, 'log');
 
             // mark done
             i_am_ready();
@@ -531,87 +522,40 @@ function init_log_trend_chart(categories, series_data) {
     });
 }
 
-function bind_input_filter_out_of_table(api, table) {
-    $(".mdc-text-field__input").on('change', function () {
-        on_input_filter_change(api);
-    })
-}
-
-function bind_select_in_column(api) {
+function bind_select_in_column(api, kind) {
     api.columns().every(function () {
         var column = this;
         var select = $('<select class="form-control form-control-sm"><option value="">All</option></select>')
             .appendTo($(column.header()))
             .on('change', function () {
-                on_column_change(api, column, $(this));
+                on_column_change(column, $(this));
             });
 
-        // 添加列中的选项
-        column.data().unique().sort().each(function (d) {
-            select.append('<option value="' + d.replace(/"/g, '&quot;') + '">' + d + '</option>');
-        });
-
+        // The table only holds the current page, so the options are queried from server, with the search and the other column filters of the table.
         select.select2({
             placeholder: "Select option",
-            allowClear: true
+            allowClear: true,
+            ajax: {
+                url: '/table_column_values',
+                delay: 250,
+                data: function (params) {
+                    return $.extend({}, api.ajax.params(), {
+                        kind: kind,
+                        column: column.dataSrc(),
+                        term: params.term || '',
+                        page: params.page || 1,
+                        begin_datetime: $('#begin_datetime').val(),
+                        end_datetime: $('#end_datetime').val()
+                    });
+                }
+            }
         });
     });
 }
 
-function on_column_change(api, column, select) {
+function on_column_change(column, select) {
     var val = select.val();
     column.search(val ? val : '', false, false).draw();
-
-    var currentColumnIndex = column.index();
-
-    let only_one_filter_index = 0;
-    let filter_num = 0;
-    api.columns().every(function (i) {
-        var otherSelect = $(this.header()).find('select');
-        var currentFilterValue = otherSelect.val(); // 获取当前选择的值
-        if (currentFilterValue.length != 0) {
-            filter_num = filter_num + 1;
-            only_one_filter_index = i;
-        }
-    })
-    if ($(".mdc-text-field__input").val().length !== 0) {
-        filter_num = filter_num + 1;
-        only_one_filter_index = -1;
-    }
-
-    api.columns().every(function (i) {
-        if (i !== currentColumnIndex) {
-            var otherSelect = $(this.header()).find('select');
-            var currentFilterValue = otherSelect.val(); // 获取当前选择的值
-            otherSelect.empty().append('<option value="">All</option>');
-            if (filter_num === 1 && only_one_filter_index === i) {
-                api.column(i).data().unique().sort().each(function (d) {
-                    otherSelect.append('<option value="' + d.replace(/"/g, '&quot;') + '">' + d + '</option>');
-                });
-            } else {
-                api.column(i, {search: 'applied'}).data().unique().sort().each(function (d) {
-                    otherSelect.append('<option value="' + d.replace(/"/g, '&quot;') + '">' + d + '</option>');
-                });
-            }
-            otherSelect.val(currentFilterValue); // 重新设置之前选择的值
-        }
-    });
-}
-
-function on_input_filter_change(api) {
-    api.columns().every(function (i) {
-        var otherSelect = $(this.header()).find('select');
-        var currentFilterValue = otherSelect.val(); // 获取当前选择的值
-        if (api.column(i, {search: 'applied'}).data().unique().length === 0) {
-            otherSelect.val(currentFilterValue);
-            return;
-        }
-        otherSelect.empty().append('<option value="">All</option>');
-        api.column(i, {search: 'applied'}).data().unique().sort().each(function (d) {
-            otherSelect.append('<option value="' + d.replace(/"/g, '&quot;') + '">' + d + '</option>');
-        });
-        otherSelect.val(currentFilterValue); // 重新设置之前选择的值
-    });
 }
 
 function toggleTabs(className, element) {
@@ -639,135 +583,7 @@ function toggleTabs(className, element) {
     window.location.href = target;
 }
 
-function get_logs_trend_data_from_table(log_table_data) {
-    // order by time
-    log_table_data.sort(function (a, b) {
-        return new Date(a['time']) - new Date(b['time']);
-    });
-    let log_trend_categories = [];
-    let log_trend_series_data = [];
-    // init chart when no data None
-    if (Array.isArray(log_table_data)) {
-        if (log_table_data.length === 0) {
-            return {
-                categories: log_trend_categories,
-                series_data: log_trend_series_data
-            };
-        }
-    }
-    // init chart when >= 1 record [{}]
-    // init categories
-    log_trend_categories = generateDates(
-        log_table_data[0]['time'].substring(0, 10),
-        log_table_data[log_table_data.length - 1]['time'].substring(0, 10));
-
-
-    // init series data with default value
-    log_table_data.forEach(function (item) {
-        if (!log_trend_series_data.some(function (element) {
-            return element['name'] === item['direction'] + '-' + item['message_level']
-                && element['stack'] === item['direction'];
-        })) {
-            log_trend_series_data.push({
-                name: item['direction'] + '-' + item['message_level'],
-                data: new Array(log_trend_categories.length).fill(0),
-                stack: item['direction']
-            });
-        }
-    });
-
-    // update series data with calculated value
-    log_table_data.forEach(function (item, index) {
-        let series_index = log_trend_series_data.findIndex(function (element) {
-            return element['name'] === item['direction'] + '-' + item['message_level']
-                && element['stack'] === item['direction'];
-        })
-        if (series_index !== -1) {
-            var dataIndex = log_trend_categories.indexOf(item['time'].substring(0, 10));
-            log_trend_series_data[series_index].data[dataIndex] += 1;
-        }
-    });
-
-    return {
-        categories: log_trend_categories,
-        series_data: log_trend_series_data
-    };
-}
-
-function get_heartbeat_trend_data_from_table(heartbeat_table_data) {
-    // order by time
-    heartbeat_table_data.sort(function (a, b) {
-        return new Date(a['time']) - new Date(b['time']);
-    });
-    let heartbeat_trend_categories = [];
-    let heartbeat_trend_series_data = [];
-    // init chart when no data None
-    if (Array.isArray(heartbeat_table_data)) {
-        if (heartbeat_table_data.length === 0) {
-            return {
-                categories: heartbeat_trend_categories,
-                series_data: heartbeat_trend_series_data
-            };
-        }
-    }
-    // init chart when >= 1 record [{}]
-    // init categories
-    heartbeat_trend_categories = generateDates(
-        heartbeat_table_data[0]['time'].substring(0, 10),
-        heartbeat_table_data[heartbeat_table_data.length - 1]['time'].substring(0, 10));
-
-    // init series data with default value
-    heartbeat_table_data.forEach(function (item) {
-        if (!heartbeat_trend_series_data.some(function (element) {
-            return element['name'] === item['direction'];
-        })) {
-            heartbeat_trend_series_data.push({
-                name: item['direction'],
-                data: new Array(heartbeat_trend_categories.length).fill(0)
-            });
-        }
-    });
-
-    // update series data with calculated value
-    heartbeat_table_data.forEach(function (item) {
-        let series_index = heartbeat_trend_series_data.findIndex(function (element) {
-            return element['name'] === item['direction'];
-        })
-        if (series_index !== -1) {
-            var dataIndex = heartbeat_trend_categories.indexOf(item['time'].substring(0, 10));
-            heartbeat_trend_series_data[series_index].data[dataIndex] += 1;
-        }
-    });
-
-    return {
-        categories: heartbeat_trend_categories,
-        series_data: heartbeat_trend_series_data
-    };
-}
-
-function generateDates(startDateStr, endDateStr) {
-    var startDate = new Date(startDateStr);
-    var endDate = new Date(endDateStr);
-    var dates = [];
-
-    // 将开始日期推送到数组中
-    dates.push(startDateStr);
-
-    // 循环生成开始日期和结束日期之间的日期，并推送到数组中
-    while (startDate < endDate) {
-        startDate.setDate(startDate.getDate() + 1);
-        dates.push(startDate.toISOString().slice(0, 10));
-    }
-
-    return dates;
-}
-
 function i_am_ready() {
-    // 获取数据
-    let progress = localStorage.getItem('progress');
-    if (progress === null) {
-        localStorage.setItem('progress', 1);
-    } else {
-        localStorage.setItem('progress', parseInt(progress) + 1);
-    }
+    page_progress.ready += 1;
+    update_page_progress();
 }